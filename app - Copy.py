@@ -5,9 +5,10 @@ import dash_core_components as dcc
 from dash.dependencies import Input, Output, State
 from dash import no_update
 
+import startup
+startup.install()
+
 import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
 
 import os
 import sys
@@ -15,12 +16,17 @@ import copy
 import time
 
 from src.navbar import get_navbar
-from src.graphs import df, layout, ohe, cat_features, svm_model, xgb_model
+from src.graphs import df, layout, get_ohe, cat_features, get_svm_model, get_xgb_model
+from src.graphs import dist_tenure, dist_monthlycharges, dist_totalcharges
 from content import tab_prediction_content, tab_analysis_content
 from src import (
     overview,
 )
 
+px = startup.lazy_import('plotly.express')
+
+startup.mark("imports")
+
 # Creating the app
 
 app = dash.Dash(
@@ -34,9 +40,9 @@ server=app.server
 
 tabs = dbc.Tabs(
     [
-        dbc.Tab(tab_prediction_content, label="Prediction"),
-        dbc.Tab(tab_analysis_content, label="Data Analysis"),
-    ]
+        dbc.Tab(tab_prediction_content, label="Prediction", tab_id="tab_prediction"),
+        dbc.Tab(tab_analysis_content, label="Data Analysis", tab_id="tab_analysis"),
+    ], id="tabs"
 )
 
 
@@ -71,8 +77,26 @@ app.layout = html.Div(
     ],
 )
 
+startup.mark("layout")
+
 # Callbacks
 
+# the KDE figures are only built when the analysis tab is first opened
+@app.callback(
+    [
+        Output("dist_tenure_graph", "figure"),
+        Output("dist_monthlycharges_graph", "figure"),
+        Output("dist_totalcharges_graph", "figure"),
+    ],
+    [Input("tabs", "active_tab")],
+    [State("dist_tenure_graph", "figure")],
+)
+def render_analysis_tab(active_tab, figure):
+    if active_tab != "tab_analysis" or (figure and figure.get("data")):
+        return no_update, no_update, no_update
+    return dist_tenure(), dist_monthlycharges(), dist_totalcharges()
+
+
 @app.callback(
     Output("categorical_bar_graph", "figure"),
     [
@@ -84,7 +108,7 @@ def bar_categorical(feature):
 
     time.sleep(0.2)
 
-    temp = df.groupby([feature, 'Churn']).count()['customerID'].reset_index()
+    temp = df.groupby([feature, 'Churn'], observed=True).count()['customerID'].sort_index().reset_index()
     
     fig = px.bar(temp, x=feature, y="customerID",
              color=temp['Churn'].map({'Yes': 'Churn', 'No': 'NoChurn'}),
@@ -116,7 +140,7 @@ def donut_categorical(feature):
 
     time.sleep(0.2)
 
-    temp = df.groupby([feature]).count()['customerID'].reset_index()
+    temp = df.groupby([feature], observed=True).count()['customerID'].sort_index().reset_index()
 
     fig = px.pie(temp, values="customerID", names=feature, hole=.5,
                             #color=temp['Churn'].map({'Yes': 'Churn', 'No': 'NoChurn'}),
@@ -192,13 +216,13 @@ def predict_churn(n_clicks, ft_gender, ft_partner, ft_dependents, ft_phoneServic
               'tenure': int(ft_tenure), 'SeniorCitizen': int(ft_seniorCitizen)}
 
     sample_df = pd.DataFrame(sample, index=[0])
-    sample_df_enc = ohe.transform(sample_df[cat_features])
+    sample_df_enc = get_ohe().transform(sample_df[cat_features])
     sample_df_enc = pd.DataFrame(sample_df_enc)
 
     sample_df_enc = pd.concat([sample_df_enc, sample_df[['SeniorCitizen', 'MonthlyCharges', 'TotalCharges', 'tenure']]], axis=1)
 
-    svm_prediction = svm_model.predict(sample_df_enc)
-    xgb_prediction = xgb_model.predict(sample_df_enc)
+    svm_prediction = get_svm_model().predict(sample_df_enc)
+    xgb_prediction = get_xgb_model().predict(sample_df_enc)
 
     def churn_to_text(num):
         if(num == 0):
@@ -226,5 +250,8 @@ def toggle_navbar_collapse(n, is_open):
     return is_open
 
 
+startup.mark("callbacks")
+startup.report()
+
 if __name__ == "__main__":
     app.run_server(debug=True, port=8050)
\ No newline at end of file
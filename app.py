@@ -2,6 +2,7 @@ import math
 import dash
 import dash_html_components as html
 
+import metrics
 from sfManager import sf_Manager
 
 external_scripts = [
@@ -42,6 +43,9 @@ app.index_string = """<!DOCTYPE html>
 
 app.config.suppress_callback_exceptions = True
 
+# every callback registered from here on is timed, see /metrics
+metrics.instrument(app)
+
 sf_manager = sf_Manager()
 
 millnames = ["", " K", " M", " B", " T"]  # used to convert numbers
@@ -49,13 +53,14 @@ millnames = ["", " K", " M", " B", " T"]  # used to convert numbers
 
 # return html Table with dataframe values
 def df_to_table(df):
-    return html.Table(
-        [html.Tr([html.Th(col) for col in df.columns])]
-        + [
-            html.Tr([html.Td(df.iloc[i][col]) for col in df.columns])
-            for i in range(len(df))
-        ]
-    )
+    return html.Table([html.Tr([html.Th(col) for col in df.columns])] + table_rows(df))
+
+
+# return one html Tr per dataframe row, the values are read a column at a
+# time instead of looking up every cell
+def table_rows(df):
+    columns = [df[col].tolist() for col in df.columns]
+    return [html.Tr([html.Td(value) for value in row]) for row in zip(*columns)]
 
 
 # returns most significant part of a number
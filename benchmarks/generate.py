@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+
+# picklist values as the panels filter on them
+LEAD_STATUSES = [
+    "Open - Not Contacted",
+    "Working - Contacted",
+    "Closed - Converted",
+    "Closed - Not Converted",
+]
+LEAD_SOURCES = ["Web", "Phone Inquiry", "Partner Referral", "Purchased List", "Other"]
+STATES = [
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL",
+    "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT",
+    "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI",
+    "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY",
+]  # fmt: skip
+# stage: (probability, weight)
+STAGES = {
+    "Prospecting": (10, 0.14),
+    "Qualification": (10, 0.12),
+    "Needs Analysis": (20, 0.1),
+    "Value Proposition": (50, 0.08),
+    "Id. Decision Makers": (60, 0.06),
+    "Perception Analysis": (70, 0.06),
+    "Proposal/Price Quote": (75, 0.08),
+    "Negotiation/Review": (90, 0.06),
+    "Closed Won": (100, 0.18),
+    "Closed Lost": (0, 0.12),
+}
+OPPORTUNITY_TYPES = [
+    "New Customer",
+    "Existing Customer - Upgrade",
+    "Existing Customer - Replacement",
+    "Existing Customer - Downgrade",
+]
+CASE_TYPES = ["Electrical", "Other", "Structural", "Mechanical", "Electronic"]
+CASE_REASONS = [
+    "Installation",
+    "Equipment Complexity",
+    "Performance",
+    "Breakdown",
+    "Equipment Design",
+    "Feedback",
+    "Other",
+]
+CASE_STATUSES = ["New", "Working", "Escalated", "Closed"]
+CASE_ORIGINS = ["Phone", "Email", "Web"]
+PRIORITIES = ["Low", "Medium", "High"]
+MARKET_UNITS = ["US", "EMEA", "APAC", "LATAM"]
+PRODUCTS = ["suite", "cloud", "services", "support"]
+FINANCE_ACCOUNTS = ["Revenue", "Pipeline", "Cost"]
+SALUTATIONS = ["Mr.", "Ms.", "Mrs.", "Dr.", "Prof."]
+FIRST_NAMES = ["Ada", "Alan", "Grace", "Edsger", "Barbara", "Donald", "Frances"]
+LAST_NAMES = ["Lovelace", "Turing", "Hopper", "Dijkstra", "Liskov", "Knuth"]
+USERS = 1000  # owners of the cases
+
+START = np.datetime64("2018-01-01T00:00:00")
+SPAN_SECONDS = 3 * 365 * 24 * 3600
+
+
+def ids(prefix, n, offset=0):
+    numbers = pd.Series(np.arange(offset, offset + n)).map("{:015d}".format)
+    return (prefix + numbers).to_numpy(dtype=object)
+
+
+def pick(rng, values, n, p=None):
+    return pd.Categorical.from_codes(rng.choice(len(values), n, p=p), values)
+
+
+def timestamps(rng, n):
+    seconds = rng.integers(0, SPAN_SECONDS, n)
+    return pd.to_datetime(START + seconds.astype("timedelta64[s]"))
+
+
+# the frames below have the columns and dtypes sf_Manager produces for the
+# fields the panels register (picklists as categories, dates as datetime64)
+def leads(n, rng):
+    return pd.DataFrame(
+        {
+            "Id": ids("00Q", n),
+            "CreatedDate": timestamps(rng, n),
+            "Status": pick(rng, LEAD_STATUSES, n, [0.3, 0.25, 0.3, 0.15]),
+            "Company": ids("Company ", n),
+            "State": rng.choice(STATES, n),
+            "LeadSource": pick(rng, LEAD_SOURCES, n),
+            "SystemModstamp": timestamps(rng, n),
+            "IsDeleted": np.zeros(n, dtype=bool),
+        }
+    )
+
+
+def opportunities(n, rng):
+    weights = np.array([w for _, w in STAGES.values()])
+    stages = pick(rng, list(STAGES), n, weights / weights.sum())
+    probability = np.array([p for p, _ in STAGES.values()], dtype=float)
+    probability = probability[stages.codes]
+    amount = np.round(rng.lognormal(10, 1.2, n), 2)
+    is_won = stages == "Closed Won"
+    is_closed = is_won | (stages == "Closed Lost")
+    return pd.DataFrame(
+        {
+            "Id": ids("006", n),
+            "CreatedDate": timestamps(rng, n),
+            "Name": ids("Opportunity for account ", n),
+            "StageName": stages,
+            "ExpectedRevenue": amount * probability / 100,
+            "Amount": amount,
+            "LeadSource": pick(rng, LEAD_SOURCES, n),
+            "IsWon": is_won,
+            "IsClosed": is_closed,
+            "Type": pick(rng, OPPORTUNITY_TYPES, n),
+            "Probability": probability,
+            "SystemModstamp": timestamps(rng, n),
+            "IsDeleted": np.zeros(n, dtype=bool),
+        }
+    )
+
+
+def accounts(n, rng):
+    return pd.DataFrame({"Id": ids("001", n), "Name": ids("Account ", n)})
+
+
+def contacts(n, rng):
+    return pd.DataFrame(
+        {
+            "Id": ids("003", n),
+            "Salutation": rng.choice(SALUTATIONS, n),
+            "FirstName": rng.choice(FIRST_NAMES, n),
+            "LastName": rng.choice(LAST_NAMES, n),
+        }
+    )
+
+
+def users(n, rng):
+    return pd.DataFrame(
+        {
+            "Id": ids("005", n),
+            "FirstName": rng.choice(FIRST_NAMES, n),
+            "LastName": rng.choice(LAST_NAMES, n),
+        }
+    )
+
+
+# account_ids are the Ids cases point at, about 5% of the cases have none
+def cases(n, rng, account_ids):
+    account = rng.choice(account_ids, n).astype(object)
+    account[rng.random(n) < 0.05] = None
+    return pd.DataFrame(
+        {
+            "Id": ids("500", n),
+            "CreatedDate": timestamps(rng, n),
+            "Type": pick(rng, CASE_TYPES, n),
+            "Reason": pick(rng, CASE_REASONS, n),
+            "Status": pick(rng, CASE_STATUSES, n),
+            "Origin": pick(rng, CASE_ORIGINS, n),
+            "Subject": ids("Case subject ", n),
+            "Priority": pick(rng, PRIORITIES, n, [0.5, 0.35, 0.15]),
+            "IsClosed": rng.random(n) < 0.4,
+            "OwnerId": rng.choice(ids("005", USERS), n),
+            "IsDeleted": np.zeros(n, dtype=bool),
+            "AccountId": account,
+            "SystemModstamp": timestamps(rng, n),
+        }
+    )
+
+
+# rows shaped like data/df_actual_vs_budget.csv
+def finance(n, rng):
+    offset = rng.integers(0, 36, n)  # months since January 2020
+    year = pd.Series(2020 + offset // 12)
+    month_of_year = pd.Series(offset % 12 + 1)
+    quarter = year.astype(str) + "Q" + ((month_of_year - 1) // 3 + 1).astype(str)
+    return pd.DataFrame(
+        {
+            "Date": None,
+            "Month": year * 100 + month_of_year,
+            "Quarter": quarter,
+            "Amount": np.round(rng.normal(80000, 15000, n)),
+            "Forecast": np.round(rng.normal(82000, 10000, n)),
+            "Account": rng.choice(FINANCE_ACCOUNTS, n),
+            "Market Unit": rng.choice(MARKET_UNITS, n),
+            "Product": rng.choice(PRODUCTS, n),
+        }
+    )
+
+
+# every frame the panels read, each with n rows except the accounts and
+# contacts (one per 20 cases, as orgs have far fewer accounts than cases) and
+# the users. New frames are drawn last so the earlier ones stay the same
+def generate(n, seed=0):
+    rng = np.random.default_rng(seed)
+    account_frame = accounts(max(n // 20, 1), rng)
+    return {
+        "leads": leads(n, rng),
+        "opportunities": opportunities(n, rng),
+        "accounts": account_frame,
+        "cases": cases(n, rng, account_frame["Id"].to_numpy()),
+        "finance": finance(n, rng),
+        "contacts": contacts(max(n // 20, 1), rng),
+        "users": users(USERS, rng),
+    }
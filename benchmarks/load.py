@@ -0,0 +1,482 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+# load test of the Dash endpoints: N virtual users each replay what the
+# browser sends for a visit (page load, every panel, dropdown changes and
+# the occasional modal submission) through _dash-update-component, for a
+# fixed time per user count. Without --url the app is imported and served
+# in-process through the Flask test client, against the stand-in org
+
+UPDATE = "/_dash-update-component"
+
+
+class TimeUp(Exception):
+    pass
+
+
+# GET and POST against a running server, e.g. gunicorn index:server
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def get(self, path):
+        response = self.session.get(self.base_url + path)
+        return response.status_code, response.content
+
+    def post(self, path, payload):
+        response = self.session.post(self.base_url + path, json=payload)
+        return response.status_code, response.content
+
+
+# the same against the Flask app of this process, one client per user
+class InProcessTransport:
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data()
+
+    def post(self, path, payload):
+        response = self.client.post(path, json=payload)
+        return response.status_code, response.get_data()
+
+
+def split_outputs(output):
+    if output.startswith(".."):
+        return [
+            {"id": part.rsplit(".", 1)[0], "property": part.rsplit(".", 1)[1]}
+            for part in output[2:-2].split("...")
+        ]
+    component_id, prop = output.rsplit(".", 1)
+    return [{"id": component_id, "property": prop}]
+
+
+# yields every component with an id of a serialised layout
+def walk(node):
+    if isinstance(node, list):
+        for child in node:
+            yield from walk(child)
+    elif isinstance(node, dict) and "props" in node:
+        if "id" in node["props"]:
+            yield node
+        yield from walk(node["props"].get("children"))
+
+
+# what the dash renderer keeps in the browser: the props of every rendered
+# component, and the callbacks to fire when some of them change
+class Page:
+    def __init__(self, dependencies, layout):
+        self.callbacks = []
+        for dependency in dependencies:
+            if dependency.get("clientside_function"):
+                continue
+            inputs = [(i["id"], i["property"]) for i in dependency["inputs"]]
+            if any(i[0].startswith("{") for i in inputs):
+                continue  # pattern matching ids are not used by the app
+            self.callbacks.append(
+                {
+                    "output": dependency["output"],
+                    "outputs": split_outputs(dependency["output"]),
+                    "inputs": inputs,
+                    "state": [(s["id"], s["property"]) for s in dependency["state"]],
+                    "initial": not dependency.get("prevent_initial_call"),
+                }
+            )
+        self.components = {}  # {id: serialised component}
+        self.owned = {}  # {id: ids rendered as its children}
+        self.add(None, layout)
+
+    def add(self, parent, children):
+        ids = []
+        for component in walk(children):
+            self.components[component["props"]["id"]] = component
+            ids.append(component["props"]["id"])
+        if parent is not None:
+            for component_id in self.owned.pop(parent, []):
+                if component_id not in ids:
+                    self.components.pop(component_id, None)
+            self.owned[parent] = ids
+        return ids
+
+    def value(self, component_id, prop):
+        return self.components[component_id]["props"].get(prop)
+
+    # applies a callback response, returns the props it changed (including
+    # every prop of the components it rendered, as they are new)
+    def apply(self, response):
+        changed = set()
+        for component_id, props in response.items():
+            if component_id not in self.components:
+                continue
+            for prop, value in props.items():
+                self.components[component_id]["props"][prop] = value
+                changed.add((component_id, prop))
+                if prop == "children":
+                    for new_id in self.add(component_id, value):
+                        changed.update(
+                            (new_id, p) for p in self.components[new_id]["props"]
+                        )
+        return changed
+
+    def ready(self, callback):
+        ids = [i[0] for i in callback["inputs"]] + [s[0] for s in callback["state"]]
+        return all(component_id in self.components for component_id in ids)
+
+    # callbacks triggered by changed, minus those waiting on the output of
+    # another triggered one (they run in the next round, as in the renderer)
+    def triggered(self, changed, initial=False):
+        callbacks = [
+            c
+            for c in self.callbacks
+            if self.ready(c)
+            and (not initial or c["initial"])
+            and any(i in changed for i in c["inputs"])
+        ]
+        outputs = {(o["id"], o["property"]) for c in callbacks for o in c["outputs"]}
+        now = [c for c in callbacks if not any(i in outputs for i in c["inputs"])]
+        return now or callbacks
+
+    def payload(self, callback, changed):
+        def props(pairs):
+            return [
+                {"id": i, "property": p, "value": self.value(i, p)} for i, p in pairs
+            ]
+
+        return {
+            "output": callback["output"],
+            "outputs": (
+                callback["outputs"]
+                if callback["output"].startswith("..")
+                else callback["outputs"][0]
+            ),
+            "inputs": props(callback["inputs"]),
+            "state": props(callback["state"]),
+            "changedPropIds": [
+                "{}.{}".format(i, p) for i, p in callback["inputs"] if (i, p) in changed
+            ],
+        }
+
+
+# one visitor, replaying visits until the deadline and recording
+# (callback, seconds, status) for every request completed before it
+class VirtualUser:
+    def __init__(self, transport, rng, changes, submit_rate, think):
+        self.deadline = None
+        self.transport = transport
+        self.rng = rng
+        self.changes = changes
+        self.submit_rate = submit_rate
+        self.think = think
+        self.samples = []
+        self.page = None
+        self.ticks = {}  # {interval id: time of its last tick}
+
+    def request(self, name, method, path, payload=None):
+        if time.time() >= self.deadline:
+            raise TimeUp()
+        start = time.perf_counter()
+        try:
+            if method == "GET":
+                status, body = self.transport.get(path)
+            else:
+                status, body = self.transport.post(path, payload)
+        except requests.RequestException:
+            status, body = 0, b""
+        if time.time() < self.deadline:
+            self.samples.append((name, time.perf_counter() - start, status))
+        return status, body
+
+    def load_page(self):
+        self.request("GET /", "GET", "/")
+        status, layout = self.request("GET layout", "GET", "/_dash-layout")
+        status, dependencies = self.request(
+            "GET dependencies", "GET", "/_dash-dependencies"
+        )
+        self.page = Page(json.loads(dependencies), json.loads(layout))
+        self.ticks = {
+            component_id: time.time()
+            for component_id, c in self.page.components.items()
+            if c["type"] == "Interval"
+        }
+        # dcc.Location reports the path once mounted
+        for component in self.page.components.values():
+            if component["type"] == "Location":
+                component["props"]["pathname"] = "/"
+        changed = {
+            (component_id, prop)
+            for component_id, c in self.page.components.items()
+            for prop in c["props"]
+        }
+        self.fire(changed, initial=True)
+
+    # sends the callbacks changed props trigger, then the ones their
+    # responses trigger, until nothing changes
+    def fire(self, changed, initial=False):
+        for _ in range(10):
+            callbacks = self.page.triggered(changed, initial)
+            if not callbacks:
+                return
+            initial = False  # components rendered since then are new
+            next_changed = set()
+            for callback in callbacks:
+                payload = self.page.payload(callback, changed)
+                status, body = self.request(callback["output"], "POST", UPDATE, payload)
+                if status == 200:
+                    response = json.loads(body)["response"]
+                    next_changed |= self.page.apply(response)
+            changed = next_changed
+
+    def set(self, component_id, prop, value):
+        self.page.components[component_id]["props"][prop] = value
+        self.fire({(component_id, prop)})
+
+    def tick(self):
+        now = time.time()
+        for component_id, last in self.ticks.items():
+            interval = (self.page.value(component_id, "interval") or 1000) / 1000
+            if now - last >= interval:
+                self.ticks[component_id] = now
+                n = self.page.value(component_id, "n_intervals") or 0
+                self.set(component_id, "n_intervals", n + 1)
+
+    def options(self, component_id):
+        options = self.page.value(component_id, "options") or []
+        return [o["value"] for o in options if not o.get("disabled")]
+
+    # dropdowns of the panel shown, those of the modals are left to submit()
+    def dropdowns(self):
+        inputs = {i for c in self.page.callbacks for i in c["inputs"]}
+        return [
+            component_id
+            for component_id in self.page.components
+            if (component_id, "value") in inputs and len(self.options(component_id)) > 1
+        ]
+
+    def change_dropdown(self):
+        dropdowns = self.dropdowns()
+        if not dropdowns:
+            return
+        component_id = self.rng.choice(dropdowns)
+        current = self.page.value(component_id, "value")
+        choices = [v for v in self.options(component_id) if v != current]
+        self.set(component_id, "value", self.rng.choice(choices))
+
+    # opens the modal of a new_<object> button, fills its dropdowns and
+    # presses submit_new_<object>
+    def submit(self):
+        buttons = [
+            component_id
+            for component_id in self.page.components
+            if component_id.startswith("new_")
+            and "submit_" + component_id in self.page.components
+        ]
+        if not buttons:
+            return
+        button = self.rng.choice(buttons)
+        self.click(button)
+        for component_id in self.page.components:
+            if component_id.startswith(button + "_") and self.options(component_id):
+                value = self.rng.choice(self.options(component_id))
+                self.page.components[component_id]["props"]["value"] = value
+        self.click("submit_" + button)
+
+    def click(self, component_id):
+        n_clicks = self.page.value(component_id, "n_clicks") or 0
+        self.set(component_id, "n_clicks", n_clicks + 1)
+
+    def pause(self):
+        if self.think:
+            pause = self.rng.expovariate(1 / self.think)
+            time.sleep(max(0, min(pause, self.deadline - time.time())))
+
+    def visit(self):
+        self.load_page()
+        paths = [
+            link["props"]["href"]
+            for link in self.page.value("tabs", "children")
+            if isinstance(link, dict)
+        ]
+        self.rng.shuffle(paths)
+        for path in paths:
+            self.pause()
+            self.tick()
+            self.set("url", "pathname", path)
+            for _ in range(self.changes):
+                self.pause()
+                self.change_dropdown()
+            if self.rng.random() < self.submit_rate:
+                self.pause()
+                self.submit()
+
+    def run(self, deadline):
+        self.deadline = deadline
+        try:
+            while True:
+                self.visit()
+        except TimeUp:
+            pass
+
+
+def summary(seconds, statuses):
+    seconds = np.array(seconds or [0.0])
+    return {
+        "requests": len(statuses),
+        "errors": int(sum(1 for s in statuses if s not in (200, 204))),
+        "p50": float(np.percentile(seconds, 50)),
+        "p95": float(np.percentile(seconds, 95)),
+        "p99": float(np.percentile(seconds, 99)),
+    }
+
+
+# runs users virtual users for duration seconds
+def run_level(make_transport, users, duration, args):
+    deadline = time.time() + duration
+    virtual_users = [
+        VirtualUser(
+            make_transport(),
+            random.Random(args.seed + n),
+            args.changes,
+            args.submit_rate,
+            args.think,
+        )
+        for n in range(users)
+    ]
+    threads = [
+        threading.Thread(target=vu.run, args=(deadline,), daemon=True)
+        for vu in virtual_users
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    by_callback = {}
+    for vu in virtual_users:
+        for name, seconds, status in vu.samples:
+            by_callback.setdefault(name, ([], []))
+            by_callback[name][0].append(seconds)
+            by_callback[name][1].append(status)
+    samples = [s for vu in virtual_users for s in vu.samples]
+    level = {"users": users, "seconds": duration}
+    level.update(summary([s[1] for s in samples], [s[2] for s in samples]))
+    level["throughput"] = level["requests"] / duration
+    level["callbacks"] = {
+        name: summary(seconds, statuses)
+        for name, (seconds, statuses) in sorted(by_callback.items())
+    }
+    return level
+
+
+# the user count throughput stops scaling at: the last one before a level
+# adding less than growth to it, or failing more than max_error_rate of its
+# requests. None when every level scaled
+def saturation(levels, growth=0.1, max_error_rate=0.01):
+    for previous, level in zip(levels, levels[1:]):
+        if level["errors"] > max_error_rate * level["requests"]:
+            return previous["users"]
+        if level["throughput"] < previous["throughput"] * (1 + growth):
+            return previous["users"]
+    return None
+
+
+# starts the stand-in org and imports the app, unless SF_BACKEND says where
+# the data comes from
+def in_process_server(args):
+    if "SF_BACKEND" not in os.environ:
+        from benchmarks import standin
+
+        os.environ["SF_BACKEND"] = "local"
+        os.environ["SF_LOCAL_URL"] = "http://127.0.0.1:{}".format(args.standin_port)
+        httpd = standin.server(
+            standin.Org(args.rows, args.seed),
+            port=args.standin_port,
+            latency=args.latency,
+        )
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    os.environ.setdefault("SNAPSHOT_DIR", "")
+    import index
+
+    return index.server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Dash callbacks.")
+    parser.add_argument(
+        "--url", help="server to load, e.g. http://127.0.0.1:8000 (default in-process)"
+    )
+    parser.add_argument("--users", default="1,2,4,8,16", help="user counts to run")
+    parser.add_argument(
+        "--duration", type=float, default=30, help="seconds per user count"
+    )
+    parser.add_argument(
+        "--think", type=float, default=0.0, help="mean seconds between user actions"
+    )
+    parser.add_argument(
+        "--changes", type=int, default=3, help="dropdown changes per panel visit"
+    )
+    parser.add_argument(
+        "--submit-rate",
+        type=float,
+        default=0.1,
+        help="share of panel visits submitting a new record, which creates "
+        "it in the org the app talks to",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows", type=int, default=10000, help="stand-in org size")
+    parser.add_argument("--latency", type=float, default=0.0, help="stand-in latency")
+    parser.add_argument("--standin-port", type=int, default=8765)
+    parser.add_argument("--output", default="load.json")
+    args = parser.parse_args()
+
+    if args.url:
+        make_transport = lambda: HttpTransport(args.url)
+    else:
+        server = in_process_server(args)
+        make_transport = lambda: InProcessTransport(server)
+
+    levels = []
+    for users in [int(n) for n in args.users.split(",")]:
+        level = run_level(make_transport, users, args.duration, args)
+        levels.append(level)
+        print(
+            "{:>4} users  {:8.1f} req/s  p50 {:7.3f}s  p95 {:7.3f}s  "
+            "p99 {:7.3f}s  errors {}".format(
+                users,
+                level["throughput"],
+                level["p50"],
+                level["p95"],
+                level["p99"],
+                level["errors"],
+            ),
+            file=sys.stderr,
+        )
+
+    saturated = saturation(levels)
+    if saturated is None:
+        print("not saturated at {} users".format(levels[-1]["users"]), file=sys.stderr)
+    else:
+        print("saturated at {} users".format(saturated), file=sys.stderr)
+    shown = next(l for l in levels if l["users"] == (saturated or levels[-1]["users"]))
+    for name, stats in sorted(shown["callbacks"].items(), key=lambda i: -i[1]["p95"]):
+        print(
+            "  {:<60} {:>6}  p50 {:7.3f}s  p95 {:7.3f}s  p99 {:7.3f}s".format(
+                name[:60], stats["requests"], stats["p50"], stats["p95"], stats["p99"]
+            ),
+            file=sys.stderr,
+        )
+    with open(args.output, "w") as f:
+        json.dump({"saturation": saturated, "levels": levels}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
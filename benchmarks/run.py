@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import generate
+
+# panel imports need the app, as in production, but never reach Salesforce:
+# the frames are passed in and the accounts go through frame_store, kept in
+# this process rather than in the snapshot the web workers share
+os.environ["SNAPSHOT_DIR"] = ""
+from app import df_to_table
+from panels import cases, leads, opportunities, overview
+from store import frame_store
+
+SIZES = [10000, 100000, 1000000, 10000000]
+
+
+def heat_map(frames):
+    matrix = opportunities.probability_matrix(frames["opportunities"])
+    return opportunities.heat_map_fig(matrix, list(matrix.columns))
+
+
+# first page of the open leads, newest first, sort order not cached
+def leads_table_page(frames):
+    df, order = leads.table_order(frames["leads"], "CreatedDate", False)
+    order = leads.filter_order(df, order, "open")
+    return leads.leads_table_rows(df, order[:25])
+
+
+def leads_table(frames):
+    df = frames["leads"][["CreatedDate", "Status", "Company", "State", "LeadSource"]]
+    return df_to_table(df.assign(CreatedDate=df["CreatedDate"].dt.strftime("%Y-%m-%d")))
+
+
+# name: (function of the generated frames, largest size it is run at). The
+# arguments are the ones the panel callbacks pass with their default filters,
+# the period charts include building their rollup, done once per version
+CASES = {
+    "heat_map_fig": (heat_map, None),
+    "converted_opportunities": (
+        lambda f: opportunities.converted_opportunities(
+            "W-MON", "all_s", opportunities.won_rollup(f["opportunities"])
+        ),
+        None,
+    ),
+    "top_open_opportunities": (
+        lambda f: opportunities.top_open_opportunities(f["opportunities"]),
+        None,
+    ),
+    "top_lost_opportunities": (
+        lambda f: opportunities.top_lost_opportunities(f["opportunities"]),
+        None,
+    ),
+    "choropleth_map": (lambda f: leads.choropleth_map("all", f["leads"]), None),
+    "lead_source": (lambda f: leads.lead_source("all", f["leads"]), None),
+    "converted_leads_count": (
+        lambda f: leads.converted_leads_count("D", leads.status_rollup(f["leads"])),
+        None,
+    ),
+    "pie_chart": (lambda f: cases.pie_chart(f["cases"], "Type", "all_p", "all"), None),
+    "cases_by_period": (
+        lambda f: cases.cases_by_period(
+            cases.type_rollup(f["cases"]), "W-MON", "all_p", "all"
+        ),
+        None,
+    ),
+    # rollup taken from frame_store, as every callback after the first
+    "cases_by_period_cached": (
+        lambda f: cases.cases_by_period(
+            frame_store.derive(frame_store.token("cases"), cases.type_rollup),
+            "W-MON",
+            "all_p",
+            "all",
+        ),
+        None,
+    ),
+    "cases_by_account": (
+        lambda f: cases.cases_by_account(
+            *cases.account_case_counts(f["cases"], frame_store.version("accounts"))
+        ),
+        None,
+    ),
+    "actual_vs_budget": (
+        lambda f: overview.actual_vs_budget("ALL", "all_s", f["finance"]),
+        None,
+    ),
+    "sales_pipeline": (
+        lambda f: overview.sales_pipeline("ALL", "all_s", f["finance"]),
+        None,
+    ),
+    "leads_table_page": (leads_table_page, None),
+    # one html.Td component per cell, about 1s for 10k leads
+    "df_to_table": (leads_table, 10000),
+}
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q))
+
+
+# times repeat calls of func, then measures its peak traced allocation on one
+# more call (tracemalloc slows the code down, so it is not timed)
+def measure(func, frames, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(frames)
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func(frames)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "runs": repeat,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "min": min(samples),
+        "peak_bytes": peak,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        )
+        commit = commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run(sizes, names, repeat, seed):
+    results = []
+    for size in sizes:
+        frames = generate(size, seed)
+        frame_store.put("accounts", frames["accounts"])
+        frame_store.put("cases", frames["cases"])
+        for name in names:
+            func, max_rows = CASES[name]
+            if max_rows is not None and size > max_rows:
+                continue
+            result = {"function": name, "rows": size}
+            result.update(measure(func, frames, repeat))
+            results.append(result)
+            print(
+                "{:<26} {:>9} rows  p50 {:8.4f}s  p95 {:8.4f}s  peak {:8.1f} MB".format(
+                    name, size, result["p50"], result["p95"], result["peak_bytes"] / 1e6
+                ),
+                file=sys.stderr,
+            )
+    return results
+
+
+# prints the p50 ratio of every (function, rows) present in both runs
+def compare(baseline, results):
+    before = {(r["function"], r["rows"]): r for r in baseline["results"]}
+    for result in results:
+        old = before.get((result["function"], result["rows"]))
+        if old is not None:
+            print(
+                "{:<26} {:>9} rows  p50 x{:.2f}  peak x{:.2f}".format(
+                    result["function"],
+                    result["rows"],
+                    result["p50"] / old["p50"],
+                    result["peak_bytes"] / max(old["peak_bytes"], 1),
+                ),
+                file=sys.stderr,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the panel functions.")
+    parser.add_argument(
+        "--sizes",
+        default="10000,100000",
+        help="comma separated row counts, up to {}".format(SIZES[-1]),
+    )
+    parser.add_argument("--functions", default=",".join(CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="results of a previous run to compare")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    names = args.functions.split(",")
+    results = run(sizes, names, args.repeat, args.seed)
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
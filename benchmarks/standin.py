@@ -0,0 +1,379 @@
+import argparse
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from benchmarks.generate import generate
+
+# local stand-in for the Salesforce endpoints sf_Manager uses: REST query,
+# queryAll and query_more, describe, create, and the Bulk API 2.0 query jobs.
+# Point the app at it with SF_BACKEND=local
+
+# generated frame served as each sobject, with its key prefix
+SOBJECTS = {
+    "Lead": ("leads", "00Q"),
+    "Opportunity": ("opportunities", "006"),
+    "Case": ("cases", "500"),
+    "Account": ("accounts", "001"),
+    "Contact": ("contacts", "003"),
+    "User": ("users", "005"),
+}
+REFERENCE_FIELDS = ["AccountId", "OwnerId"]
+PAGE_SIZE = 2000  # records per REST query page, as Salesforce
+SOQL = re.compile(
+    r"^SELECT (?P<fields>.+?) FROM (?P<sobject>\w+)"
+    r"(?: WHERE SystemModstamp > (?P<since>[\d\-T:.]+Z))?$"
+)
+API = r"^/services/data/v[\d.]+/"
+ROUTES = [
+    ("GET", re.compile(API + r"(?P<endpoint>query|queryAll)/?$"), "query"),
+    (
+        "GET",
+        re.compile(API + r"(?P<endpoint>query|queryAll)/(?P<cursor>\w+)-(?P<at>\d+)$"),
+        "query_more",
+    ),
+    ("GET", re.compile(API + r"sobjects/(?P<sobject>\w+)/describe/?$"), "describe"),
+    ("POST", re.compile(API + r"sobjects/(?P<sobject>\w+)/?$"), "create"),
+    ("POST", re.compile(API + r"jobs/query/?$"), "submit_job"),
+    ("GET", re.compile(API + r"jobs/query/(?P<job>\w+)/?$"), "job"),
+    ("GET", re.compile(API + r"jobs/query/(?P<job>\w+)/results/?$"), "job_results"),
+    ("DELETE", re.compile(API + r"jobs/query/(?P<job>\w+)/?$"), "delete_job"),
+]
+
+
+class SalesforceError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def describe_type(name, dtype):
+    if name == "Id":
+        return "id"
+    if name in REFERENCE_FIELDS:
+        return "reference"
+    if pd.api.types.is_categorical_dtype(dtype):
+        return "picklist"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "double"
+    return "string"
+
+
+# values of df the way Salesforce serialises them: datetimes in its ISO
+# format, missing values as None (JSON null, an empty CSV cell)
+def serialise(df, date_format):
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if pd.api.types.is_datetime64_any_dtype(column.dtype):
+            values = column.dt.strftime(date_format).astype(object)
+        else:
+            values = column.astype(object)
+        columns[name] = values.where(pd.notnull(values), None)
+    return pd.DataFrame(columns, index=df.index)
+
+
+# the generated org: one frame per sobject, the open query cursors and Bulk
+# jobs, and the API request count reported in Sforce-Limit-Info
+class Org:
+    def __init__(self, rows=10000, seed=0, api_limit=15000):
+        frames = generate(rows, seed)
+        self.lock = threading.Lock()
+        self.frames = {}
+        self.types = {}
+        # the describe types are fixed here, appended records may turn the
+        # category and bool columns into object ones
+        for sobject, (key, prefix) in SOBJECTS.items():
+            df = frames[key]
+            self.frames[sobject] = df
+            self.types[sobject] = {
+                name: describe_type(name, df[name].dtype) for name in df.columns
+            }
+        self.ids = itertools.count(len(frames["leads"]) * 10)
+        self.cursors = {}  # {cursor id: (sobject, selected rows)}
+        self.jobs = {}  # {job id: (sobject, selected rows)}
+        self.cursor_ids = itertools.count(1)
+        self.api_usage = 0
+        self.api_limit = api_limit
+
+    def count_request(self):
+        with self.lock:
+            self.api_usage += 1
+            return "api-usage={}/{}".format(self.api_usage, self.api_limit)
+
+    def frame(self, sobject):
+        if sobject not in self.frames:
+            raise SalesforceError(
+                404, "NOT_FOUND", "sObject type '{}' is not supported".format(sobject)
+            )
+        return self.frames[sobject]
+
+    def describe(self, sobject):
+        self.frame(sobject)
+        fields = [{"name": n, "type": t} for n, t in self.types[sobject].items()]
+        return {"name": sobject, "fields": fields}
+
+    # rows of a SOQL query, None for SELECT COUNT()
+    def select(self, soql, include_deleted=False):
+        match = SOQL.match(soql.strip())
+        if match is None:
+            raise SalesforceError(
+                400, "MALFORMED_QUERY", "unsupported query: {}".format(soql)
+            )
+        df = self.frame(match.group("sobject"))
+        if not include_deleted and "IsDeleted" in df.columns:
+            df = df[df["IsDeleted"] != True]
+        if match.group("since"):
+            since = pd.Timestamp(match.group("since").rstrip("Z"))
+            df = df[df["SystemModstamp"] > since]
+        fields = [f.strip() for f in match.group("fields").split(",")]
+        if fields == ["COUNT()"]:
+            return len(df), None
+        unknown = [f for f in fields if f not in df.columns]
+        if unknown:
+            raise SalesforceError(
+                400, "INVALID_FIELD", "No such column '{}'".format(unknown[0])
+            )
+        return len(df), df[fields]
+
+    # first page of a REST query, url is the query or queryAll endpoint the
+    # next pages are read from
+    def query(self, soql, include_deleted, url):
+        total, rows = self.select(soql, include_deleted)
+        if rows is None:
+            return {"totalSize": total, "done": True, "records": []}
+        cursor = "01g{:015d}".format(next(self.cursor_ids))
+        with self.lock:
+            self.cursors[cursor] = (SOQL.match(soql.strip()).group("sobject"), rows)
+        return self.page(url, cursor, 0)
+
+    def page(self, url, cursor, at):
+        with self.lock:
+            if cursor not in self.cursors:
+                raise SalesforceError(
+                    400, "INVALID_QUERY_LOCATOR", "invalid query locator"
+                )
+            sobject, rows = self.cursors[cursor]
+        chunk = serialise(rows.iloc[at : at + PAGE_SIZE], "%Y-%m-%dT%H:%M:%S.000+0000")
+        records = chunk.to_dict("records")
+        for record in records:
+            record["attributes"] = {"type": sobject}
+        result = {"totalSize": len(rows), "done": True, "records": records}
+        if at + PAGE_SIZE < len(rows):
+            result["done"] = False
+            result["nextRecordsUrl"] = "{}/{}-{}".format(url, cursor, at + PAGE_SIZE)
+        else:
+            with self.lock:
+                self.cursors.pop(cursor, None)
+        return result
+
+    # appends a record, the new frame replaces the old one so running
+    # queries keep reading the rows they selected. Fields the generated frame
+    # does not have (LastName, Description, ...) are accepted and dropped
+    def create(self, sobject, record):
+        df = self.frame(sobject)
+        now = pd.Timestamp.utcnow().tz_localize(None)
+        row = {name: record.get(name) for name in df.columns}
+        record_id = "{}{:015d}".format(SOBJECTS[sobject][1], next(self.ids))
+        row["Id"] = record_id
+        for name in ["CreatedDate", "SystemModstamp"]:
+            if name in row:
+                row[name] = now
+        if "IsDeleted" in row:
+            row["IsDeleted"] = False
+        with self.lock:
+            self.frames[sobject] = pd.concat(
+                [self.frames[sobject], pd.DataFrame([row])], ignore_index=True
+            )
+        return {"id": record_id, "success": True, "errors": []}
+
+    # jobs complete as soon as they are created, the first poll sees it
+    def submit_job(self, job):
+        total, rows = self.select(job["query"])
+        job_id = "750{:015d}".format(next(self.cursor_ids))
+        with self.lock:
+            self.jobs[job_id] = (
+                SOQL.match(job["query"].strip()).group("sobject"),
+                rows,
+            )
+        return {"id": job_id, "operation": "query", "state": "UploadComplete"}
+
+    def job_rows(self, job_id):
+        with self.lock:
+            if job_id not in self.jobs:
+                raise SalesforceError(404, "NOT_FOUND", "job not found")
+            return self.jobs[job_id]
+
+    def job(self, job_id):
+        sobject, rows = self.job_rows(job_id)
+        return {
+            "id": job_id,
+            "state": "JobComplete",
+            "numberRecordsProcessed": len(rows),
+        }
+
+    # one CSV page of the job results and the locator of the next one
+    def job_results(self, job_id, max_records, locator):
+        sobject, rows = self.job_rows(job_id)
+        at = int(locator or 0)
+        chunk = rows.iloc[at : at + max_records]
+        chunk = serialise(chunk, "%Y-%m-%dT%H:%M:%S.000Z")
+        for name in chunk.columns:
+            if self.types[sobject].get(name) == "boolean":
+                chunk[name] = chunk[name].map({True: "true", False: "false"})
+        body = chunk.to_csv(index=False)
+        next_locator = at + max_records if at + max_records < len(rows) else "null"
+        return body, str(next_locator)
+
+    def delete_job(self, job_id):
+        with self.lock:
+            self.jobs.pop(job_id, None)
+
+
+class Handler(BaseHTTPRequestHandler):
+    org = None
+    latency = 0.0
+    verbose = False
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        limit_info = self.org.count_request()
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self.send_error_json(
+                SalesforceError(
+                    404, "NOT_FOUND", "The requested resource does not exist"
+                ),
+                limit_info,
+            )
+        try:
+            status, body, headers = getattr(self, name)(params, **match.groupdict())
+        except SalesforceError as e:
+            return self.send_error_json(e, limit_info)
+        headers["Sforce-Limit-Info"] = limit_info
+        self.send(status, body, headers)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def query(self, params, endpoint):
+        url = urlsplit(self.path).path.rstrip("/")
+        result = self.org.query(params.get("q", ""), endpoint == "queryAll", url)
+        return 200, result, {}
+
+    def query_more(self, params, endpoint, cursor, at):
+        url = urlsplit(self.path).path.rsplit("/", 1)[0]
+        return 200, self.org.page(url, cursor, int(at)), {}
+
+    def describe(self, params, sobject):
+        return 200, self.org.describe(sobject), {}
+
+    def create(self, params, sobject):
+        return 201, self.org.create(sobject, self.read_json()), {}
+
+    def submit_job(self, params):
+        return 200, self.org.submit_job(self.read_json()), {}
+
+    def job(self, params, job):
+        return 200, self.org.job(job), {}
+
+    def job_results(self, params, job):
+        max_records = int(params.get("maxRecords", 50000))
+        body, locator = self.org.job_results(job, max_records, params.get("locator"))
+        return 200, body, {"Content-Type": "text/csv", "Sforce-Locator": locator}
+
+    def delete_job(self, params, job):
+        self.org.delete_job(job)
+        return 204, None, {}
+
+    def send_error_json(self, error, limit_info):
+        body = [{"errorCode": error.code, "message": str(error)}]
+        self.send(error.status, body, {"Sforce-Limit-Info": limit_info})
+
+    def send(self, status, body, headers):
+        if body is None:
+            content = b""
+        elif isinstance(body, str):
+            content = body.encode("utf-8")
+        else:
+            content = json.dumps(body).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+# a stand-in server for org, waiting latency seconds before every answer.
+# Call serve_forever() on it, in a thread to run it next to the app
+def server(org, host="127.0.0.1", port=8765, latency=0.0, verbose=False):
+    handler = type(
+        "OrgHandler", (Handler,), {"org": org, "latency": latency, "verbose": verbose}
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a generated Salesforce org.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every request"
+    )
+    parser.add_argument("--api-limit", type=int, default=15000)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    org = Org(args.rows, args.seed, args.api_limit)
+    httpd = server(org, args.host, args.port, args.latency, args.verbose)
+    print(
+        "serving {} rows per object on http://{}:{}".format(
+            args.rows, args.host, args.port
+        ),
+        file=sys.stderr,
+    )
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
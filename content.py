@@ -5,23 +5,22 @@ import dash_core_components as dcc
 from dash.dependencies import Input, Output, State
 
 import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
 
 import os
 import sys
 import copy
 
-from src.graphs import dist_tenure, dist_monthlycharges, dist_totalcharges
-
 
 # DATA ANALYSIS
 
+# the distribution figures are filled in by render_analysis_tab when the tab
+# is first opened, building them at import took most of the startup
+
 card_tensure = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Graph(figure = dist_tenure(), config = {"displayModeBar": False}, style = {"height": "42vh"})
+                dcc.Graph(id="dist_tenure_graph", config = {"displayModeBar": False}, style = {"height": "42vh"})
             ]
         ),
     ],
@@ -32,7 +31,7 @@ card_monthlycharges = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Graph(figure = dist_monthlycharges(), config = {"displayModeBar": False}, style = {"height": "42vh"})
+                dcc.Graph(id="dist_monthlycharges_graph", config = {"displayModeBar": False}, style = {"height": "42vh"})
                     
             ]
         ),
@@ -46,7 +45,7 @@ card_totalcharges = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Graph(figure = dist_totalcharges(), config = {"displayModeBar": False}, style = {"height": "42vh"})
+                dcc.Graph(id="dist_totalcharges_graph", config = {"displayModeBar": False}, style = {"height": "42vh"})
             ]
         ),
     ],
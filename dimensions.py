@@ -0,0 +1,67 @@
+import sys
+
+import metrics
+from loader import dataset
+from store import frame_store
+
+
+# the words of a name, the missing parts (a contact without a salutation)
+# left out rather than making the whole name NaN
+def full_name(*parts):
+    name = parts[0].astype(object).fillna("")
+    for part in parts[1:]:
+        name = name + " " + part.astype(object).fillna("")
+    return name.str.split().str.join(" ")
+
+
+# display label of the rows of the small tables panels look names up in
+LABELS = {
+    "accounts": lambda df: df["Name"],
+    "contacts": lambda df: full_name(df["Salutation"], df["FirstName"], df["LastName"]),
+    "users": lambda df: full_name(df["FirstName"], df["LastName"]),
+}
+
+
+# {"label", "value"} dropdown options of a dimension, in the table order
+def dimension_options(df, name):
+    labels = LABELS[name](df).tolist()
+    return [{"label": l, "value": v} for l, v in zip(labels, df["Id"].tolist())]
+
+
+# accounts, contacts and users, read through frame_store like every dataset:
+# loaded on first use, then kept until the refresh scheduler publishes a new
+# version, on the interval of the table (REFRESH_INTERVALS, see scheduler.py)
+# and within the daily API budget it keeps. Labels and dropdown options are
+# derived once per version
+class DimensionCache:
+    def __init__(self):
+        self.versions = {}  # {name: version the memory was recorded for}
+        self.bytes = {}  # {name: approximate bytes held for the version}
+
+    # token of the current version of name, loaded on first use
+    def token(self, name):
+        dataset(name)
+        token = frame_store.token(name)
+        if self.versions.get(name) != token["version"]:
+            self.versions[name] = token["version"]
+            self.account(name, token)
+        return token
+
+    def table(self, name):
+        return frame_store.get(self.token(name))
+
+    def options(self, name):
+        return frame_store.derive(self.token(name), dimension_options, name)
+
+    # records the memory a version holds: the frame and the option dicts.
+    # Label strings shared with the frame (account names) are counted twice
+    def account(self, name, token):
+        df = frame_store.get(token)
+        options = frame_store.derive(token, dimension_options, name)
+        size = int(df.memory_usage(deep=True).sum()) + sys.getsizeof(options)
+        size += sum(sys.getsizeof(o) + sys.getsizeof(o["label"]) for o in options)
+        self.bytes[name] = size
+        metrics.dimension_bytes.set((name,), size)
+
+
+dimensions = DimensionCache()
@@ -0,0 +1,31 @@
+import gc
+import sys
+
+# import index.py once in the master, the workers are forked from it and
+# share its memory copy-on-write. Connections and locks are re-created in
+# each worker through os.register_at_fork, the refresh thread is started in
+# post_fork
+preload_app = True
+
+
+# objects created while importing the app live as long as the master, moving
+# them out of the collector's reach keeps a collection in a worker from
+# writing to, and so copying, the pages that hold them. When the churn app
+# is loaded, the model and figures src/graphs.py builds lazily are built
+# first so they are among the shared objects
+def pre_fork(server, worker):
+    graphs = sys.modules.get("src.graphs")
+    if graphs is not None:
+        graphs.warm()
+    gc.freeze()
+
+
+# runs in the worker. Without preload_app this is where index.py is first
+# imported
+def post_fork(server, worker):
+    server.log.info(
+        "worker %s shares %d frozen objects", worker.pid, gc.get_freeze_count()
+    )
+    import index
+
+    index.start_scheduler()
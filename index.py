@@ -1,82 +1,131 @@
+import logging
+import os
+import startup
+
+startup.install()
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
-from app import sf_manager, app
+from dash.exceptions import PreventUpdate
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+from app import app
+from loader import warm
+from store import frame_store
+from scheduler import RefreshScheduler
 from panels import overview, opportunities, cases, leads
 
+startup.mark("imports")
 
 server = app.server
 
-app.layout = html.Div(
-    [
-        html.Div(
-            className="row header",
-            children=[
-                html.Button(id="menu", children=dcc.Markdown("&#8801")),
-                html.Img(src=app.get_asset_url("oshin-logo-new-white-2.png")),
-                html.A(
-                    id="learn_more",
-                    children=html.Button("Learn More"),
-                    href="https://www.dataworksbi.com",
-                ),
-            ],
-        ),
-        html.Div(
-            id="tabs",
-            className="row tabs",
-            children=[
-                dcc.Link("Overview", href="/"),
-                dcc.Link("Opportunities", href="/"),
-                dcc.Link("Leads", href="/"),
-                dcc.Link("Cases", href="/"),
-            ],
-        ),
-        html.Div(
-            id="mobile_tabs",
-            className="row tabs",
-            style={"display": "none"},
-            children=[
-                dcc.Link("Overview", href="/"),
-                dcc.Link("Opportunities", href="/"),
-                dcc.Link("Leads", href="/"),
-                dcc.Link("Cases", href="/"),
-            ],
-        ),
-        dcc.Store(  # finance df
-            id="finance_df",
-            data="data/df_actual_vs_budget.csv",
-            #data=csv_manager.get_data(),
-        ),
-        dcc.Store(  # opportunities df
-            id="opportunities_df",
-            data=sf_manager.get_opportunities().to_json(orient="split"),
-        ),
-        dcc.Store(  # leads df
-            id="leads_df", data=sf_manager.get_leads().to_json(orient="split")
-        ),
-        dcc.Store(
-            id="cases_df", data=sf_manager.get_cases().to_json(orient="split")
-        ),  # cases df
-        dcc.Location(id="url", refresh=False),
-        html.Div(id="tab_content"),
-        html.Link(
-            href="https://use.fontawesome.com/releases/v5.2.0/css/all.css",
-            rel="stylesheet",
-        ),
-        html.Link(
-            href="https://fonts.googleapis.com/css?family=Dosis", rel="stylesheet"
-        ),
-        html.Link(
-            href="https://fonts.googleapis.com/css?family=Open+Sans", rel="stylesheet"
-        ),
-        html.Link(
-            href="https://fonts.googleapis.com/css?family=Ubuntu", rel="stylesheet"
-        ),
-    ],
-    className="row",
-    style={"margin": "0%"},
-)
+# datasets whose dcc.Store follows the server-side refreshes
+REFRESHED_STORES = ["opportunities", "leads", "cases"]
+
+# how often the browser asks for newer data versions
+REFRESH_POLL_SECONDS = int(os.getenv("REFRESH_POLL_SECONDS", "60"))
+
+scheduler = None
+
+
+# the refresh thread of a serving process, started by the post_fork hook of
+# every gunicorn worker (see gunicorn.conf.py) or before the development
+# server. Never at import: a preloaded master would run one nobody reads
+# from. REFRESH_IN_WORKERS=0 leaves the refreshes to the snapshot.py sidecar
+def start_scheduler():
+    global scheduler
+    if scheduler is None and os.getenv("REFRESH_IN_WORKERS", "1") == "1":
+        scheduler = RefreshScheduler(frame_store)
+        scheduler.start()
+
+
+# built for every page load, so the stores start with the tokens of the
+# frames this process holds then, not the version 0 tokens of the import
+def serve_layout():
+    return html.Div(
+        [
+            html.Div(
+                className="row header",
+                children=[
+                    html.Button(id="menu", children=dcc.Markdown("&#8801")),
+                    html.Img(src=app.get_asset_url("oshin-logo-new-white-2.png")),
+                    html.A(
+                        id="learn_more",
+                        children=html.Button("Learn More"),
+                        href="https://www.dataworksbi.com",
+                    ),
+                ],
+            ),
+            html.Div(
+                id="tabs",
+                className="row tabs",
+                children=[
+                    dcc.Link("Overview", href="/"),
+                    dcc.Link("Opportunities", href="/"),
+                    dcc.Link("Leads", href="/"),
+                    dcc.Link("Cases", href="/"),
+                ],
+            ),
+            html.Div(
+                id="mobile_tabs",
+                className="row tabs",
+                style={"display": "none"},
+                children=[
+                    dcc.Link("Overview", href="/"),
+                    dcc.Link("Opportunities", href="/"),
+                    dcc.Link("Leads", href="/"),
+                    dcc.Link("Cases", href="/"),
+                ],
+            ),
+            dcc.Store(  # finance df
+                id="finance_df",
+                data="data/df_actual_vs_budget.csv",
+                #data=csv_manager.get_data(),
+            ),
+            dcc.Store(  # opportunities df
+                id="opportunities_df",
+                data=frame_store.token("opportunities"),
+            ),
+            dcc.Store(  # leads df
+                id="leads_df",
+                data=frame_store.token("leads"),
+            ),
+            dcc.Store(
+                id="cases_df",
+                data=frame_store.token("cases"),
+            ),  # cases df
+            # tokens returned by the add callbacks of the panels
+            dcc.Store(id="opportunities_added"),
+            dcc.Store(id="leads_added"),
+            dcc.Store(id="cases_added"),
+            dcc.Interval(id="refresh_interval", interval=REFRESH_POLL_SECONDS * 1000),
+            dcc.Location(id="url", refresh=False),
+            html.Div(id="tab_content"),
+            html.Link(
+                href="https://use.fontawesome.com/releases/v5.2.0/css/all.css",
+                rel="stylesheet",
+            ),
+            html.Link(
+                href="https://fonts.googleapis.com/css?family=Dosis", rel="stylesheet"
+            ),
+            html.Link(
+                href="https://fonts.googleapis.com/css?family=Open+Sans", rel="stylesheet"
+            ),
+            html.Link(
+                href="https://fonts.googleapis.com/css?family=Ubuntu", rel="stylesheet"
+            ),
+        ],
+        className="row",
+        style={"margin": "0%"},
+    )
+
+
+app.layout = serve_layout
+
+startup.mark("layout")
 
 # Update the index
 
@@ -105,8 +154,38 @@ def display_page(pathname):
                 dcc.Markdown("**&#9632 " + tabName['name'] + "**"),
                 href=pathname,
             )
-            return globals()[tabName['name'].lower()].layout, tabs, tabs
-    return globals()[tabNames[0]['name'].lower()].layout, tabs, tabs
+            return panel_layout(tabName['name']), tabs, tabs
+    return panel_layout(tabNames[0]['name']), tabs, tabs
+
+
+# loads the data a panel needs on its first visit, then returns its layout
+def panel_layout(name):
+    panel = globals()[name.lower()]
+    warm(panel.datasets)
+    if callable(panel.layout):
+        return panel.layout()
+    return panel.layout
+
+
+# points the stores at the newest version of their data, after a background
+# refresh or an add, and leaves untouched the ones already up to date
+@app.callback(
+    [Output(key + "_df", "data") for key in REFRESHED_STORES],
+    [Input("refresh_interval", "n_intervals")]
+    + [Input(key + "_added", "data") for key in REFRESHED_STORES],
+    [State(key + "_df", "data") for key in REFRESHED_STORES],
+)
+def refresh_stores(n_intervals, *tokens):
+    added = tokens[: len(REFRESHED_STORES)]
+    current = tokens[len(REFRESHED_STORES) :]
+    updates = []
+    for key, added_token, token in zip(REFRESHED_STORES, added, current):
+        latest = frame_store.latest(key, added_token)
+        version = token["version"] if isinstance(token, dict) else 0
+        updates.append(latest if latest["version"] > version else dash.no_update)
+    if all(update is dash.no_update for update in updates):
+        raise PreventUpdate
+    return updates
 
 
 @app.callback(
@@ -122,5 +201,9 @@ def show_menu(n_clicks, tabs_style):
             tabs_style["display"] = "none"
     return tabs_style
 
+startup.mark("callbacks")
+startup.report()
+
 if __name__ == "__main__":
+    start_scheduler()
     app.run_server(debug=True)
@@ -0,0 +1,59 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app import sf_manager
+from store import frame_store
+
+logger = logging.getLogger(__name__)
+
+# every Salesforce object the dashboard reads, by the name the panels use
+DATASETS = {
+    "opportunities": lambda: sf_manager.get_opportunities(incremental=True),
+    "leads": lambda: sf_manager.get_leads(incremental=True),
+    "cases": lambda: sf_manager.get_cases(incremental=True),
+    "accounts": sf_manager.get_accounts,
+    "contacts": sf_manager.get_contacts,
+    "users": sf_manager.get_users,
+}
+
+# Salesforce object behind the datasets synced incrementally
+SOBJECTS = {"opportunities": "Opportunity", "leads": "Lead", "cases": "Case"}
+
+# upper bound on concurrent Salesforce queries during a load
+MAX_WORKERS = int(os.getenv("SF_LOAD_WORKERS", "6"))
+
+timings = {}  # seconds spent on the last load of each dataset
+
+
+def timed_load(name):
+    start = time.time()
+    current = frame_store.frames.get(name)
+    if current is not None and name in SOBJECTS:
+        # the store may hold a newer frame written by another worker
+        sf_manager.seed(SOBJECTS[name], current[1])
+    df = DATASETS[name]()
+    timings[name] = time.time() - start
+    logger.info("loaded %s: %d rows in %.2fs", name, len(df.index), timings[name])
+    return df
+
+
+for name in DATASETS:
+    frame_store.register(name, partial(timed_load, name))
+
+
+# loads the datasets this process does not hold yet (all of them by default)
+# concurrently into frame_store, called when a tab is opened so its data
+# arrives in one round of parallel queries
+def warm(names=None):
+    missing = [name for name in names or DATASETS if not frame_store.version(name)]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(missing))) as pool:
+            list(pool.map(frame_store.load, missing))
+
+
+# the current frame of a dataset, loaded on first use
+def dataset(name):
+    return frame_store.get({"key": name})
@@ -0,0 +1,202 @@
+import bisect
+import functools
+import threading
+import time
+
+from dash.exceptions import PreventUpdate
+from flask import Response, g, request
+
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [2**n for n in range(8, 24, 2)]  # 256 B to 4 MB
+
+
+def format_labels(names, values):
+    return ",".join('{}="{}"'.format(n, v) for n, v in zip(names, values))
+
+
+# Prometheus histogram keyed by a tuple of label values. Bucket counts are
+# kept per bucket and only made cumulative when rendered, so an observation
+# is one bisect and two additions under the lock
+class Histogram:
+    def __init__(self, name, description, buckets, labels):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}  # {label values: [bucket counts, sum]}
+
+    def observe(self, values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(values)
+            if series is None:
+                series = self.series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.description),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        with self.lock:
+            series = {key: (list(c), s) for key, (c, s) in self.series.items()}
+        for values, (counts, total) in sorted(series.items()):
+            labels = format_labels(self.labels, values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += count
+                lines.append(
+                    '{}_bucket{{{},le="{}"}} {}'.format(
+                        self.name, labels, bound, cumulative
+                    )
+                )
+            lines.append("{}_sum{{{}}} {}".format(self.name, labels, total))
+            lines.append("{}_count{{{}}} {}".format(self.name, labels, cumulative))
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}  # {label values: count}
+
+    def inc(self, values, amount=1):
+        with self.lock:
+            self.series[values] = self.series.get(values, 0) + amount
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.description),
+            "# TYPE {} counter".format(self.name),
+        ]
+        with self.lock:
+            series = dict(self.series)
+        for values, count in sorted(series.items()):
+            labels = format_labels(self.labels, values)
+            lines.append("{}{{{}}} {}".format(self.name, labels, count))
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.series = {}  # {label values: value}
+
+    def set(self, values, value):
+        self.series[values] = value
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.description),
+            "# TYPE {} gauge".format(self.name),
+        ]
+        for values, value in sorted(dict(self.series).items()):
+            labels = format_labels(self.labels, values)
+            lines.append("{}{{{}}} {}".format(self.name, labels, value))
+        return lines
+
+
+callback_seconds = Histogram(
+    "dash_callback_duration_seconds",
+    "Wall time spent in a callback.",
+    SECONDS_BUCKETS,
+    ["callback"],
+)
+callback_cpu_seconds = Histogram(
+    "dash_callback_cpu_seconds",
+    "CPU time the callback thread spent in a callback.",
+    SECONDS_BUCKETS,
+    ["callback"],
+)
+request_bytes = Histogram(
+    "dash_callback_request_bytes",
+    "Size of the _dash-update-component request body.",
+    BYTES_BUCKETS,
+    ["callback"],
+)
+response_bytes = Histogram(
+    "dash_callback_response_bytes",
+    "Size of the _dash-update-component response body.",
+    BYTES_BUCKETS,
+    ["callback"],
+)
+callback_exceptions = Counter(
+    "dash_callback_exceptions_total",
+    "Exceptions raised by a callback, PreventUpdate excluded.",
+    ["callback", "exception"],
+)
+dimension_bytes = Gauge(
+    "dimension_table_bytes",
+    "Memory held by a dimension table with its dropdown options.",
+    ["dimension"],
+)
+
+registry = [
+    callback_seconds,
+    callback_cpu_seconds,
+    request_bytes,
+    response_bytes,
+    callback_exceptions,
+    dimension_bytes,
+]
+
+
+# wraps func to record its wall and CPU time and its exceptions, and tags the
+# Flask request with its name for the payload sizes
+def timed(func):
+    name = "{}.{}".format(func.__module__, func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        g.dash_callback = name
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception as e:
+            callback_exceptions.inc((name, type(e).__name__))
+            raise
+        finally:
+            callback_seconds.observe((name,), time.perf_counter() - start)
+            callback_cpu_seconds.observe((name,), time.thread_time() - cpu_start)
+
+    return wrapper
+
+
+def record_payload(response):
+    name = g.get("dash_callback")
+    if name is not None:
+        request_bytes.observe((name,), request.content_length or 0)
+        response_bytes.observe((name,), response.calculate_content_length() or 0)
+    return response
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+# instruments every callback registered on app from now on and serves the
+# metrics of this process on /metrics. Call it before the panels are imported
+def instrument(app):
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+        return lambda func: decorator(timed(func))
+
+    app.callback = callback
+    app.server.after_request(record_payload)
+    app.server.route("/metrics")(render)
@@ -1,17 +1,39 @@
 # -*- coding: utf-8 -*-
+from itertools import cycle
+import numpy as np
 import pandas as pd
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_core_components as dcc
 import dash_html_components as html
 from plotly import graph_objs as go
+from plotly.colors import DEFAULT_PLOTLY_COLORS
 
 from app import app, indicator, sf_manager
+from rollup import Rollup
+from store import frame_store
+from dimensions import dimensions
+
+# Case fields used by this panel (Subject, OwnerId... are never read)
+sf_manager.register_fields(
+    "Case",
+    "cases",
+    [
+        "CreatedDate",
+        "Type",
+        "Reason",
+        "Status",
+        "Origin",
+        "Priority",
+        "IsDeleted",
+        "AccountId",
+    ],
+)
 
 colors = {"background": "#F3F6FA", "background_div": "white"}
 
-accounts = sf_manager.get_accounts()
-contacts = sf_manager.get_contacts()
-users = sf_manager.get_users()
+# loaded together the first time the Cases tab is opened
+datasets = ["cases", "accounts", "contacts"]
 
 # returns pie chart based on filters values
 # column makes the function reusable
@@ -66,47 +88,50 @@ def pie_chart(df, column, priority, origin):
     return {"data": [trace], "layout": layout}
 
 
-def cases_by_period(df, period, priority, origin):
+# cases with a type, reason and origin counted per period, priority and
+# type, once per data version
+def type_rollup(df):
     df = df.dropna(subset=["Type", "Reason", "Origin"])
-    stages = df["Type"].unique()
+    return Rollup(df, "CreatedDate", by="Priority", split="Type", week_lag=7)
 
-    # priority filtering
-    if priority != "all_p":
-        df = df[df["Priority"] == priority]
 
-    # period filtering
-    df["CreatedDate"] = pd.to_datetime(df["CreatedDate"], format="%Y-%m-%d")
-    if period == "W-MON":
-        df["CreatedDate"] = pd.to_datetime(df["CreatedDate"]) - pd.to_timedelta(
-            7, unit="d"
-        )
-    df = df.groupby([pd.Grouper(key="CreatedDate", freq=period), "Type"]).count()
-
-    dates = df.index.get_level_values("CreatedDate").unique()
-    dates = [str(i) for i in dates]
-
-    co = {  # colors for stages
-        "Electrical": "#264e86",
-        "Other": "#0074e4",
-        "Structural": "#74dbef",
-        "Mechanical": "#eff0f4",
-        "Electronic": "rgb(255, 127, 14)",
-    }
-
-    data = []
-    for stage in stages:
-        stage_rows = []
-        for date in dates:
-            try:
-                row = df.loc[(date, stage)]
-                stage_rows.append(row["IsDeleted"])
-            except Exception as e:
-                stage_rows.append(0)
-
-        data_trace = go.Bar(
-            x=dates, y=stage_rows, name=stage, marker=dict(color=co[stage])
+# accounts shown in the cases by account chart
+ACCOUNT_BARS = 20
+
+# colors of the case types in the stacked bars
+TYPE_COLORS = {
+    "Electrical": "#264e86",
+    "Other": "#0074e4",
+    "Structural": "#74dbef",
+    "Mechanical": "#eff0f4",
+    "Electronic": "rgb(255, 127, 14)",
+}
+SPARE_COLORS = [c for c in DEFAULT_PLOTLY_COLORS if c not in TYPE_COLORS.values()]
+
+
+# a color per type, types missing from TYPE_COLORS (a picklist value added
+# in Salesforce) take the spare colors in turn
+def type_colors(types):
+    spare = cycle(SPARE_COLORS)
+    return {t: TYPE_COLORS[t] if t in TYPE_COLORS else next(spare) for t in types}
+
+
+def cases_by_period(rollup, period, priority, origin):
+    counts = rollup.get(period, None if priority == "all_p" else priority)
+    # a zero column for the types without any case of this priority
+    counts = counts.reindex(columns=rollup.splits, fill_value=0)
+    dates = [str(i) for i in counts.index]
+    colors = type_colors(rollup.splits)
+
+    data = [
+        go.Bar(
+            x=dates,
+            y=counts[stage].tolist(),
+            name=stage,
+            marker=dict(color=colors[stage]),
         )
-        data.append(data_trace)
+        for stage in rollup.splits
+    ]
 
     layout = go.Layout(
         autosize=True,
@@ -119,19 +144,44 @@ def cases_by_period(df, period, priority, origin):
     return {"data": data, "layout": layout}
 
 
-def cases_by_account(cases):
-    cases = cases.dropna(subset=["AccountId"])
-    cases = pd.merge(cases, accounts, left_on="AccountId", right_on="Id")
-    cases = cases.groupby(["AccountId", "Name"]).count()
-    cases = cases.sort_values("IsDeleted")
+# accounts with one row per Id and the index the case AccountIds are looked
+# up in, derived once per accounts version. The index keeps its hash table
+# between lookups
+def account_index(accounts):
+    accounts = accounts.drop_duplicates("Id").reset_index(drop=True)
+    return accounts, pd.Index(accounts["Id"])
+
+
+# (accounts, number of cases of each account by position in accounts) for
+# the accounts version given. AccountId is encoded against the account Ids
+# and counted with bincount, cases of an account missing from accounts are
+# left out
+def account_case_counts(cases, accounts_version):
+    accounts, ids = frame_store.derive(
+        {"key": "accounts", "version": accounts_version}, account_index
+    )
+    codes = ids.get_indexer(cases["AccountId"])
+    counts = np.bincount(codes[codes >= 0], minlength=len(accounts.index))
+    # accounts without a name never had a bar
+    counts[accounts["Name"].isnull().to_numpy()] = 0
+    return accounts, counts
+
+
+# bars of the ACCOUNT_BARS accounts with the most cases, the names are only
+# looked up for those
+def cases_by_account(accounts, counts):
+    top = np.flatnonzero(counts)
+    if len(top) > ACCOUNT_BARS:
+        top = top[np.argpartition(counts[top], -ACCOUNT_BARS)[-ACCOUNT_BARS:]]
+    top = top[np.argsort(counts[top], kind="stable")]
     data = [
         go.Bar(
-            y=cases.index.get_level_values("Name"),
-            x=cases["IsDeleted"],
+            y=accounts["Name"].to_numpy()[top],
+            x=counts[top],
             orientation="h",
             marker=dict(color="#0073e4"),
         )
-    ]  # x could be any column value since its a count
+    ]
 
     layout = go.Layout(
         autosize=True,
@@ -144,15 +194,15 @@ def cases_by_account(cases):
     return {"data": data, "layout": layout}
 
 
+# value preselected in a dropdown, None when it has no options
+def first_value(options):
+    return options[0]["value"] if options else None
+
+
 # returns modal (hidden by default)
 def modal():
-    contacts["Name"] = (
-        contacts["Salutation"]
-        + " "
-        + contacts["FirstName"]
-        + " "
-        + contacts["LastName"]
-    )
+    accounts = dimensions.options("accounts")
+    contacts = dimensions.options("contacts")
     return html.Div(
         html.Div(
             [
@@ -198,15 +248,9 @@ def modal():
                                         html.Div(
                                             dcc.Dropdown(
                                                 id="new_case_account",
-                                                options=[
-                                                    {
-                                                        "label": row["Name"],
-                                                        "value": row["Id"],
-                                                    }
-                                                    for index, row in accounts.iterrows()
-                                                ],
+                                                options=accounts,
                                                 clearable=False,
-                                                value=accounts.iloc[0].Id,
+                                                value=first_value(accounts),
                                             )
                                         ),
                                         html.P(
@@ -318,15 +362,9 @@ def modal():
                                         html.Div(
                                             dcc.Dropdown(
                                                 id="new_case_contact",
-                                                options=[
-                                                    {
-                                                        "label": row["Name"],
-                                                        "value": row["Id"],
-                                                    }
-                                                    for index, row in contacts.iterrows()
-                                                ],
+                                                options=contacts,
                                                 clearable=False,
-                                                value=contacts.iloc[0].Id,
+                                                value=first_value(contacts),
                                             )
                                         ),
                                         html.P(
@@ -440,122 +478,132 @@ def modal():
     )
 
 
-layout = [
-    html.Div(
-        id="cases_grid",
-        children=[
-            html.Div(
-                className="control dropdown-styles",
-                children=dcc.Dropdown(
-                    id="cases_period_dropdown",
-                    options=[
-                        {"label": "By day", "value": "D"},
-                        {"label": "By week", "value": "W-MON"},
-                        {"label": "By month", "value": "M"},
+# built on each visit so the modal lists the current accounts and contacts
+def layout():
+    return [
+        html.Div(
+            id="cases_grid",
+            children=[
+                html.Div(
+                    className="control dropdown-styles",
+                    children=dcc.Dropdown(
+                        id="cases_period_dropdown",
+                        options=[
+                            {"label": "By day", "value": "D"},
+                            {"label": "By week", "value": "W-MON"},
+                            {"label": "By month", "value": "M"},
+                        ],
+                        value="D",
+                        clearable=False,
+                    ),
+                ),
+                html.Div(
+                    className="control dropdown-styles",
+                    children=dcc.Dropdown(
+                        id="priority_dropdown",
+                        options=[
+                            {"label": "All priority", "value": "all_p"},
+                            {"label": "High priority", "value": "High"},
+                            {"label": "Medium priority", "value": "Medium"},
+                            {"label": "Low priority", "value": "Low"},
+                        ],
+                        value="all_p",
+                        clearable=False,
+                    ),
+                ),
+                html.Div(
+                    className="control dropdown-styles",
+                    children=dcc.Dropdown(
+                        id="origin_dropdown",
+                        options=[
+                            {"label": "All origins", "value": "all"},
+                            {"label": "Phone", "value": "Phone"},
+                            {"label": "Web", "value": "Web"},
+                            {"label": "Email", "value": "Email"},
+                        ],
+                        value="all",
+                        clearable=False,
+                    ),
+                ),
+                html.Span(
+                    "Add new",
+                    id="new_case",
+                    n_clicks=0,
+                    className="button button--primary add pretty_container",
+                ),
+                html.Div(
+                    id="cases_indicators",
+                    className="row indicators",
+                    children=[
+                        indicator(
+                            "#00cc96", "Low priority cases", "left_cases_indicator"
+                        ),
+                        indicator(
+                            "#119DFF", "Medium priority cases", "middle_cases_indicator"
+                        ),
+                        indicator(
+                            "#EF553B", "High priority cases", "right_cases_indicator"
+                        ),
                     ],
-                    value="D",
-                    clearable=False,
                 ),
-            ),
-            html.Div(
-                className="control dropdown-styles",
-                children=dcc.Dropdown(
-                    id="priority_dropdown",
-                    options=[
-                        {"label": "All priority", "value": "all_p"},
-                        {"label": "High priority", "value": "High"},
-                        {"label": "Medium priority", "value": "Medium"},
-                        {"label": "Low priority", "value": "Low"},
+                html.Div(
+                    id="cases_types_container",
+                    className="pretty_container chart_div",
+                    children=[
+                        html.P("Cases Type"),
+                        dcc.Graph(
+                            id="cases_types",
+                            config=dict(displayModeBar=False),
+                            style={"height": "89%", "width": "98%"},
+                        ),
                     ],
-                    value="all_p",
-                    clearable=False,
                 ),
-            ),
-            html.Div(
-                className="control dropdown-styles",
-                children=dcc.Dropdown(
-                    id="origin_dropdown",
-                    options=[
-                        {"label": "All origins", "value": "all"},
-                        {"label": "Phone", "value": "Phone"},
-                        {"label": "Web", "value": "Web"},
-                        {"label": "Email", "value": "Email"},
+                html.Div(
+                    id="cases_reasons_container",
+                    className="chart_div pretty_container",
+                    children=[
+                        html.P("Cases Reasons"),
+                        dcc.Graph(
+                            id="cases_reasons", config=dict(displayModeBar=False)
+                        ),
                     ],
-                    value="all",
-                    clearable=False,
                 ),
-            ),
-            html.Span(
-                "Add new",
-                id="new_case",
-                n_clicks=0,
-                className="button button--primary add pretty_container",
-            ),
-            html.Div(
-                id="cases_indicators",
-                className="row indicators",
-                children=[
-                    indicator("#00cc96", "Low priority cases", "left_cases_indicator"),
-                    indicator(
-                        "#119DFF", "Medium priority cases", "middle_cases_indicator"
-                    ),
-                    indicator(
-                        "#EF553B", "High priority cases", "right_cases_indicator"
-                    ),
-                ],
-            ),
-            html.Div(
-                id="cases_types_container",
-                className="pretty_container chart_div",
-                children=[
-                    html.P("Cases Type"),
-                    dcc.Graph(
-                        id="cases_types",
-                        config=dict(displayModeBar=False),
-                        style={"height": "89%", "width": "98%"},
-                    ),
-                ],
-            ),
-            html.Div(
-                id="cases_reasons_container",
-                className="chart_div pretty_container",
-                children=[
-                    html.P("Cases Reasons"),
-                    dcc.Graph(id="cases_reasons", config=dict(displayModeBar=False)),
-                ],
-            ),
-            html.Div(
-                id="cases_by_period_container",
-                className="pretty_container chart_div",
-                children=[
-                    html.P("Cases over Time"),
-                    dcc.Graph(id="cases_by_period", config=dict(displayModeBar=False)),
-                ],
-            ),
-            html.Div(
-                id="cases_by_account_container",
-                className="pretty_container chart_div",
-                children=[
-                    html.P("Cases by Company"),
-                    dcc.Graph(id="cases_by_account", config=dict(displayModeBar=False)),
-                ],
-            ),
-        ],
-    ),
-    modal(),
-]
+                html.Div(
+                    id="cases_by_period_container",
+                    className="pretty_container chart_div",
+                    children=[
+                        html.P("Cases over Time"),
+                        dcc.Graph(
+                            id="cases_by_period", config=dict(displayModeBar=False)
+                        ),
+                    ],
+                ),
+                html.Div(
+                    id="cases_by_account_container",
+                    className="pretty_container chart_div",
+                    children=[
+                        html.P("Cases by Company"),
+                        dcc.Graph(
+                            id="cases_by_account", config=dict(displayModeBar=False)
+                        ),
+                    ],
+                ),
+            ],
+        ),
+        modal(),
+    ]
 
 
 @app.callback(Output("left_cases_indicator", "children"), [Input("cases_df", "data")])
 def left_cases_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     low = len(df[(df["Priority"] == "Low") & (df["Status"] == "New")]["Priority"].index)
     return dcc.Markdown("**{}**".format(low))
 
 
 @app.callback(Output("middle_cases_indicator", "children"), [Input("cases_df", "data")])
 def middle_cases_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     medium = len(
         df[(df["Priority"] == "Medium") & (df["Status"] == "New")]["Priority"].index
     )
@@ -564,7 +612,7 @@ def middle_cases_indicator_callback(df):
 
 @app.callback(Output("right_cases_indicator", "children"), [Input("cases_df", "data")])
 def right_cases_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     high = len(
         df[(df["Priority"] == "High") & (df["Status"] == "New")]["Priority"].index
     )
@@ -580,7 +628,7 @@ def right_cases_indicator_callback(df):
     ],
 )
 def cases_reasons_callback(priority, origin, df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     chart = pie_chart(df, "Reason", priority, origin)
     return chart
 
@@ -594,7 +642,7 @@ def cases_reasons_callback(priority, origin, df):
     ],
 )
 def cases_types_callback(priority, origin, df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     chart = pie_chart(df, "Type", priority, origin)
     chart["layout"]["legend"]["orientation"] = "h"
     return chart
@@ -610,14 +658,18 @@ def cases_types_callback(priority, origin, df):
     ],
 )
 def cases_period_callback(period, origin, priority, df):
-    df = pd.read_json(df, orient="split")
-    return cases_by_period(df, period, priority, origin)
+    rollup = frame_store.derive(df, type_rollup)
+    return cases_by_period(rollup, period, priority, origin)
 
 
 @app.callback(Output("cases_by_account", "figure"), [Input("cases_df", "data")])
 def cases_account_callback(df):
-    df = pd.read_json(df, orient="split")
-    return cases_by_account(df)
+    accounts_version = dimensions.token("accounts")["version"]
+    # one entry per cases version, replaced when the accounts version changes
+    accounts, counts = frame_store.derive_latest(
+        df, account_case_counts, accounts_version
+    )
+    return cases_by_account(accounts, counts)
 
 
 @app.callback(Output("cases_modal", "style"), [Input("new_case", "n_clicks")])
@@ -636,7 +688,7 @@ def close_modal_callback(n, n2):
 
 
 @app.callback(
-    Output("cases_df", "data"),
+    Output("cases_added", "data"),
     [Input("submit_new_case", "n_clicks")],
     [
         State("new_case_account", "value"),
@@ -648,7 +700,6 @@ def close_modal_callback(n, n2):
         State("new_case_status", "value"),
         State("new_case_description", "value"),
         State("new_case_priority", "value"),
-        State("cases_df", "data"),
     ],
 )
 def add_case_callback(
@@ -662,7 +713,6 @@ def add_case_callback(
     status,
     description,
     priority,
-    current_df,
 ):
     if n_clicks > 0:
         query = {
@@ -678,7 +728,8 @@ def add_case_callback(
         }
 
         sf_manager.add_case(query)
-        df = sf_manager.get_cases()
-        return df.to_json(orient="split")
+        df = sf_manager.get_cases(incremental=True)
+        return frame_store.put("cases", df)
 
-    return current_df
+    # the panel rendering fires it once before any click
+    raise PreventUpdate
@@ -1,11 +1,42 @@
 # -*- coding: utf-8 -*-
+import dash
 import pandas as pd
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_core_components as dcc
 import dash_html_components as html
 from plotly import graph_objs as go
 
-from app import app, indicator, df_to_table, sf_manager
+from app import app, indicator, table_rows, sf_manager
+from rollup import Rollup
+from store import frame_store
+
+# Lead fields used below, everything else is left out of the SOQL query
+sf_manager.register_fields(
+    "Lead", "leads", ["CreatedDate", "Status", "Company", "State", "LeadSource", "Id"]
+)
+
+# frames index.panel_layout() warms on the first visit of this tab
+datasets = ["leads"]
+
+# columns of the leads table, its page sizes and sort orders
+TABLE_COLUMNS = ["CreatedDate", "Status", "Company", "State", "LeadSource"]
+TABLE_PAGE_SIZES = [10, 25, 50, 100]
+TABLE_SORTS = [
+    {"label": "Newest first", "value": "CreatedDate:desc"},
+    {"label": "Oldest first", "value": "CreatedDate:asc"},
+    {"label": "By status", "value": "Status:asc"},
+    {"label": "By company", "value": "Company:asc"},
+    {"label": "By state", "value": "State:asc"},
+    {"label": "By source", "value": "LeadSource:asc"},
+]
+
+# statuses of the lead_source_dropdown values, "all" keeps every lead
+STATUS_FILTERS = {
+    "open": ["Open - Not Contacted", "Working - Contacted"],
+    "converted": ["Closed - Converted"],
+    "lost": ["Closed - Not Converted"],
+}
 
 states = [
     "AL",
@@ -137,20 +168,17 @@ def lead_source(status, df):
     return dict(data=[trace], layout=layout)
 
 
-def converted_leads_count(period, df):
-    df["CreatedDate"] = pd.to_datetime(df["CreatedDate"], format="%Y-%m-%d")
-    df = df[df["Status"] == "Closed - Converted"]
+# leads counted per period and status, once per data version
+def status_rollup(df):
+    return Rollup(df, "CreatedDate", by="Status")
 
-    df = (
-        df.groupby([pd.Grouper(key="CreatedDate", freq=period)])
-        .count()
-        .reset_index()
-        .sort_values("CreatedDate")
-    )
+
+def converted_leads_count(period, rollup):
+    counts = rollup.get(period, "Closed - Converted")
 
     trace = go.Scatter(
-        x=df["CreatedDate"],
-        y=df["Id"],
+        x=counts.index,
+        y=counts.to_numpy(),
         name="converted leads",
         fill="tozeroy",
         fillcolor="#e6f2ff",
@@ -169,6 +197,38 @@ def converted_leads_count(period, df):
     return {"data": data, "layout": layout}
 
 
+# df with the positions of its rows sorted by column, missing values last.
+# Computed once per data version through frame_store.derive, every page and
+# status filter of the table reuses it. The frame is returned with the
+# positions so pages are always cut from the frame they were sorted from.
+# Categorical columns sort by their values, not by the order of categories
+# the frame happened to be built with
+def table_order(df, column, ascending):
+    values = df[column].reset_index(drop=True)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    order = values.sort_values(
+        ascending=ascending, kind="mergesort", na_position="last"
+    )
+    return df, order.index.to_numpy()
+
+
+# the positions in order of the leads with status
+def filter_order(df, order, status):
+    if status not in STATUS_FILTERS:
+        return order
+    keep = df["Status"].isin(STATUS_FILTERS[status]).to_numpy()
+    return order[keep[order]]
+
+
+# table rows of the leads at positions
+def leads_table_rows(df, positions):
+    rows = df.take(positions)[TABLE_COLUMNS]
+    return table_rows(
+        rows.assign(CreatedDate=rows["CreatedDate"].dt.strftime("%Y-%m-%d"))
+    )
+
+
 def modal():
     return html.Div(
         html.Div(
@@ -395,7 +455,50 @@ layout = [
                     ),
                 ],
             ),
-            html.Div(id="leads_table", className="row pretty_container table"),
+            html.Div(
+                id="leads_table",
+                className="row pretty_container table",
+                children=[
+                    html.Div(
+                        className="table_controls",
+                        children=[
+                            html.Div(
+                                className="two columns dd-styles",
+                                children=dcc.Dropdown(
+                                    id="leads_table_sort",
+                                    options=TABLE_SORTS,
+                                    value="CreatedDate:desc",
+                                    clearable=False,
+                                ),
+                            ),
+                            html.Div(
+                                className="two columns dd-styles",
+                                children=dcc.Dropdown(
+                                    id="leads_table_page_size",
+                                    options=[
+                                        {"label": "{} per page".format(n), "value": n}
+                                        for n in TABLE_PAGE_SIZES
+                                    ],
+                                    value=25,
+                                    clearable=False,
+                                ),
+                            ),
+                            html.Button("<", id="leads_table_prev", n_clicks=0),
+                            html.Span(id="leads_table_position"),
+                            html.Button(">", id="leads_table_next", n_clicks=0),
+                        ],
+                    ),
+                    html.Table(
+                        [
+                            html.Thead(
+                                html.Tr([html.Th(col) for col in TABLE_COLUMNS])
+                            ),
+                            html.Tbody(id="leads_table_rows"),
+                        ]
+                    ),
+                    dcc.Store(id="leads_table_page", data=0),
+                ],
+            ),
         ],
     ),
     modal(),
@@ -405,7 +508,7 @@ layout = [
 # updates left indicator based on df updates
 @app.callback(Output("left_leads_indicator", "children"), [Input("leads_df", "data")])
 def left_leads_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     converted_leads = len(df[df["Status"] == "Closed - Converted"].index)
     return dcc.Markdown("**{}**".format(converted_leads))
 
@@ -413,7 +516,7 @@ def left_leads_indicator_callback(df):
 # updates middle indicator based on df updates
 @app.callback(Output("middle_leads_indicator", "children"), [Input("leads_df", "data")])
 def middle_leads_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     open_leads = len(
         df[
             (df["Status"] == "Open - Not Contacted")
@@ -426,7 +529,7 @@ def middle_leads_indicator_callback(df):
 # updates right indicator based on df updates
 @app.callback(Output("right_leads_indicator", "children"), [Input("leads_df", "data")])
 def right_leads_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     converted_leads = len(df[df["Status"] == "Closed - Converted"].index)
     lost_leads = len(df[df["Status"] == "Closed - Not Converted"].index)
     conversion_rates = converted_leads / (converted_leads + lost_leads) * 100
@@ -440,7 +543,7 @@ def right_leads_indicator_callback(df):
     [Input("lead_source_dropdown", "value"), Input("leads_df", "data")],
 )
 def lead_source_callback(status, df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     return lead_source(status, df)
 
 
@@ -450,28 +553,50 @@ def lead_source_callback(status, df):
     [Input("lead_source_dropdown", "value"), Input("leads_df", "data")],
 )
 def map_callback(status, df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     return choropleth_map(status, df)
 
 
-# update table based on dropdown's value and df updates
+# renders one page of the table, only its rows are sent to the browser. The
+# buttons move between pages, any other change goes back to the first one
 @app.callback(
-    Output("leads_table", "children"),
-    [Input("lead_source_dropdown", "value"), Input("leads_df", "data")],
+    [
+        Output("leads_table_rows", "children"),
+        Output("leads_table_position", "children"),
+        Output("leads_table_page", "data"),
+    ],
+    [
+        Input("lead_source_dropdown", "value"),
+        Input("leads_df", "data"),
+        Input("leads_table_sort", "value"),
+        Input("leads_table_page_size", "value"),
+        Input("leads_table_prev", "n_clicks"),
+        Input("leads_table_next", "n_clicks"),
+    ],
+    [State("leads_table_page", "data")],
 )
-def leads_table_callback(status, df):
-    df = pd.read_json(df, orient="split")
-    if status == "open":
-        df = df[
-            (df["Status"] == "Open - Not Contacted")
-            | (df["Status"] == "Working - Contacted")
-        ]
-    elif status == "converted":
-        df = df[df["Status"] == "Closed - Converted"]
-    elif status == "lost":
-        df = df[df["Status"] == "Closed - Not Converted"]
-    df = df[["CreatedDate", "Status", "Company", "State", "LeadSource"]]
-    return df_to_table(df)
+def leads_table_callback(status, df, sort, page_size, prev, next, page):
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    page = page or 0
+    if "leads_table_prev.n_clicks" in triggered:
+        page -= 1
+    elif "leads_table_next.n_clicks" in triggered:
+        page += 1
+    else:
+        page = 0
+
+    column, direction = sort.split(":")
+    df, order = frame_store.derive(df, table_order, column, direction == "asc")
+    order = filter_order(df, order, status)
+    total = len(order)
+    pages = max(1, -(-total // page_size))
+    page = min(max(page, 0), pages - 1)
+    first = page * page_size
+    rows = leads_table_rows(df, order[first : first + page_size])
+    position = "{}-{} of {} leads".format(
+        min(first + 1, total), min(first + page_size, total), total
+    )
+    return rows, position, page
 
 
 # update pie chart figure based on dropdown's value and df updates
@@ -480,8 +605,7 @@ def leads_table_callback(status, df):
     [Input("converted_leads_dropdown", "value"), Input("leads_df", "data")],
 )
 def converted_leads_callback(period, df):
-    df = pd.read_json(df, orient="split")
-    return converted_leads_count(period, df)
+    return converted_leads_count(period, frame_store.derive(df, status_rollup))
 
 
 # hide/show modal
@@ -501,19 +625,18 @@ def close_modal_callback(n, n2):
     return 0
 
 
-# add new lead to salesforce and stores new df in hidden div
+# add new lead to salesforce, index.py forwards the new token to leads_df
 @app.callback(
-    Output("leads_df", "data"),
+    Output("leads_added", "data"),
     [Input("submit_new_lead", "n_clicks")],
     [
         State("new_lead_status", "value"),
         State("new_lead_state", "value"),
         State("new_lead_company", "value"),
         State("new_lead_source", "value"),
-        State("leads_df", "data"),
     ],
 )
-def add_lead_callback(n_clicks, status, state, company, source, current_df):
+def add_lead_callback(n_clicks, status, state, company, source):
     if n_clicks > 0:
         if company == "":
             company = "Not named yet"
@@ -525,7 +648,8 @@ def add_lead_callback(n_clicks, status, state, company, source, current_df):
             "LeadSource": source,
         }
         sf_manager.add_lead(query)
-        df = sf_manager.get_leads()
-        return df.to_json(orient="split")
+        df = sf_manager.get_leads(incremental=True)
+        return frame_store.put("leads", df)
 
-    return current_df
+    # the panel rendering fires it once before any click
+    raise PreventUpdate
@@ -2,44 +2,57 @@
 from datetime import date
 import pandas as pd
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_core_components as dcc
 import dash_html_components as html
 from plotly import graph_objs as go
 
 from app import app, indicator, millify, df_to_table, sf_manager
+from pivot import pivot
+from sfManager import sync_basis
+from rollup import Rollup
+from store import frame_store
+from topk import TopK
+
+# Opportunity fields used by the charts and tables of this panel
+sf_manager.register_fields(
+    "Opportunity",
+    "opportunities",
+    [
+        "CreatedDate",
+        "Name",
+        "StageName",
+        "Amount",
+        "LeadSource",
+        "IsWon",
+        "IsClosed",
+        "Type",
+        "Probability",
+    ],
+)
 
+# Salesforce datasets loaded the first time this tab is opened
+datasets = ["opportunities"]
 
-def converted_opportunities(period, source, df):
-    df["CreatedDate"] = pd.to_datetime(df["CreatedDate"], format="%Y-%m-%d")
 
-    # source filtering
-    if source == "all_s":
-        df = df[df["IsWon"] == 1]
-    else:
-        df = df[(df["LeadSource"] == source) & (df["IsWon"] == 1)]
+# won opportunities counted per period and lead source, once per data version
+def won_rollup(df):
+    return Rollup(df[df["IsWon"] == 1], "CreatedDate", by="LeadSource", week_lag=7)
 
-    # period filtering
-    if period == "W-MON":
-        df["CreatedDate"] = pd.to_datetime(df["CreatedDate"]) - pd.to_timedelta(
-            7, unit="d"
-        )
-    df = (
-        df.groupby([pd.Grouper(key="CreatedDate", freq=period)])
-        .count()
-        .reset_index()
-        .sort_values("CreatedDate")
-    )
+
+def converted_opportunities(period, source, rollup):
+    counts = rollup.get(period, None if source == "all_s" else source)
 
     # if no results were found
-    if df.empty:
+    if counts.empty:
         layout = dict(
             autosize=True, annotations=[dict(text="No results found", showarrow=False)]
         )
         return {"data": [], "layout": layout}
 
     trace = go.Scatter(
-        x=df["CreatedDate"],
-        y=df["IsWon"],
+        x=counts.index,
+        y=counts.to_numpy(),
         name="converted opportunities",
         fill="tozeroy",
         fillcolor="#e6f2ff",
@@ -59,16 +72,30 @@ def converted_opportunities(period, source, df):
 
 
 # returns heat map figure
-def heat_map_fig(df, x, y):
-    z = []
-    for lead_type in y:
-        z_row = []
-        for stage in x:
-            probability = df[(df["StageName"] == stage) & (df["Type"] == lead_type)][
-                "Probability"
-            ].mean()
-            z_row.append(probability)
-        z.append(z_row)
+# stages of the heatmap dropdown options, "all_s" shows every stage
+HEATMAP_STAGES = {
+    "cold": ["Needs Analysis", "Prospecting", "Qualification"],
+    "warm": ["Value Proposition", "Id. Decision Makers", "Perception Analysis"],
+    "hot": ["Proposal/Price Quote", "Negotiation/Review", "Closed Won"],
+}
+
+
+# mean probability of every (Type, StageName) pair, rows and columns in the
+# order the types and stages first appear in df
+def probability_matrix(df):
+    matrix = pivot(df, "Type", "StageName", "Probability", "mean")
+    typed = pd.notnull(df["Type"])
+    return matrix.reindex(
+        index=list(df["Type"][typed].unique()),
+        columns=list(df["StageName"][typed].unique()),
+    )
+
+
+# heatmap of the stages x of a probability_matrix, stages without any
+# opportunity are left blank
+def heat_map_fig(matrix, x):
+    y = list(matrix.index)
+    z = matrix.reindex(columns=x).values.tolist()
 
     trace = dict(
         type="heatmap", z=z, x=x, y=y, name="mean probability", colorscale="Blues"
@@ -80,27 +107,66 @@ def heat_map_fig(df, x, y):
         plot_bgcolor="white",
     )
 
-    return go.Figure(data=[trace], layout=layout)
+    # a plain figure dict skips the validation of every z value by go.Figure
+    return {"data": [trace], "layout": layout}
+
+
+TOP_COLUMNS = ["CreatedDate", "Name", "Amount", "StageName"]
+TOP_KINDS = ["open", "lost"]
+
+
+# the 5 opportunities of a top table: the smallest amounts for "open", as
+# the table has always shown, the largest Closed Lost amounts for "lost"
+def top_opportunities(df, kind):
+    if kind == "lost":
+        where = df["StageName"] == "Closed Lost"
+        top = TopK.of(df, 5, "Amount", TOP_COLUMNS, largest=True, where=where)
+    else:
+        top = TopK.of(df, 5, "Amount", TOP_COLUMNS, largest=False)
+    top.basis = sync_basis(df)
+    return top
+
+
+def top_table(top):
+    df = top.frame()
+    # only display 30 characters
+    df["Name"] = df["Name"].str[:30]
+    df["CreatedDate"] = df["CreatedDate"].dt.strftime("%Y-%m-%d")
+    return df_to_table(df)
 
 
 # returns top 5 open opportunities
 def top_open_opportunities(df):
-    df = df.sort_values("Amount", ascending=True)
-    cols = ["CreatedDate", "Name", "Amount", "StageName"]
-    df = df[cols].iloc[:5]
-    # only display 21 characters
-    df["Name"] = df["Name"].apply(lambda x: x[:30])
-    return df_to_table(df)
+    return top_table(top_opportunities(df, "open"))
 
 
 # returns top 5 lost opportunities
 def top_lost_opportunities(df):
-    df = df[df["StageName"] == "Closed Lost"]
-    cols = ["CreatedDate", "Name", "Amount", "StageName"]
-    df = df[cols].sort_values("Amount", ascending=False).iloc[:5]
-    # only display 21 characters
-    df["Name"] = df["Name"].apply(lambda x: x[:30])
-    return df_to_table(df)
+    return top_table(top_opportunities(df, "lost"))
+
+
+# gives the version an add published the top tables of the previous one
+# with the new opportunities pushed in, when the sync behind it only
+# appended rows to a frame with the basis those tables were selected from
+def advance_top_opportunities(token, appended):
+    if appended is None:
+        return
+    start, end, rows = appended
+    # read before any is replaced, which drops the older versions
+    tops = {
+        kind: frame_store.derived_result(token["key"], top_opportunities, kind)
+        for kind in TOP_KINDS
+    }
+    for kind, top in tops.items():
+        if top is None or top.basis != start:
+            continue
+        top = top.copy()
+        if kind == "lost":
+            top.push(rows[rows["StageName"] == "Closed Lost"])
+        else:
+            top.push(rows)
+        top.basis = end
+        frame_store.put_derived(token, top_opportunities, top, kind)
 
 
 # returns modal (hidden by default)
@@ -473,19 +539,12 @@ layout = [
     [Input("heatmap_dropdown", "value"), Input("opportunities_df", "data")],
 )
 def heat_map_callback(stage, df):
-    df = pd.read_json(df, orient="split")
-    df = df[pd.notnull(df["Type"])]
-    x = []
-    y = df["Type"].unique()
+    matrix = frame_store.derive(df, probability_matrix)
     if stage == "all_s":
-        x = df["StageName"].unique()
-    elif stage == "cold":
-        x = ["Needs Analysis", "Prospecting", "Qualification"]
-    elif stage == "warm":
-        x = ["Value Proposition", "Id. Decision Makers", "Perception Analysis"]
+        x = list(matrix.columns)
     else:
-        x = ["Proposal/Price Quote", "Negotiation/Review", "Closed Won"]
-    return heat_map_fig(df, x, y)
+        x = HEATMAP_STAGES.get(stage, HEATMAP_STAGES["hot"])
+    return heat_map_fig(matrix, x)
 
 
 # updates converted opportunity count graph based on dropdowns values or df updates
@@ -498,8 +557,8 @@ def heat_map_callback(stage, df):
     ],
 )
 def converted_opportunity_callback(period, source, df):
-    df = pd.read_json(df, orient="split")
-    return converted_opportunities(period, source, df)
+    rollup = frame_store.derive(df, won_rollup)
+    return converted_opportunities(period, source, rollup)
 
 
 # updates left indicator value based on df updates
@@ -508,7 +567,7 @@ def converted_opportunity_callback(period, source, df):
     [Input("opportunities_df", "data")],
 )
 def left_opportunities_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     won = millify(str(df[df["IsWon"] == 1]["Amount"].sum()))
     return dcc.Markdown("**{}**".format(won))
 
@@ -519,7 +578,7 @@ def left_opportunities_indicator_callback(df):
     [Input("opportunities_df", "data")],
 )
 def middle_opportunities_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     active = millify(str(df[(df["IsClosed"] == 0)]["Amount"].sum()))
     return dcc.Markdown("**{}**".format(active))
 
@@ -530,7 +589,7 @@ def middle_opportunities_indicator_callback(df):
     [Input("opportunities_df", "data")],
 )
 def right_opportunities_indicator_callback(df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     lost = millify(str(df[(df["IsWon"] == 0) & (df["IsClosed"] == 1)]["Amount"].sum()))
     return dcc.Markdown("**{}**".format(lost))
 
@@ -557,9 +616,10 @@ def close_modal_callback(n, n2):
     return 0
 
 
-# add new opportunity to salesforce and stores new df in hidden div
+# add new opportunity to salesforce, the new token reaches opportunities_df
+# through the refresh callback in index.py
 @app.callback(
-    Output("opportunities_df", "data"),
+    Output("opportunities_added", "data"),
     [Input("submit_new_opportunity", "n_clicks")],
     [
         State("new_opportunity_name", "value"),
@@ -569,11 +629,10 @@ def close_modal_callback(n, n2):
         State("new_opportunity_date", "date"),
         State("new_opportunity_type", "value"),
         State("new_opportunity_source", "value"),
-        State("opportunities_df", "data"),
     ],
 )
 def add_opportunity_callback(
-    n_clicks, name, stage, amount, probability, date, o_type, source, current_df
+    n_clicks, name, stage, amount, probability, date, o_type, source
 ):
     if n_clicks > 0:
         if name == "":
@@ -590,11 +649,14 @@ def add_opportunity_callback(
 
         sf_manager.add_opportunity(query)
 
-        df = sf_manager.get_opportunities()
-
-        return df.to_json(orient="split")
+        df = sf_manager.get_opportunities(incremental=True)
+        token = frame_store.put("opportunities", df)
+        appended = sf_manager.appended("Opportunity", df)
+        advance_top_opportunities(token, appended)
+        return token
 
-    return current_df
+    # the panel rendering fires it once before any click
+    raise PreventUpdate
 
 
 # updates top open opportunities based on df updates
@@ -602,8 +664,7 @@ def add_opportunity_callback(
     Output("top_open_opportunities", "children"), [Input("opportunities_df", "data")]
 )
 def top_open_opportunities_callback(df):
-    df = pd.read_json(df, orient="split")
-    return top_open_opportunities(df)
+    return top_table(frame_store.derive(df, top_opportunities, "open"))
 
 
 # updates top lost opportunities based on df updates
@@ -611,5 +672,4 @@ def top_open_opportunities_callback(df):
     Output("top_lost_opportunities", "children"), [Input("opportunities_df", "data")]
 )
 def top_lost_opportunities_callback(df):
-    df = pd.read_json(df, orient="split")
-    return top_lost_opportunities(df)
+    return top_table(frame_store.derive(df, top_opportunities, "lost"))
@@ -7,6 +7,13 @@ import dash_html_components as html
 from plotly import graph_objs as go
 
 from app import app, indicator, millify, df_to_table, sf_manager
+from store import frame_store, read_csv
+
+# the overview only reads won amounts from the opportunities frame
+sf_manager.register_fields("Opportunity", "overview", ["IsWon", "Amount"])
+
+# the overview renders from the opportunities frame only
+datasets = ["opportunities"]
 
 def currentMonth():
     today = date.today()
@@ -27,7 +34,7 @@ def actual_vs_budget(mu, product, df):
 
     df = (
         df.groupby([pd.Grouper(key="Quarter")])
-        .sum()
+        .sum(numeric_only=True)
         .reset_index()
         .sort_values("Quarter")
     )
@@ -83,7 +90,7 @@ def finance_indicator(mu, product, df, account):
 
     df = (
         df.groupby([pd.Grouper(key="Month")])
-        .sum()
+        .sum(numeric_only=True)
         .reset_index()
         .sort_values("Month")
     )
@@ -112,7 +119,7 @@ def sales_pipeline(mu, product, df):
 
     df_f = (
         df_f.groupby([pd.Grouper(key="Quarter")])
-        .sum()
+        .sum(numeric_only=True)
         .reset_index()
         .sort_values("Quarter")
     )
@@ -121,7 +128,7 @@ def sales_pipeline(mu, product, df):
 
     df_p = (
         df_p.groupby([pd.Grouper(key="Quarter")])
-        .sum()
+        .sum(numeric_only=True)
         .reset_index()
         .sort_values("Quarter")
     )
@@ -570,7 +577,7 @@ layout = [
     ],
 )
 def actual_vs_budget_callback(market_unit, product, df):
-    df = pd.read_csv(df)
+    df = read_csv(df)
     return actual_vs_budget(market_unit, product, df)
 
 @app.callback(
@@ -582,7 +589,7 @@ def actual_vs_budget_callback(market_unit, product, df):
     ],
 )
 def sales_pipeline_callback(market_unit, product, df):
-    df = pd.read_csv(df)
+    df = read_csv(df)
     return sales_pipeline(market_unit, product, df)
 
 @app.callback(
@@ -594,7 +601,7 @@ def sales_pipeline_callback(market_unit, product, df):
     ],
 )
 def left_finance_indicator_callback(market_unit, product, df):
-    df = pd.read_csv(df)
+    df = read_csv(df)
     val = finance_indicator(market_unit, product, df, "Revenue")
     return dcc.Markdown("**{}**".format(val))
     
@@ -607,7 +614,7 @@ def left_finance_indicator_callback(market_unit, product, df):
     ],
 )
 def indicator2_callback(market_unit, product, df):
-    df = pd.read_csv(df)
+    df = read_csv(df)
     val = finance_indicator(market_unit, product, df, "Net Income")
     return dcc.Markdown("**{}**".format(val))
 
@@ -620,6 +627,6 @@ def indicator2_callback(market_unit, product, df):
     ],
 )
 def indicator3_callback(market_unit, product, df):
-    df = pd.read_json(df, orient="split")
+    df = frame_store.get(df)
     won = millify(str(df[df["IsWon"] == 1]["Amount"].count()))
     return dcc.Markdown("**{}**".format(won))
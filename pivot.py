@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+AGGREGATES = ["mean", "sum", "count", "weighted"]
+
+
+# aggfunc of values for every (index, columns) pair of df in one groupby
+# pass, as a frame with a row per index value and a column per columns value.
+# "weighted" is the mean of values weighted by the weights column. Pairs
+# without any row are NaN, or 0 for sum and count
+def pivot(df, index, columns, values, aggfunc="mean", weights=None):
+    if aggfunc not in AGGREGATES:
+        raise ValueError("aggfunc must be one of {}".format(", ".join(AGGREGATES)))
+    keys = [df[index], df[columns]]
+    if aggfunc == "weighted":
+        valid = df[values].notnull() & df[weights].notnull()
+        weight = df[weights].where(valid)
+        total = (df[values] * weight).groupby(keys, observed=True).sum()
+        weight_total = weight.groupby(keys, observed=True).sum()
+        result = total / weight_total.replace(0, np.nan)
+    else:
+        result = df[values].groupby(keys, observed=True).agg(aggfunc)
+
+    fill_value = 0 if aggfunc in ("sum", "count") else None
+    matrix = result.unstack(columns, fill_value=fill_value)
+    # categorical keys give categorical labels, which only reindex against
+    # their own categories
+    matrix.index = pd.Index(matrix.index, dtype=object)
+    matrix.columns = pd.Index(matrix.columns, dtype=object)
+    return matrix
@@ -0,0 +1,60 @@
+import pandas as pd
+
+# periods of the "By day / By week / By month" dropdowns
+PERIODS = ["D", "W-MON", "M"]
+
+
+# row counts of a frame per period bucket of a date column, for every value
+# of the column by and for all the rows (None), computed once so the period
+# and filter dropdowns of a chart only look them up. The counts are a Series
+# by bucket, or with split a frame with a column per split value, with a
+# zero for every empty bucket between the first and the last one as a
+# pd.Grouper gives them (over a categorical split too). Weekly labels can be
+# moved back week_lag days, which is the same as moving every row back
+class Rollup:
+    def __init__(self, df, column, by=None, split=None, week_lag=0):
+        self.split = split
+        # split values in order of appearance, the order of the chart traces
+        self.splits = [] if split is None else list(pd.unique(df[split].dropna()))
+        self.counts = {}  # {(period, value of by or None): counts}
+        # the columns keep their dtype, categories make the groupby cheaper
+        frame = pd.DataFrame({"date": pd.to_datetime(df[column])})
+        for name in (by, split):
+            if name is not None:
+                frame[name] = df[name]
+        # sorted once here, a pd.Grouper sorts unordered dates every time
+        frame = frame.sort_values("date", kind="mergesort")
+
+        for period in PERIODS:
+            lag = week_lag if period == "W-MON" else 0
+            bucket = pd.Grouper(key="date", freq=period)
+            keys = [] if split is None else [split]
+            self.counts[(period, None)] = self.shape(
+                frame.groupby([bucket] + keys, observed=True).size(), period, lag
+            )
+            if by is None:
+                continue
+            counts = frame.groupby([bucket, by] + keys, observed=True).size()
+            for value, value_counts in counts.groupby(level=1, observed=True):
+                value_counts = value_counts.droplevel(1)
+                self.counts[(period, value)] = self.shape(value_counts, period, lag)
+
+    def shape(self, counts, period, lag):
+        if self.split is not None:
+            counts = counts.unstack(self.split, fill_value=0)
+        if not counts.empty:
+            buckets = pd.date_range(counts.index.min(), counts.index.max(), freq=period)
+            counts = counts.reindex(buckets, fill_value=0)
+        if lag:
+            counts.index = counts.index - pd.to_timedelta(lag, unit="d")
+        return counts
+
+    # the counts of period for the rows whose by column is value, or all of
+    # them. A value without any row gets empty counts
+    def get(self, period, value=None):
+        counts = self.counts.get((period, value))
+        if counts is not None:
+            return counts
+        if self.split is None:
+            return pd.Series([], index=pd.DatetimeIndex([]), dtype="int64")
+        return pd.DataFrame(index=pd.DatetimeIndex([]))
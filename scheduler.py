@@ -0,0 +1,84 @@
+import logging
+import os
+import threading
+import time
+
+from sfTrace import budget
+
+logger = logging.getLogger(__name__)
+
+# seconds between two refreshes of each dataset, 0 disables it. Overridden
+# with REFRESH_INTERVALS="leads=120,accounts=0"
+DEFAULT_INTERVALS = {
+    "opportunities": 300,
+    "leads": 300,
+    "cases": 300,
+    "accounts": 3600,
+    "contacts": 3600,
+    "users": 3600,
+}
+
+
+def parse_intervals(spec):
+    intervals = dict(DEFAULT_INTERVALS)
+    for item in filter(None, spec.split(",")):
+        key, seconds = item.split("=")
+        intervals[key.strip()] = int(seconds)
+    return intervals
+
+
+# daemon thread refreshing the datasets held in a FrameStore on their own
+# interval. FrameStore.refresh builds the new frame without holding the locks
+# readers take and swaps it in with one assignment, so readers keep using the
+# previous frame until the swap and never wait on a refresh
+class RefreshScheduler(threading.Thread):
+    def __init__(self, store, intervals=None):
+        threading.Thread.__init__(self, name="refresh-scheduler", daemon=True)
+        self.store = store
+        if intervals is None:
+            intervals = parse_intervals(os.getenv("REFRESH_INTERVALS", ""))
+        self.intervals = {key: s for key, s in intervals.items() if s > 0}
+        self.due = {key: time.time() + s for key, s in self.intervals.items()}
+        self.stopped = threading.Event()
+        # share of the daily Salesforce API limit kept for interactive use,
+        # refreshes are skipped once less than this remains
+        self.reserve = float(os.getenv("REFRESH_MIN_BUDGET", "0"))
+
+    def stop(self):
+        self.stopped.set()
+
+    # refreshes key now, returns True when a new frame was published
+    def refresh(self, key):
+        if key not in self.store.frames:
+            return False  # never requested in this process, stay lazy
+        if not budget.allows(self.reserve):
+            logger.warning(
+                "skipping refresh of %s, %d of %d daily API requests used",
+                key,
+                budget.used,
+                budget.limit,
+            )
+            return False
+        start = time.time()
+        # a worker sharing a snapshot only adopts what another one refreshed
+        # during the last interval
+        if self.store.refresh(key, max_age=self.intervals[key]) is None:
+            return False
+        logger.info("refreshed %s in %.2fs", key, time.time() - start)
+        return True
+
+    def run(self):
+        while not self.stopped.is_set():
+            now = time.time()
+            for key in sorted(self.due, key=self.due.get):
+                if self.due[key] > now:
+                    break
+                try:
+                    self.refresh(key)
+                except Exception:
+                    logger.exception("refresh of %s failed", key)
+                self.due[key] = time.time() + self.intervals[key]
+            if self.due:
+                self.stopped.wait(max(0, min(self.due.values()) - time.time()))
+            else:
+                self.stopped.wait()
@@ -0,0 +1,165 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from urllib.parse import unquote_plus, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+import sfTrace
+
+# SF_BACKEND picks what sf_Manager talks to:
+#   live    the org USERNAME, PASSWORD and TOKEN log in to (the default)
+#   record  the live org, every response is also saved under SF_RECORDINGS
+#   replay  the responses saved under SF_RECORDINGS, without any network
+#   local   the stand-in server of benchmarks/standin.py at SF_LOCAL_URL
+BACKENDS = ["live", "record", "replay", "local"]
+BACKEND = os.getenv("SF_BACKEND", "live")
+RECORDINGS = os.getenv("SF_RECORDINGS", "recordings")
+LOCAL_URL = os.getenv("SF_LOCAL_URL", "http://127.0.0.1:8765")
+
+if BACKEND not in BACKENDS:
+    raise ValueError(
+        "SF_BACKEND={} is not one of {}".format(BACKEND, ", ".join(BACKENDS))
+    )
+
+# the replayed client needs an instance to build its URLs, nothing resolves it
+REPLAY_INSTANCE = "replay.invalid"
+# response headers worth keeping, the rest describe the original transfer
+SAVED_HEADERS = ["Content-Type", "Sforce-Limit-Info", "Sforce-Locator"]
+# the session id and instance URLs of a login response, masked in recordings
+SECRET = re.compile(
+    r"<(sessionId|serverUrl|metadataServerUrl)>[^<]*</\1>"
+    r'|"(access_token|instance_url)"\s*:\s*"[^"]*"'
+)
+# the SystemModstamp literal of an incremental sync, different on every run
+WATERMARK = re.compile(
+    r"(SystemModstamp\s*[<>]?=?\s*)\d{4}-\d\d-\d\dT[\d:.]+(Z|[+-]\d\d:?\d\d)"
+)
+
+
+# keyword arguments logging a Salesforce client in. Only the live org needs
+# credentials, the other backends accept any session id
+def credentials():
+    if BACKEND == "replay":
+        return {"instance": REPLAY_INSTANCE, "session_id": "replay"}
+    if BACKEND == "local":
+        return {"instance": urlsplit(LOCAL_URL).netloc, "session_id": "local"}
+    # Create a free SalesForce account: https://developer.salesforce.com/signup
+    return {
+        "username": os.getenv("USERNAME"),
+        "password": os.getenv("PASSWORD"),
+        "security_token": os.getenv("TOKEN"),
+    }
+
+
+# replacement of a SECRET match
+def mask(match):
+    if match.group(1):
+        return "<{0}>masked</{0}>".format(match.group(1))
+    return '"{}": "masked"'.format(match.group(2))
+
+
+# text with the SystemModstamp literals of SOQL queries replaced, None when
+# it has none
+def without_watermark(text):
+    normalised = WATERMARK.sub(r"\1:watermark", text)
+    return None if normalised == text else normalised
+
+
+# file a request is recorded in: the method, the path with its query string
+# and the body, not the host or the session id, so recordings of one org
+# replay against any instance. The watermark of an incremental sync is left
+# out too, so a replayed sync finds the delta recorded whatever its
+# watermark
+def recording_path(request):
+    path = request.path_url
+    body = request.body or b""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    path = without_watermark(unquote_plus(path)) or path
+    body = without_watermark(body) or body
+    digest = hashlib.sha1()
+    digest.update("{} {}\n".format(request.method, path).encode())
+    digest.update(body.encode())
+    return os.path.join(RECORDINGS, digest.hexdigest() + ".json.gz")
+
+
+# response hook of the record backend. A request made twice (a job polled
+# until it completes, a query run on every refresh) keeps its last response.
+# The session a login returns is masked, a replay never logs in
+def save(response, *args, **kwargs):
+    if response.status_code == 401:
+        return  # an expired session, the retry after the login is recorded
+    request = response.request
+    recording = {
+        "method": request.method,
+        "path": request.path_url,
+        "status": response.status_code,
+        "headers": {
+            name: response.headers[name]
+            for name in SAVED_HEADERS
+            if name in response.headers
+        },
+        "body": SECRET.sub(mask, response.content.decode("utf-8")),
+    }
+    os.makedirs(RECORDINGS, exist_ok=True)
+    path = recording_path(request)
+    fd, staging = tempfile.mkstemp(dir=RECORDINGS, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(gzip.compress(json.dumps(recording).encode()))
+    os.replace(staging, path)
+
+
+# transport adapter answering every request from the recordings, a request
+# that was never recorded gets the 404 Salesforce would give an unknown URL
+class ReplayAdapter(BaseAdapter):
+    def send(self, request, **kwargs):
+        path = recording_path(request)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                recording = json.load(f)
+        except FileNotFoundError:
+            message = "no recording of {} {}".format(request.method, request.path_url)
+            recording = {
+                "status": 404,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps([{"errorCode": "NOT_FOUND", "message": message}]),
+            }
+
+        response = requests.Response()
+        response.status_code = recording["status"]
+        response.headers = CaseInsensitiveDict(recording["headers"])
+        response._content = recording["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(0)
+        return response
+
+    def close(self):
+        pass
+
+
+# simple_salesforce only builds https URLs, the stand-in serves plain HTTP
+class LocalAdapter(HTTPAdapter):
+    def send(self, request, **kwargs):
+        request.url = "http://" + request.url[len("https://") :]
+        return super().send(request, **kwargs)
+
+
+# the traced requests session of a Salesforce client, wired to the backend
+def session():
+    backend_session = sfTrace.session()
+    if BACKEND == "record":
+        backend_session.hooks["response"].append(save)
+    elif BACKEND == "replay":
+        backend_session.mount("https://", ReplayAdapter())
+    elif BACKEND == "local":
+        backend_session.mount("https://", LocalAdapter())
+    return backend_session
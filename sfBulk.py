@@ -0,0 +1,118 @@
+import io
+import time
+
+import pandas as pd
+import requests
+from simple_salesforce.exceptions import SalesforceExpiredSession, SalesforceError
+
+from sfSchema import apply_types, csv_dtypes
+
+# Bulk API 2.0 query jobs need API version 47.0 or newer
+BULK_API_VERSION = "47.0"
+
+
+# thin client for the Bulk API 2.0 query endpoints, instance_url can point at
+# a real org or at a local HTTP stand-in that implements the same routes
+class BulkClient:
+    def __init__(
+        self,
+        instance_url,
+        session_id,
+        api_version=BULK_API_VERSION,
+        session=None,
+        page_size=50000,
+        poll_interval=0.5,
+        max_poll_interval=5.0,
+        timeout=600,
+    ):
+        self.base_url = "{}/services/data/v{}/jobs/query".format(
+            instance_url.rstrip("/"), api_version
+        )
+        self.session = session or requests.Session()
+        self.headers = {
+            "Authorization": "Bearer " + session_id,
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        self.page_size = page_size
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        response = self.session.request(method, url, headers=self.headers, **kwargs)
+        if response.status_code == 401:
+            raise SalesforceExpiredSession(
+                url, response.status_code, "jobs/query", response.content
+            )
+        if response.status_code >= 300:
+            raise SalesforceError(
+                url, response.status_code, "jobs/query", response.content
+            )
+        return response
+
+    # creates a query job and returns its id
+    def submit(self, soql):
+        job = {
+            "operation": "query",
+            "query": soql,
+            "contentType": "CSV",
+            "columnDelimiter": "COMMA",
+            "lineEnding": "LF",
+        }
+        return self.request("POST", self.base_url, json=job).json()["id"]
+
+    # polls the job with a growing interval until Salesforce has finished it
+    def wait(self, job_id):
+        url = "{}/{}".format(self.base_url, job_id)
+        interval = self.poll_interval
+        deadline = time.time() + self.timeout
+        while True:
+            state = self.request("GET", url).json()["state"]
+            if state == "JobComplete":
+                return
+            if state in ("Failed", "Aborted"):
+                raise SalesforceError(url, 200, "jobs/query", state)
+            if time.time() > deadline:
+                raise SalesforceError(url, 200, "jobs/query", "timed out")
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    # yields the raw CSV result pages, following the Sforce-Locator header
+    def iter_pages(self, job_id):
+        url = "{}/{}/results".format(self.base_url, job_id)
+        params = {"maxRecords": self.page_size}
+        while True:
+            response = self.request("GET", url, params=params)
+            yield response.content
+            locator = response.headers.get("Sforce-Locator")
+            if not locator or locator == "null":
+                return
+            params["locator"] = locator
+
+    # best effort, completed jobs count against the org storage otherwise
+    def delete(self, job_id):
+        try:
+            self.request("DELETE", "{}/{}".format(self.base_url, job_id))
+        except (SalesforceError, requests.RequestException):
+            pass
+
+    # runs soql as a Bulk job and yields one typed DataFrame per result page
+    def iter_frames(self, soql, types=None):
+        job_id = self.submit(soql)
+        try:
+            self.wait(job_id)
+            for page in self.iter_pages(job_id):
+                if not page.strip():
+                    continue
+                df = pd.read_csv(
+                    io.BytesIO(page),
+                    dtype=csv_dtypes(types or {}),
+                    true_values=["true"],
+                    false_values=["false"],
+                    keep_default_na=False,
+                    na_values=[""],
+                )
+                yield apply_types(df, types)
+        finally:
+            self.delete(job_id)
@@ -1,110 +1,436 @@
 from simple_salesforce import Salesforce
-from simple_salesforce.exceptions import SalesforceExpiredSession
+from simple_salesforce.exceptions import (
+    SalesforceExpiredSession,
+    SalesforceMalformedRequest,
+)
 import pandas as pd
 import os
+import threading
+import time
+import weakref
+
+import sfBackend
+import sfTrace
+from sfBulk import BulkClient
+from sfSchema import (
+    COMPOUND_TYPES,
+    describe_types,
+    schema_hash,
+    records_to_df,
+    concat_frames,
+)
+
+# fields every incrementally synced object needs on top of the panel fields
+SYNC_FIELDS = ["Id", "SystemModstamp", "IsDeleted"]
+
+
+# the newest SystemModstamp of a non-empty frame as a SOQL literal. SOQL
+# wants "...T12:00:00Z", truncating the milliseconds only means rows stamped
+# within the same second are fetched again
+def frame_watermark(df):
+    stamp = pd.to_datetime(df["SystemModstamp"]).max()
+    return stamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# rows of a delta the resident frame already holds with the same
+# SystemModstamp, fetched again rather than changed
+def unchanged(resident, delta):
+    known = resident.loc[resident["Id"].isin(delta["Id"]), ["Id", "SystemModstamp"]]
+    stamps = known.drop_duplicates("Id").set_index("Id")["SystemModstamp"]
+    same = (delta["Id"].map(stamps) == delta["SystemModstamp"]).to_numpy()
+    return same & ~(delta["IsDeleted"] == True).to_numpy()
+
+
+# (watermark, rows) of a synced frame, the same for every copy of it (the
+# resident frame, the one in frame_store, its snapshot)
+def sync_basis(df):
+    if df.empty or "SystemModstamp" not in df.columns:
+        return None
+    return frame_watermark(df), len(df.index)
+
+
+# whether Salesforce rejected a query because it names a field the org no
+# longer has (content is the parsed error list of the response)
+def invalid_field(error):
+    content = error.content
+    if not isinstance(content, list) or not content:
+        return False
+    return (
+        isinstance(content[0], dict) and content[0].get("errorCode") == "INVALID_FIELD"
+    )
+
+
+# sf_Manager instances of the process, re-initialised in a forked child by
+# one hook registered at import rather than one per instance
+instances = weakref.WeakSet()
+
+
+def after_fork():
+    for instance in list(instances):
+        instance.after_fork()
+
+
+os.register_at_fork(after_in_child=after_fork)
 
 
 class sf_Manager:
     def __init__(self):
-        # Create a free SalesForce account: https://developer.salesforce.com/signup
-        self.sf = Salesforce(
-            username=os.getenv("USERNAME"),
-            password=os.getenv("PASSWORD"),
-            security_token=os.getenv("TOKEN"),
-        )
+        self.lock = threading.RLock()
+        self.local = threading.local()  # one Salesforce client per thread
+        self.generation = 0  # bumped on every login so threads rebuild clients
+        self.frames = {}  # resident DataFrames kept up to date by sync()
+        self.watermarks = {}  # last SystemModstamp seen per object
+        # {sobject: (basis before, basis after, rows)} when the last sync of
+        # sobject only added new records, see sync_basis()
+        self.appends = {}
+        self.sync_locks = {}  # one lock per object so syncs do not interleave
+        self.descriptions = {}  # cached describe() results per object
+        self.describe_ttl = int(os.getenv("SF_DESCRIBE_TTL", "3600"))
+        self.projections = {}  # {sobject: {panel: fields}} see register_fields()
+        self.synced_fields = {}  # field list each resident frame was synced with
+        # objects holding at least this many rows are extracted through the
+        # Bulk API 2.0 instead of REST, 0 turns the Bulk path off
+        self.bulk_threshold = int(os.getenv("SF_BULK_THRESHOLD", "50000"))
+        instances.add(self)
+
+    # a forked gunicorn worker gets fresh locks and clients: the parent's
+    # connection pools and any lock held by another parent thread at fork
+    # time must not be shared. The session id itself stays valid
+    def after_fork(self):
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.sync_locks = {}
 
+    @sfTrace.traced
     def login(self):
-        # Create a free SalesForce account: https://developer.salesforce.com/signup
-        self.sf = Salesforce(
-            username=os.getenv("USERNAME"),
-            password=os.getenv("PASSWORD"),
-            security_token=os.getenv("TOKEN"),
-        )
+        generation = getattr(self.local, "generation", None)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return 0  # another thread already renewed the session
+            sfTrace.logins.inc(("expired" if self.generation else "initial",))
+            client = Salesforce(session=sfBackend.session(), **sfBackend.credentials())
+            self.session_id = client.session_id
+            self.instance = client.sf_instance
+            self.version = client.sf_version
+            self.generation += 1
+            self.local.client = client
+            self.local.generation = self.generation
         return 0
 
-    def dict_to_df(self, query_result, date=True):
-        items = {
-            val: dict(query_result["records"][val])
-            for val in range(query_result["totalSize"])
-        }
-        df = pd.DataFrame.from_dict(items, orient="index").drop(["attributes"], axis=1)
-
-        if date:  # date indicates if the df contains datetime column
-            df["CreatedDate"] = pd.to_datetime(
-                df["CreatedDate"], format="%Y-%m-%d"
-            )  # convert to datetime
-            df["CreatedDate"] = df["CreatedDate"].dt.strftime(
-                "%Y-%m-%d"
-            )  # reset string
-        return df
-
-    def get_leads(self):
+    # requests sessions are not thread safe, so every thread talks to
+    # Salesforce through its own client sharing the logged in session id.
+    # The first use logs in, importing the app opens no connection
+    @property
+    def sf(self):
+        if not self.generation:
+            with self.lock:
+                if not self.generation:
+                    self.login()
+        if getattr(self.local, "generation", None) != self.generation:
+            self.local.client = Salesforce(
+                instance=self.instance,
+                session_id=self.session_id,
+                version=self.version,
+                session=sfBackend.session(),
+            )
+            self.local.generation = self.generation
+        return self.local.client
+
+    # describe() result of sobject, cached for describe_ttl seconds. When a
+    # refresh comes back with a different schema hash, the resident frame and
+    # watermark built from the old schema are dropped
+    @sfTrace.traced
+    def describe(self, sobject, refresh=False):
+        cached = self.descriptions.get(sobject)
+        if cached and not refresh and time.time() - cached["time"] < self.describe_ttl:
+            return cached["desc"]
+
         try:
-            desc = self.sf.Lead.describe()
+            desc = getattr(self.sf, sobject).describe()
         except SalesforceExpiredSession as e:
             self.login()
-            desc = self.sf.Lead.describe()
+            desc = getattr(self.sf, sobject).describe()
+
+        desc_hash = schema_hash(desc)
+        if cached and cached["hash"] != desc_hash:
+            self.invalidate(sobject)
+        self.descriptions[sobject] = {
+            "desc": desc,
+            "hash": desc_hash,
+            "time": time.time(),
+        }
+        return desc
 
-        field_names = [field["name"] for field in desc["fields"]]
-        soql = "SELECT {} FROM Lead".format(",".join(field_names))
-        query_result = self.sf.query_all(soql)
-        leads = self.dict_to_df(query_result)
-        return leads
+    def field_types(self, sobject):
+        return describe_types(self.describe(sobject))
 
-    def get_opportunities(self):
-        query_text = "SELECT CreatedDate, Name, StageName, ExpectedRevenue, Amount, LeadSource, IsWon, IsClosed, Type, Probability FROM Opportunity"
+    # forgets the resident frame of sobject so the next sync is a full pull
+    def invalidate(self, sobject):
+        self.frames.pop(sobject, None)
+        self.watermarks.pop(sobject, None)
+        self.synced_fields.pop(sobject, None)
+
+    # panels declare the fields they read so only their union is queried
+    def register_fields(self, sobject, panel, fields):
+        self.projections.setdefault(sobject, {})[panel] = list(fields)
+
+    # fields to query for sobject: the union of the registered projections
+    # (or default, or every field when neither exists) that the current
+    # describe still knows about, in describe order
+    def projection(self, sobject, default=None):
+        requested = set()
+        for fields in self.projections.get(sobject, {}).values():
+            requested.update(fields)
+        requested = requested or default
+        types = self.field_types(sobject)
+        if not requested:
+            return list(types)
+        return [name for name in types if name in requested]
+
+    # full or incremental pull of the projected fields of sobject. A query
+    # rejected because a field disappeared since the describe was cached
+    # refreshes the describe and is retried once, any other rejection is
+    # raised as is
+    @sfTrace.traced
+    def load(self, sobject, incremental=False, default=None):
         try:
-            query_result = self.sf.query(query_text)
-        except SalesforceExpiredSession as e:
-            self.login()
-            query_result = self.sf.query(query_text)
-        opportunities = self.dict_to_df(query_result)
-        return opportunities
+            return self.fetch(sobject, incremental, default)
+        except SalesforceMalformedRequest as e:
+            if not invalid_field(e):
+                raise
+            self.describe(sobject, refresh=True)
+            return self.fetch(sobject, incremental, default)
+
+    def fetch(self, sobject, incremental=False, default=None):
+        fields = self.projection(sobject, default)
+        types = self.field_types(sobject)
+        if incremental:
+            return self.sync(sobject, fields, types)
+        return self.extract(sobject, fields, types)
 
-    def get_cases(self):
-        query_text = "SELECT CreatedDate, Type, Reason, Status, Origin, Subject, Priority, IsClosed, OwnerId, IsDeleted, AccountId FROM Case"
+    # yields the records of a SOQL query one batch (up to 2000 rows) at a
+    # time, following nextRecordsUrl until the result set is exhausted
+    @sfTrace.traced
+    def iter_batches(self, query_text, include_deleted=False):
         try:
-            query_result = self.sf.query(query_text)
+            result = self.sf.query(query_text, include_deleted=include_deleted)
         except SalesforceExpiredSession as e:
             self.login()
-            query_result = self.sf.query(query_text)
+            result = self.sf.query(query_text, include_deleted=include_deleted)
+        yield result["records"]
 
-        cases = self.dict_to_df(query_result)
-        return cases
+        while not result["done"]:
+            next_url = result["nextRecordsUrl"]
+            try:
+                result = self.sf.query_more(
+                    next_url, identifier_is_url=True, include_deleted=include_deleted
+                )
+            except SalesforceExpiredSession as e:
+                self.login()
+                result = self.sf.query_more(
+                    next_url, identifier_is_url=True, include_deleted=include_deleted
+                )
+            yield result["records"]
 
-    def get_contacts(self):
-        query_text = "SELECT Id, Salutation, FirstName, LastName FROM Contact"
+    # returns every row of a SOQL query as a DataFrame, each batch is
+    # converted to typed columns as soon as it arrives so only one page of
+    # raw records is held in memory at a time
+    def query_df(self, query_text, fields, types=None, include_deleted=False):
+        chunks = [
+            records_to_df(records, fields, types)
+            for records in self.iter_batches(query_text, include_deleted)
+            if records
+        ]
+        if not chunks:
+            return records_to_df([], fields, types)
+        return concat_frames(chunks)
+
+    # returns the number of rows of sobject, used to choose REST or Bulk
+    @sfTrace.traced
+    def count(self, sobject):
+        query_text = "SELECT COUNT() FROM {}".format(sobject)
         try:
             query_result = self.sf.query(query_text)
         except SalesforceExpiredSession as e:
             self.login()
             query_result = self.sf.query(query_text)
+        return query_result["totalSize"]
 
-        contacts = self.dict_to_df(query_result, False)
-        return contacts
+    def bulk_client(self):
+        return BulkClient(
+            "https://" + self.sf.sf_instance,
+            self.sf.session_id,
+            session=self.sf.session,
+        )
 
-    def get_users(self):
-        query_text = "SELECT Id,FirstName, LastName FROM User"
+    # runs a query as a Bulk API 2.0 job, each CSV result page is parsed
+    # straight into a typed DataFrame chunk
+    @sfTrace.traced
+    def bulk_query_df(self, query_text, fields, types=None):
         try:
-            query_result = self.sf.query(query_text)
+            chunks = list(self.bulk_client().iter_frames(query_text, types))
         except SalesforceExpiredSession as e:
             self.login()
-            query_result = self.sf.query(query_text)
+            chunks = list(self.bulk_client().iter_frames(query_text, types))
+
+        if not chunks:
+            return records_to_df([], fields, types)
+        return concat_frames(chunks)
+
+    # full pull of sobject through REST, or through Bulk API 2.0 when the
+    # record-count probe says the object is large enough to be worth a job
+    def extract(self, sobject, fields, types=None):
+        bulk = self.bulk_threshold and self.count(sobject) >= self.bulk_threshold
+        if bulk:
+            types = types or {}
+            fields = [f for f in fields if types.get(f) not in COMPOUND_TYPES]
+
+        query_text = "SELECT {} FROM {}".format(", ".join(fields), sobject)
+        if bulk:
+            return self.bulk_query_df(query_text, fields, types)
+        return self.query_df(query_text, fields, types)
+
+    # pulls only rows of sobject modified since the last sync (including
+    # deleted ones through queryAll) and merges them into the resident frame,
+    # the first call for an object is a full pull that seeds the watermark
+    @sfTrace.traced
+    def sync(self, sobject, fields, types=None):
+        with self.lock:
+            sync_lock = self.sync_locks.setdefault(sobject, threading.Lock())
+        with sync_lock:
+            return self.sync_delta(sobject, fields, types)
+
+    def sync_delta(self, sobject, fields, types=None):
+        fields = list(fields) + [f for f in SYNC_FIELDS if f not in fields]
+        if set(self.synced_fields.get(sobject) or []) != set(fields):
+            self.invalidate(sobject)  # a panel asked for new fields
+            self.synced_fields[sobject] = fields
+        watermark = self.watermarks.get(sobject)
+        if watermark is None:
+            delta = self.extract(sobject, fields, types)
+        else:
+            query_text = "SELECT {} FROM {} WHERE SystemModstamp > {}".format(
+                ", ".join(fields), sobject, watermark
+            )
+            delta = self.query_df(query_text, fields, types, include_deleted=True)
+
+        resident = self.frames.get(sobject)
+        if resident is not None and not delta.empty:
+            # the rows stamped within the watermark second come back as they are
+            delta = delta[~unchanged(resident, delta)]
+        if delta.empty:
+            if resident is None:
+                resident = delta
+                self.frames[sobject] = resident
+            return resident
+
+        deleted = delta["IsDeleted"] == True
+        if resident is None:
+            merged = delta[~deleted].reset_index(drop=True)
+            self.appends.pop(sobject, None)
+        else:
+            # build a new frame rather than updating the resident one in place
+            replaced = resident["Id"].isin(delta["Id"])
+            merged = concat_frames([resident[~replaced], delta[~deleted]])
+            if replaced.any() or deleted.any():
+                self.appends.pop(sobject, None)
+            else:
+                self.appends[sobject] = (
+                    (watermark, len(resident.index)),
+                    (frame_watermark(delta), len(merged.index)),
+                    delta,
+                )
 
-        users = self.dict_to_df(query_result, False)
+        self.watermarks[sobject] = frame_watermark(delta)
+        self.frames[sobject] = merged
+        return merged
+
+    # (basis before, basis after, rows added) when frame is the resident
+    # frame of sobject and the sync that built it only added new records.
+    # Structures derived from a frame with the basis before can be brought
+    # to the frame after by adding the rows
+    def appended(self, sobject, frame):
+        entry = self.appends.get(sobject)
+        if entry is None or self.frames.get(sobject) is not frame:
+            return None
+        return entry
+
+    # takes over a frame synced by another process (through the snapshot),
+    # unless this one already holds newer data, so the next sync only asks
+    # for the rows changed since that frame
+    def seed(self, sobject, df):
+        if df.empty or "SystemModstamp" not in df.columns:
+            return
+        if self.frames.get(sobject) is df:
+            return
+        watermark = frame_watermark(df)
+        with self.lock:
+            sync_lock = self.sync_locks.setdefault(sobject, threading.Lock())
+        with sync_lock:
+            if watermark >= self.watermarks.get(sobject, ""):
+                self.frames[sobject] = df
+                self.watermarks[sobject] = watermark
+                self.synced_fields[sobject] = list(df.columns)
+
+    @sfTrace.traced
+    def get_leads(self, incremental=False):
+        return self.load("Lead", incremental)
+
+    @sfTrace.traced
+    def get_opportunities(self, incremental=False):
+        fields = [
+            "CreatedDate",
+            "Name",
+            "StageName",
+            "ExpectedRevenue",
+            "Amount",
+            "LeadSource",
+            "IsWon",
+            "IsClosed",
+            "Type",
+            "Probability",
+        ]
+        return self.load("Opportunity", incremental, fields)
+
+    @sfTrace.traced
+    def get_cases(self, incremental=False):
+        fields = [
+            "CreatedDate",
+            "Type",
+            "Reason",
+            "Status",
+            "Origin",
+            "Subject",
+            "Priority",
+            "IsClosed",
+            "OwnerId",
+            "IsDeleted",
+            "AccountId",
+        ]
+        return self.load("Case", incremental, fields)
+
+    @sfTrace.traced
+    def get_contacts(self):
+        fields = ["Id", "Salutation", "FirstName", "LastName"]
+        query_text = "SELECT {} FROM Contact".format(", ".join(fields))
+        contacts = self.query_df(query_text, fields)
+        return contacts
+
+    @sfTrace.traced
+    def get_users(self):
+        fields = ["Id", "FirstName", "LastName"]
+        query_text = "SELECT {} FROM User".format(", ".join(fields))
+        users = self.query_df(query_text, fields)
         return users
 
+    @sfTrace.traced
     def get_accounts(self):
-        query_text = "SELECT Id, Name FROM Account"
-        try:
-            query_result = self.sf.query(query_text)
-        except SalesforceExpiredSession as e:
-            self.login()
-            query_result = self.sf.query(query_text)
-
-        accounts = self.dict_to_df(query_result, False)
+        fields = ["Id", "Name"]
+        query_text = "SELECT {} FROM Account".format(", ".join(fields))
+        accounts = self.query_df(query_text, fields)
         return accounts
 
+    @sfTrace.traced
     def add_lead(self, query):
         try:
             self.sf.Lead.create(query)
@@ -113,6 +439,7 @@ class sf_Manager:
             self.sf.Lead.create(query)
         return 0
 
+    @sfTrace.traced
     def add_opportunity(self, query):
         try:
             self.sf.Opportunity.create(query)
@@ -121,6 +448,7 @@ class sf_Manager:
             self.sf.Opportunity.create(query)
         return 0
 
+    @sfTrace.traced
     def add_case(self, query):
         try:
             self.sf.Case.create(query)
@@ -0,0 +1,78 @@
+import hashlib
+import json
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Salesforce describe field types grouped by the dtype they are stored as
+BOOLEAN_TYPES = ["boolean"]
+NUMERIC_TYPES = ["double", "currency", "percent", "int", "long"]
+CATEGORY_TYPES = ["picklist"]
+DATE_TYPES = ["date", "datetime"]
+
+# compound fields cannot be selected through Bulk API queries
+COMPOUND_TYPES = ["address", "location"]
+
+
+# returns {field name: salesforce type} from a describe() result
+def describe_types(desc):
+    return {field["name"]: field["type"] for field in desc["fields"]}
+
+
+# fingerprint of the field names and types of a describe() result
+def schema_hash(desc):
+    fields = sorted([field["name"], field["type"]] for field in desc["fields"])
+    return hashlib.sha1(json.dumps(fields).encode()).hexdigest()
+
+
+# dtypes read_csv can produce while parsing, dates and categories are
+# converted afterwards by apply_types
+def csv_dtypes(types):
+    return {
+        name: ("float64" if sf_type in NUMERIC_TYPES else "object")
+        for name, sf_type in types.items()
+        if sf_type not in BOOLEAN_TYPES
+    }
+
+
+# builds a DataFrame straight from a list of REST records, one column at a
+# time, without going through per-row dicts or the "attributes" column
+def records_to_df(records, fields, types=None):
+    columns = {name: [record.get(name) for record in records] for name in fields}
+    df = pd.DataFrame(columns, columns=fields)
+    return apply_types(df, types)
+
+
+# converts the columns of df in place to the dtype matching their describe type
+def apply_types(df, types=None):
+    for name, sf_type in (types or {}).items():
+        if name not in df.columns:
+            continue
+        column = df[name]
+        if sf_type in BOOLEAN_TYPES:
+            if column.dtype != bool:
+                df[name] = column.fillna(False).astype(bool)
+        elif sf_type in NUMERIC_TYPES:
+            df[name] = pd.to_numeric(column, errors="coerce").astype("float64")
+        elif sf_type in CATEGORY_TYPES:
+            df[name] = column.astype("category")
+        elif sf_type in DATE_TYPES:
+            df[name] = pd.to_datetime(column, utc=True).dt.tz_localize(None)
+    return df
+
+
+# concatenates typed chunks, categorical columns keep the category dtype by
+# unioning their categories (sorted, whatever order the chunks came in)
+# instead of falling back to object. The chunks, often slices of a resident
+# frame, are only read
+def concat_frames(chunks):
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for name in chunks[0].columns:
+        parts = [chunk[name] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[name] = union_categoricals(parts, sort_categories=True)
+        else:
+            columns[name] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns, columns=chunks[0].columns)
@@ -0,0 +1,136 @@
+import functools
+import inspect
+import logging
+import re
+import threading
+import time
+
+import requests
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+api_calls = metrics.Counter(
+    "salesforce_api_calls_total",
+    "HTTP calls made to Salesforce, by the sf_Manager method making them, the "
+    "outermost sf_Manager method it was called from and the status code.",
+    ["method", "caller", "status"],
+)
+api_bytes = metrics.Counter(
+    "salesforce_api_response_bytes_total",
+    "Bytes received from Salesforce.",
+    ["method", "caller"],
+)
+api_seconds = metrics.Histogram(
+    "salesforce_api_call_seconds",
+    "Latency of a single HTTP call to Salesforce.",
+    metrics.SECONDS_BUCKETS,
+    ["method"],
+)
+logins = metrics.Counter(
+    "salesforce_logins_total",
+    "Logins, the first one of a process or after an expired session.",
+    ["reason"],
+)
+api_usage = metrics.Gauge(
+    "salesforce_api_daily_usage",
+    "API requests used and allowed over the rolling 24 hours, as last "
+    "reported by the Sforce-Limit-Info header.",
+    ["kind"],
+)
+metrics.registry.extend([api_calls, api_bytes, api_seconds, logins, api_usage])
+
+LIMIT_INFO = re.compile(r"api-usage=(\d+)/(\d+)")
+
+local = threading.local()  # stack of the traced methods running in the thread
+
+
+# the org wide 24 hour API budget, updated from every response carrying the
+# Sforce-Limit-Info header
+class ApiBudget:
+    def __init__(self):
+        self.used = None
+        self.limit = None
+        self.updated = None
+
+    def update(self, header):
+        match = LIMIT_INFO.search(header or "")
+        if match is None:
+            return
+        self.used, self.limit = int(match.group(1)), int(match.group(2))
+        self.updated = time.time()
+        api_usage.set(("used",), self.used)
+        api_usage.set(("limit",), self.limit)
+
+    # share of the daily limit still available, None before the first reading
+    def remaining(self):
+        if not self.limit:
+            return None
+        return max(0.0, 1 - self.used / self.limit)
+
+    # whether at least reserve (a share of the limit) remains, an unknown
+    # budget does not block anything
+    def allows(self, reserve):
+        remaining = self.remaining()
+        return remaining is None or remaining >= reserve
+
+
+budget = ApiBudget()
+
+
+def current():
+    stack = getattr(local, "stack", None)
+    if not stack:
+        return "other", "other"
+    return stack[-1], stack[0]
+
+
+# requests response hook counting every call against the traced methods
+# running in the thread
+def record(response, *args, **kwargs):
+    method, caller = current()
+    api_calls.inc((method, caller, str(response.status_code)))
+    api_bytes.inc((method, caller), len(response.content))
+    api_seconds.observe((method,), response.elapsed.total_seconds())
+    budget.update(response.headers.get("Sforce-Limit-Info"))
+
+
+# a requests session whose calls are traced, one per Salesforce client
+def session():
+    traced_session = requests.Session()
+    traced_session.hooks["response"].append(record)
+    return traced_session
+
+
+# attributes the Salesforce calls made while func runs (or, for a generator,
+# while it is iterated) to its name
+def traced(func):
+    name = func.__name__
+
+    def enter():
+        if not hasattr(local, "stack"):
+            local.stack = []
+        local.stack.append(name)
+
+    if inspect.isgeneratorfunction(func):
+
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            enter()
+            try:
+                yield from func(*args, **kwargs)
+            finally:
+                local.stack.pop()
+
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        enter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            local.stack.pop()
+
+    return wrapper
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # windows, snapshots are disabled
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# dtype kinds stored as memory-mapped .npy files: bool, integers, floats and
+# naive datetimes. Categories are stored as mapped codes with their
+# categories in JSON, everything else (strings) as JSON values. Nothing in a
+# snapshot is unpickled, a file planted in it cannot run code
+MAPPED_KINDS = "biufM"
+
+
+# the objects.json entry of a column that is not in a dtype group (or of
+# the index), saving the codes of a categorical column next to it as
+# <number>.codes.npy and the values of a numeric index as <number>.npy
+def encode_column(column, directory, number):
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in MAPPED_KINDS:
+        path = "{}.npy".format(number)
+        np.save(os.path.join(directory, path), column.to_numpy())
+        return {"kind": "array", "file": path}
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        path = "{}.codes.npy".format(number)
+        np.save(os.path.join(directory, path), column.cat.codes.to_numpy())
+        return {
+            "kind": "category",
+            "file": path,
+            "categories": column.cat.categories.tolist(),
+            "ordered": bool(column.cat.ordered),
+        }
+    values = column.astype(object)
+    values = values.where(values.notnull(), None)
+    return {"kind": "values", "values": values.tolist()}
+
+
+def decode_column(encoded, directory, index):
+    if encoded["kind"] == "array":
+        values = np.load(os.path.join(directory, encoded["file"]), mmap_mode="r")
+        return pd.Series(values, index=index)
+    if encoded["kind"] == "category":
+        codes = np.load(os.path.join(directory, encoded["file"]), mmap_mode="r")
+        values = pd.Categorical.from_codes(
+            codes, encoded["categories"], ordered=encoded["ordered"]
+        )
+        return pd.Series(values, index=index)
+    return pd.Series(encoded["values"], index=index, dtype=object)
+
+
+def encode_index(index, directory):
+    if isinstance(index, pd.RangeIndex):
+        return {"kind": "range", "range": [index.start, index.stop, index.step]}
+    return encode_column(index.to_series(), directory, "index")
+
+
+def decode_index(encoded, directory):
+    if encoded["kind"] == "range":
+        return pd.RangeIndex(*encoded["range"])
+    return pd.Index(decode_column(encoded, directory, None))
+
+
+# the root of a snapshot, created private to this user. An existing root
+# must be a directory of this user that nobody else can read or write,
+# another local user could otherwise plant or read frames in it
+def private_root(root):
+    os.makedirs(root, mode=0o700, exist_ok=True)
+    info = os.lstat(root)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError("snapshot root {} is not a directory".format(root))
+    if info.st_uid != os.geteuid():
+        raise PermissionError("snapshot root {} is not owned by this user".format(root))
+    if info.st_mode & 0o077:
+        raise PermissionError(
+            "snapshot root {} is open to other users, chmod 700 it".format(root)
+        )
+    return root
+
+
+# on-disk copy of the FrameStore frames shared by the gunicorn workers of a
+# host. Each dataset lives in <root>/<key>/ as one directory per version and
+# a manifest.json pointing at the current one:
+#
+#   v12/float64.npy    every float64 column, one row per column
+#   v12/3.codes.npy    the category codes of the 4th other column
+#   v12/objects.json   the index and the other columns
+#
+# Writers hold an exclusive lock on <root>/<key>.lock, so one process queries
+# Salesforce while the others wait and then map what it wrote. Readers map
+# the .npy files read-only, the OS shares their pages between the workers.
+class Snapshot:
+    def __init__(self, root, max_age=900):
+        self.root = root
+        self.max_age = max_age  # older snapshots are rebuilt, not adopted
+        self.manifests = {}  # {key: (manifest stat, manifest)}
+        private_root(root)
+
+    # holds the writer lock of key, yields False instead of waiting when
+    # blocking is False and another process has it
+    @contextmanager
+    def lock(self, key, blocking=True):
+        with open(os.path.join(self.root, key + ".lock"), "a") as f:
+            try:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(f, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # the manifest of key, re-read only when the file changed
+    def manifest(self, key):
+        path = os.path.join(self.root, key, "manifest.json")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        cached = self.manifests.get(key)
+        if cached is None or cached[0] != stamp:
+            with open(path) as f:
+                cached = (stamp, json.load(f))
+            self.manifests[key] = cached
+        return cached[1]
+
+    def version(self, key):
+        manifest = self.manifest(key)
+        return manifest["version"] if manifest else 0
+
+    # seconds since the current version of key was written
+    def age(self, key):
+        manifest = self.manifest(key)
+        return time.time() - manifest["written"] if manifest else float("inf")
+
+    # writes df as version of key, then switches the manifest to it. Must be
+    # called with the lock of key held
+    def write(self, key, df, version):
+        directory = os.path.join(self.root, key)
+        name = "v{}".format(version)
+        staging = tempfile.mkdtemp(prefix=name + ".", dir=self.root)
+
+        columns = {}  # {dtype name: [column names]}
+        objects = []
+        for column, dtype in df.dtypes.items():
+            if isinstance(dtype, np.dtype) and dtype.kind in MAPPED_KINDS:
+                columns.setdefault(dtype.name, []).append(column)
+            else:
+                objects.append(column)
+        groups = []
+        for dtype, names in columns.items():
+            path = dtype + ".npy"
+            values = np.stack([df[name].to_numpy() for name in names])
+            np.save(os.path.join(staging, path), values)
+            groups.append({"file": path, "columns": names})
+        encoded = {
+            "index": encode_index(df.index, staging),
+            "columns": [
+                [name, encode_column(df[name], staging, number)]
+                for number, name in enumerate(objects)
+            ],
+        }
+        with open(os.path.join(staging, "objects.json"), "w") as f:
+            json.dump(encoded, f)
+
+        os.makedirs(directory, exist_ok=True)
+        os.replace(staging, os.path.join(directory, name))
+        manifest = {
+            "version": version,
+            "path": name,
+            "groups": groups,
+            "rows": len(df.index),
+            "written": time.time(),
+        }
+        with open(os.path.join(directory, "manifest.tmp"), "w") as f:
+            json.dump(manifest, f)
+        os.replace(
+            os.path.join(directory, "manifest.tmp"),
+            os.path.join(directory, "manifest.json"),
+        )
+        self.prune(key, keep=[name, "v{}".format(version - 1)])
+        logger.info("snapshot %s v%d: %d rows", key, version, len(df.index))
+
+    # removes the versions readers no longer need. Workers still mapping a
+    # removed file keep their pages until they drop the frame
+    def prune(self, key, keep):
+        directory = os.path.join(self.root, key)
+        for name in os.listdir(directory):
+            if name.startswith("v") and name not in keep:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    # returns (version, df) for the current version of key, or None. Mapped
+    # columns are read-only views of the shared files
+    def read(self, key):
+        manifest = self.manifest(key)
+        if manifest is None:
+            return None
+        directory = os.path.join(self.root, key, manifest["path"])
+        with open(os.path.join(directory, "objects.json")) as f:
+            encoded = json.load(f)
+        index = decode_index(encoded["index"], directory)
+        objects = pd.DataFrame(
+            {
+                name: decode_column(column, directory, index)
+                for name, column in encoded["columns"]
+            },
+            index=index,
+            columns=[name for name, _ in encoded["columns"]],
+        )
+        parts = []
+        for group in manifest["groups"]:
+            values = np.load(os.path.join(directory, group["file"]), mmap_mode="r")
+            # a (columns, rows) C-ordered array is the layout of a pandas
+            # block, so the frame wraps the mapping instead of copying it
+            parts.append(
+                pd.DataFrame(
+                    np.asarray(values).T,
+                    columns=group["columns"],
+                    index=objects.index,
+                    copy=False,
+                )
+            )
+        df = pd.concat(parts + [objects], axis=1, copy=False) if parts else objects
+        return manifest["version"], df
+
+
+# the snapshot configured by SNAPSHOT_DIR, None when it is unset or empty and
+# every frame stays private to its process. Pick a directory of the user
+# running the dashboard, it is created with mode 700
+def from_env():
+    root = os.getenv("SNAPSHOT_DIR", "")
+    if not root or fcntl is None:
+        return None
+    return Snapshot(root, int(os.getenv("SNAPSHOT_MAX_AGE", "900")))
+
+
+# sidecar refresher, run it on the same host as the web workers with
+# `python snapshot.py` and start the workers with REFRESH_IN_WORKERS=0
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+    from loader import warm
+    from scheduler import RefreshScheduler
+    from store import frame_store
+
+    if frame_store.snapshot is None:
+        raise SystemExit("snapshots are disabled, set SNAPSHOT_DIR")
+    warm()
+    RefreshScheduler(frame_store).run()
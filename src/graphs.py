@@ -5,11 +5,16 @@ import dash_core_components as dcc
 from dash.dependencies import Input, Output, State
 
 import pandas as pd
-import joblib
-import plotly.express as px
-import plotly.figure_factory as ff
 
 import copy
+from functools import lru_cache
+
+from startup import lazy_import
+
+# imported by the first figure or prediction that needs them
+joblib = lazy_import('joblib')
+ff = lazy_import('plotly.figure_factory')
+preprocessing = lazy_import('sklearn.preprocessing')
 
 layout = dict(
     autosize=True,
@@ -27,24 +32,42 @@ layout = dict(
 
 # Model Read
 svm_path = 'data/svm_model.sav'
-svm_model = joblib.load(svm_path)
-
 xgb_path = 'data/xgb_model.sav'
-xgb_model = svm_model
-#xgb_model = joblib.load(xgb_path)
+
+
+@lru_cache(maxsize=None)
+def get_svm_model():
+    return joblib.load(svm_path)
+
+
+def get_xgb_model():
+    return get_svm_model()
+    #return joblib.load(xgb_path)
 
 # Data Read
-df = pd.read_csv('data/Telco-Customer-Churn.csv')
+df = pd.read_csv('data/Telco-Customer-Churn.csv',
+                 dtype={'SeniorCitizen': 'int8', 'tenure': 'int16', 'MonthlyCharges': 'float32'})
 df['TotalCharges'] = df['TotalCharges'].replace(" ", 0).astype('float32')
 
+# the repeated strings are stored as categories: their codes live in one
+# numpy array per column, which workers forked from a preloaded master share,
+# where one str object per cell would get copied as its refcount changes
+for col in df.columns.drop('customerID'):
+    if df[col].dtype == object:
+        df[col] = df[col].astype('category')
+
 cat_features = df.drop(['customerID','TotalCharges', 'MonthlyCharges', 'SeniorCitizen', 'tenure', 'Churn'],axis=1).columns
 
 # Encoding categorical features
-from sklearn.preprocessing import OneHotEncoder
-ohe = OneHotEncoder(sparse=False)
-ohe.fit(df[cat_features])
+@lru_cache(maxsize=None)
+def get_ohe():
+    ohe = preprocessing.OneHotEncoder(sparse=False)
+    ohe.fit(df[cat_features])
+    return ohe
 
 
+# built once per process, the data never changes
+@lru_cache(maxsize=None)
 def dist_tenure():
     x1 = df[df['Churn'] == 'No']['tenure']
     x2 = df[df['Churn'] == 'Yes']['tenure']
@@ -70,6 +93,7 @@ def dist_tenure():
     return fig
 
 
+@lru_cache(maxsize=None)
 def dist_monthlycharges():
     x1 = df[df['Churn'] == 'No']['MonthlyCharges']
     x2 = df[df['Churn'] == 'Yes']['MonthlyCharges']
@@ -95,6 +119,7 @@ def dist_monthlycharges():
     
     return fig
 
+@lru_cache(maxsize=None)
 def dist_totalcharges():
     x1 = df[df['Churn'] == 'No']['TotalCharges']
     x2 = df[df['Churn'] == 'Yes']['TotalCharges']
@@ -118,3 +143,15 @@ def dist_totalcharges():
     )
     
     return fig
+
+
+# builds the model, the encoder and the figures the getters above otherwise
+# build on first use. The gunicorn master calls it before forking (see
+# gunicorn.conf.py) so workers share one copy of each, copy-on-write,
+# instead of each building its own after the fork
+def warm():
+    get_svm_model()
+    get_ohe()
+    dist_tenure()
+    dist_monthlycharges()
+    dist_totalcharges()
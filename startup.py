@@ -0,0 +1,113 @@
+import importlib
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# STARTUP_PROFILE=1 times every module import and init step and logs the
+# slowest ones once the app is built
+ENABLED = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+started = time.perf_counter()
+imports = []  # (module, seconds including its own imports, seconds on its own)
+steps = []  # (init step, seconds since the previous one)
+last_mark = started
+
+
+# meta path finder that finds nothing itself, it only times the loaders the
+# other finders return. Nested imports are subtracted from the time of the
+# module importing them
+class ImportTimer:
+    def __init__(self):
+        self.stack = []  # seconds spent in nested imports, one per level
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                # builtin and frozen importers are classes shared by modules
+                if hasattr(spec.loader, "exec_module") and not isinstance(
+                    spec.loader, type
+                ):
+                    self.wrap(spec.loader)
+                return spec
+        return None
+
+    def wrap(self, loader):
+        exec_module = loader.exec_module
+        if getattr(exec_module, "timed", False):
+            return  # a loader shared by several modules, e.g. a zip file
+
+        def timed_exec_module(module):
+            self.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                total = time.perf_counter() - start
+                nested = self.stack.pop()
+                if self.stack:
+                    self.stack[-1] += total
+                imports.append((module.__name__, total, total - nested))
+
+        timed_exec_module.timed = True
+        loader.exec_module = timed_exec_module
+
+
+def install():
+    if ENABLED and not any(isinstance(f, ImportTimer) for f in sys.meta_path):
+        sys.meta_path.insert(0, ImportTimer())
+        logger.setLevel(logging.INFO)
+
+
+# records the time spent since the previous mark as the init step name
+def mark(name):
+    global last_mark
+    now = time.perf_counter()
+    steps.append((name, now - last_mark))
+    last_mark = now
+
+
+def report(top=20):
+    if not ENABLED:
+        return
+    logging.basicConfig()  # no-op when the app configured logging
+    logger.info("startup took %.3fs", time.perf_counter() - started)
+    for name, seconds in steps:
+        logger.info("  step %-30s %.3fs", name, seconds)
+    by_package = {}
+    for name, total, own in imports:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + own
+    for package, seconds in sorted(by_package.items(), key=lambda i: -i[1])[:top]:
+        logger.info("  package %-27s %.3fs", package, seconds)
+    for name, total, own in sorted(imports, key=lambda i: -i[2])[:top]:
+        logger.info("  module %-28s %.3fs (%.3fs with imports)", name, own, total)
+
+
+# stands in for a module until one of its attributes is used, so heavy
+# dependencies (sklearn, figure_factory, ...) are only imported by the page
+# or callback that needs them
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            logger.debug(
+                "imported %s in %.3fs", self._name, time.perf_counter() - start
+            )
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
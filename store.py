@@ -0,0 +1,322 @@
+import hashlib
+import io
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+import metrics
+import snapshot
+
+# FrameStore and ParseCache instances of the process, re-initialised in a
+# forked child by one hook registered at import rather than one per instance
+instances = weakref.WeakSet()
+
+
+def after_fork():
+    for instance in list(instances):
+        instance.after_fork()
+
+
+os.register_at_fork(after_in_child=after_fork)
+
+
+# server-side registry of the DataFrames behind the dcc.Store components.
+# The browser only holds a {"key": ..., "version": ...} token, callbacks
+# resolve it to the shared in-process frame, which they must not mutate.
+# With a snapshot, frames and versions are shared by every process of the
+# host: a frame is loaded by one of them and mapped by the others.
+class FrameStore:
+    def __init__(self, snapshot=None):
+        self.lock = threading.Lock()
+        self.frames = {}  # {key: (version, df)}
+        self.loaders = {}  # {key: function returning a fresh frame}
+        self.load_locks = {}  # one lock per key so a frame is loaded once
+        self.snapshot = snapshot
+        self.derived = {}  # {(key, function, args): (version, result)}
+        self.derive_locks = {}  # one lock per derived entry, computed once
+        instances.add(self)
+
+    # locks held by a parent thread at fork time would never be released in
+    # the child
+    def after_fork(self):
+        self.lock = threading.Lock()
+        self.load_locks = {}
+        self.derive_locks = {}
+
+    def register(self, key, loader):
+        self.loaders[key] = loader
+
+    def version(self, key):
+        entry = self.frames.get(key)
+        return entry[0] if entry else 0
+
+    def token(self, key):
+        return {"key": key, "version": self.version(key)}
+
+    # publishes df under key, replacing the previous frame in one assignment,
+    # and returns the token to store in the browser. The version is at least
+    # the given one, see load()
+    def put(self, key, df, version=0):
+        if self.snapshot is None:
+            return self.publish(key, df, version)
+        with self.snapshot.lock(key):
+            return self.publish(key, df, version)
+
+    # put() for callers already holding the snapshot lock of key
+    def publish(self, key, df, version=0):
+        if self.snapshot is None:
+            with self.lock:
+                version = max(self.version(key) + 1, version)
+                self.frames[key] = (version, df)
+            return {"key": key, "version": version}
+        current = max(self.version(key), self.snapshot.version(key))
+        version = max(current + 1, version)
+        self.snapshot.write(key, df, version)
+        # keep the mapped copy, df itself is private to this process
+        self.frames[key] = self.snapshot.read(key)
+        return {"key": key, "version": version}
+
+    # switches to the snapshot of key when it is at least version and not
+    # older than the snapshot max_age, returns whether it did
+    def adopt(self, key, version=0):
+        manifest = self.snapshot.manifest(key)
+        if manifest is None or manifest["version"] < max(version, self.version(key)):
+            return False
+        if self.snapshot.age(key) > self.snapshot.max_age:
+            return False
+        if manifest["version"] != self.version(key):
+            self.frames[key] = self.snapshot.read(key)
+        return True
+
+    # the newest of the given tokens (None or a legacy JSON string count as
+    # version 0) and the token of the frame this process holds for key
+    def latest(self, key, *tokens):
+        tokens = [token for token in tokens if isinstance(token, dict)]
+        return max(tokens + [self.token(key)], key=lambda token: token["version"])
+
+    # (re)loads key through its registered loader. Without a snapshot every
+    # process counts its own versions, so a token may carry a version another
+    # worker (or this one before a restart) gave out. The frame loaded for it
+    # is current, it is published under at least that version so the same
+    # token does not load it again
+    def load(self, key, version=0):
+        with self.lock:
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # another request may have loaded it while this one was waiting
+            if key not in self.frames or self.version(key) < version:
+                if self.snapshot is None:
+                    self.put(key, self.loaders[key](), version)
+                elif not self.adopt(key, version):
+                    with self.snapshot.lock(key):
+                        # another process may have written it while this one
+                        # waited for the lock
+                        if not self.adopt(key, version):
+                            self.publish(key, self.loaders[key](), version)
+        return self.frames[key][1]
+
+    # rebuilds key through its loader, returns the new token or None when the
+    # loader returned the current frame. With a snapshot, a process finding
+    # the lock taken or a version younger than max_age seconds adopts that
+    # version instead of querying Salesforce again
+    def refresh(self, key, max_age=0):
+        if self.snapshot is None:
+            return self.rebuild(key)
+        with self.snapshot.lock(key, blocking=False) as locked:
+            if locked and self.snapshot.age(key) >= max_age:
+                return self.rebuild(key)
+        self.adopt(key)
+        return None
+
+    def rebuild(self, key):
+        current = self.frames.get(key)
+        df = self.loaders[key]()
+        if current is not None and df is current[1]:
+            return None
+        return self.publish(key, df)
+
+    # returns the frame a token points at, loading it when this process has
+    # no copy yet or only one older than the token. A JSON string (a page
+    # rendered before tokens existed) is parsed once through parse_cache
+    def get(self, token):
+        if isinstance(token, str):
+            return parse_cache.get(token.encode(), read_split_json)
+        return self.entry(token)[1]
+
+    # (version, frame) a token points at
+    def entry(self, token):
+        key = token["key"]
+        version = token.get("version", 0)
+        if self.snapshot is not None:
+            version = max(version, self.snapshot.version(key))
+        entry = self.frames.get(key)
+        if entry is None or entry[0] < version:
+            self.load(key, version)
+            entry = self.frames[key]
+        return entry
+
+    # func(df, *args) for the frame a token points at, computed once per
+    # version of the frame and shared by every callback of the process until
+    # a newer version replaces it. args must be hashable and the result,
+    # like the frame, must be treated as read-only
+    def derive(self, token, func, *args):
+        if isinstance(token, str):
+            return func(self.get(token), *args)
+        version, df = self.entry(token)
+        derived_key = derivation(token["key"], func, args)
+        cached = self.derived.get(derived_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with self.lock:
+            derive_lock = self.derive_locks.setdefault(derived_key, threading.Lock())
+        with derive_lock:
+            # a concurrent callback may have computed it while this one waited
+            cached = self.derived.get(derived_key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            result = func(df, *args)
+            if cached is None or cached[0] < version:
+                self.derived[derived_key] = (version, result)
+                self.forget_derived(token["key"], version)
+        return result
+
+    # derive() for a func only the latest args of are wanted, such as the
+    # version of another frame: what func derived from key with other args
+    # is dropped, so the entries do not pile up as those args change
+    def derive_latest(self, token, func, *args):
+        result = self.derive(token, func, *args)
+        if isinstance(token, dict):
+            self.forget_args(token["key"], func, args)
+        return result
+
+    # drops the results func derived from key with other args than these
+    def forget_args(self, key, func, args):
+        current = derivation(key, func, args)
+        with self.lock:
+            stale = [
+                derived_key
+                for derived_key in list(self.derived)
+                if derived_key[:3] == current[:3] and derived_key != current
+            ]
+            for derived_key in stale:
+                self.derived.pop(derived_key, None)
+                self.derive_locks.pop(derived_key, None)
+
+    # the cached func(df, *args) of key, whatever version it was derived from
+    def derived_result(self, key, func, *args):
+        cached = self.derived.get(derivation(key, func, args))
+        return None if cached is None else cached[1]
+
+    # records result as func(df, *args) for the frame a token points at, for
+    # callers that built it from the result of an earlier version rather than
+    # from the frame itself
+    def put_derived(self, token, func, result, *args):
+        derived_key = derivation(token["key"], func, args)
+        with self.lock:
+            cached = self.derived.get(derived_key)
+            if cached is None or cached[0] < token["version"]:
+                self.derived[derived_key] = (token["version"], result)
+        self.forget_derived(token["key"], token["version"])
+
+    # drops the results derived from versions of key older than version,
+    # for arguments no callback has asked for since
+    def forget_derived(self, key, version):
+        with self.lock:
+            stale = [
+                derived_key
+                for derived_key, (derived_version, _) in list(self.derived.items())
+                if derived_key[0] == key and derived_version < version
+            ]
+            for derived_key in stale:
+                self.derived.pop(derived_key, None)
+                self.derive_locks.pop(derived_key, None)
+
+
+# key of func(df, *args) in FrameStore.derived
+def derivation(key, func, args):
+    return (key, func.__module__, func.__qualname__, args)
+
+
+parse_lookups = metrics.Counter(
+    "parse_cache_lookups_total",
+    "Payloads looked up in the parse cache, by whether they were parsed already.",
+    ["result"],
+)
+parse_entries = metrics.Gauge(
+    "parse_cache_entries", "Parsed payloads held by the parse cache.", []
+)
+metrics.registry.extend([parse_lookups, parse_entries])
+
+
+# LRU of parsed payloads keyed by a hash of their content, shared by every
+# callback of the worker so the same data is parsed at most once. Every
+# caller gets its own copy of the cached frame, copying is cheap next to
+# parsing and a caller changing its copy cannot change what the next one gets
+class ParseCache:
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # {content hash: df}, oldest first
+        self.parse_locks = {}  # one lock per hash so a payload is parsed once
+        self.hits = 0
+        self.misses = 0
+        instances.add(self)
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+        self.parse_locks = {}
+
+    def lookup(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                parse_lookups.inc(("hit",))
+                return self.entries[key]
+        return None
+
+    def get(self, content, parse):
+        key = hashlib.sha1(content).hexdigest()
+        df = self.lookup(key)
+        if df is not None:
+            return df.copy()
+
+        with self.lock:
+            parse_lock = self.parse_locks.setdefault(key, threading.Lock())
+        with parse_lock:
+            # a concurrent callback may have parsed it while this one waited
+            df = self.lookup(key)
+            if df is None:
+                df = parse(content)
+                with self.lock:
+                    self.misses += 1
+                    parse_lookups.inc(("miss",))
+                    self.entries[key] = df
+                    while len(self.entries) > self.maxsize:
+                        oldest, _ = self.entries.popitem(last=False)
+                        self.parse_locks.pop(oldest, None)
+                    parse_entries.set((), len(self.entries))
+        return df.copy()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+def read_split_json(content):
+    return pd.read_json(io.BytesIO(content), orient="split")
+
+
+# read_csv through parse_cache, the file is re-parsed only when its content
+# changes
+def read_csv(path):
+    with open(path, "rb") as f:
+        content = f.read()
+    return parse_cache.get(content, lambda data: pd.read_csv(io.BytesIO(data)))
+
+
+frame_store = FrameStore(snapshot.from_env())
+parse_cache = ParseCache()
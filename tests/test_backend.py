@@ -0,0 +1,76 @@
+import gzip
+import json
+
+import requests
+
+import sfBackend
+
+BASE = "https://example.my.salesforce.com/services/data/v42.0/"
+LOGIN = (
+    "<soapenv:Envelope><loginResponse><result>"
+    "<metadataServerUrl>https://example.my.salesforce.com/m</metadataServerUrl>"
+    "<serverUrl>https://example.my.salesforce.com/s</serverUrl>"
+    "<sessionId>00D000000000001!secret</sessionId>"
+    "<userId>005000000000001</userId>"
+    "</result></loginResponse></soapenv:Envelope>"
+)
+
+
+def query(soql):
+    return requests.Request("GET", BASE + "queryAll/", params={"q": soql}).prepare()
+
+
+def delta(watermark):
+    return query(
+        "SELECT Id FROM Opportunity WHERE SystemModstamp > {}".format(watermark)
+    )
+
+
+def response(request, body):
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "text/xml"
+    response._content = body.encode()
+    response.request = request
+    return response
+
+
+def test_replay_key_leaves_the_watermark_out():
+    first = sfBackend.recording_path(delta("2020-01-01T10:00:00Z"))
+    assert first == sfBackend.recording_path(delta("2021-06-30T23:59:59.000+0000"))
+    assert first != sfBackend.recording_path(
+        query("SELECT Id FROM Lead WHERE SystemModstamp > 2020-01-01T10:00:00Z")
+    )
+
+
+def test_replay_key_of_other_queries_is_unchanged():
+    request = query("SELECT Id FROM Opportunity")
+    path = sfBackend.recording_path(request)
+    assert path == sfBackend.recording_path(query("SELECT Id FROM Opportunity"))
+    assert path != sfBackend.recording_path(query("SELECT Id FROM Lead"))
+
+
+def test_login_session_is_masked(tmp_path, monkeypatch):
+    monkeypatch.setattr(sfBackend, "RECORDINGS", str(tmp_path))
+    request = requests.Request(
+        "POST", "https://login.salesforce.com/services/Soap/u/42.0", data="<login/>"
+    ).prepare()
+    sfBackend.save(response(request, LOGIN))
+
+    (path,) = tmp_path.iterdir()
+    with gzip.open(path, "rt") as f:
+        body = json.load(f)["body"]
+    assert "secret" not in body
+    assert "example.my.salesforce.com" not in body
+    assert "<sessionId>masked</sessionId>" in body
+    assert "<userId>005000000000001</userId>" in body
+
+
+def test_recorded_delta_replays_for_a_later_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(sfBackend, "RECORDINGS", str(tmp_path))
+    body = json.dumps({"totalSize": 0, "done": True, "records": []})
+    sfBackend.save(response(delta("2020-01-01T10:00:00Z"), body))
+
+    replayed = sfBackend.ReplayAdapter().send(delta("2020-01-02T08:30:00Z"))
+    assert replayed.status_code == 200
+    assert replayed.json()["done"]
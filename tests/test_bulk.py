@@ -0,0 +1,142 @@
+import json
+
+import pandas as pd
+import pytest
+import requests
+from simple_salesforce.exceptions import SalesforceError, SalesforceExpiredSession
+
+import sfBulk
+from sfBulk import BulkClient
+
+JOBS = "https://example.invalid/services/data/v47.0/jobs/query"
+TYPES = {"Id": "id", "Amount": "currency", "IsWon": "boolean", "Type": "picklist"}
+
+
+def response(status=200, body=None, content=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status
+    if body is not None:
+        response._content = json.dumps(body).encode()
+    else:
+        response._content = content
+    response.headers.update(headers or {})
+    return response
+
+
+# a requests session answering from a script of (method, url, response), in
+# the order the client is expected to make the requests
+class Session:
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        # copies, the client updates the same params from page to page
+        kwargs = {k: dict(v) if isinstance(v, dict) else v for k, v in kwargs.items()}
+        self.requests.append((method, url, kwargs))
+        expected_method, expected_url, answer = self.script.pop(0)
+        assert (method, url) == (expected_method, expected_url)
+        return answer
+
+
+@pytest.fixture(autouse=True)
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(sfBulk.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def client(script, **kwargs):
+    session = Session(script)
+    return (
+        BulkClient("https://example.invalid", "token", session=session, **kwargs),
+        session,
+    )
+
+
+def test_job_is_polled_and_every_result_page_read(sleeps):
+    bulk, session = client(
+        [
+            ("POST", JOBS, response(body={"id": "750A"})),
+            ("GET", JOBS + "/750A", response(body={"state": "UploadComplete"})),
+            ("GET", JOBS + "/750A", response(body={"state": "InProgress"})),
+            ("GET", JOBS + "/750A", response(body={"state": "JobComplete"})),
+            (
+                "GET",
+                JOBS + "/750A/results",
+                response(
+                    content=b"Id,Amount,IsWon,Type\na1,10.5,true,New\na2,,false,\n",
+                    headers={"Sforce-Locator": "MjAwMA"},
+                ),
+            ),
+            (
+                "GET",
+                JOBS + "/750A/results",
+                response(
+                    content=b"Id,Amount,IsWon,Type\na3,7,false,Renewal\n",
+                    headers={"Sforce-Locator": "null"},
+                ),
+            ),
+            ("DELETE", JOBS + "/750A", response(status=204)),
+        ],
+        page_size=2,
+    )
+    frames = list(bulk.iter_frames("SELECT Id FROM Opportunity", TYPES))
+
+    assert [len(df.index) for df in frames] == [2, 1]
+    df = pd.concat(frames, ignore_index=True)
+    assert df["Id"].tolist() == ["a1", "a2", "a3"]
+    assert df["Amount"].iloc[0] == 10.5 and pd.isna(df["Amount"].iloc[1])
+    assert df["IsWon"].tolist() == [True, False, False]
+    assert frames[0]["Type"].dtype.name == "category"
+    assert session.requests[0][2]["json"]["query"] == "SELECT Id FROM Opportunity"
+    assert session.requests[4][2]["params"] == {"maxRecords": 2}
+    assert session.requests[5][2]["params"] == {"maxRecords": 2, "locator": "MjAwMA"}
+    assert sleeps == [0.5, 1.0]
+    assert not session.script
+
+
+def test_failed_job_raises_and_is_deleted():
+    bulk, session = client(
+        [
+            ("POST", JOBS, response(body={"id": "750B"})),
+            ("GET", JOBS + "/750B", response(body={"state": "Failed"})),
+            ("DELETE", JOBS + "/750B", response(status=204)),
+        ]
+    )
+    with pytest.raises(SalesforceError):
+        list(bulk.iter_frames("SELECT Id FROM Opportunity", TYPES))
+    assert not session.script
+
+
+def test_job_past_the_timeout_raises(monkeypatch):
+    bulk, session = client(
+        [
+            ("POST", JOBS, response(body={"id": "750C"})),
+            ("GET", JOBS + "/750C", response(body={"state": "InProgress"})),
+            ("DELETE", JOBS + "/750C", response(status=204)),
+        ],
+        timeout=-1,
+    )
+    with pytest.raises(SalesforceError):
+        list(bulk.iter_frames("SELECT Id FROM Opportunity", TYPES))
+    assert not session.script
+
+
+def test_expired_session_is_raised_as_such():
+    bulk, _ = client([("POST", JOBS, response(status=401, content=b"[]"))])
+    with pytest.raises(SalesforceExpiredSession):
+        list(bulk.iter_frames("SELECT Id FROM Opportunity", TYPES))
+
+
+def test_failed_delete_is_ignored():
+    bulk, session = client(
+        [
+            ("POST", JOBS, response(body={"id": "750D"})),
+            ("GET", JOBS + "/750D", response(body={"state": "JobComplete"})),
+            ("GET", JOBS + "/750D/results", response(content=b"")),
+            ("DELETE", JOBS + "/750D", response(status=500, content=b"[]")),
+        ]
+    )
+    assert list(bulk.iter_frames("SELECT Id FROM Opportunity", TYPES)) == []
+    assert not session.script
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from panels import cases
+from store import FrameStore
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    store = FrameStore()
+    accounts = pd.DataFrame(
+        {
+            "Id": ["001A", "001B", "001C", "001D", "001B", "001E"],
+            "Name": ["Acme", "Globex", "Initech", None, "Globex", "Umbrella"],
+        }
+    )
+    store.register("accounts", accounts.copy)
+    monkeypatch.setattr(cases, "frame_store", store)
+    store.load("accounts")
+    return store.version("accounts")
+
+
+def case_rows(account_ids):
+    return pd.DataFrame({"AccountId": pd.Series(account_ids, dtype=object)})
+
+
+def test_counts_match_value_counts(accounts):
+    ids = ["001B", "001A", "001B", None, "001X", "001D", "001C", "001B", "001A"]
+    table, counts = cases.account_case_counts(case_rows(ids), accounts)
+    assert table["Id"].tolist() == ["001A", "001B", "001C", "001D", "001E"]
+    # an unknown account and a case without one are left out, an account
+    # without a name gets no bar
+    assert counts.tolist() == [2, 3, 1, 0, 0]
+    expected = case_rows(ids)["AccountId"].value_counts()
+    for account_id, count in zip(table["Id"], counts):
+        if table.set_index("Id")["Name"].get(account_id) is not None:
+            assert count == expected.get(account_id, 0)
+
+
+def accounts_table(rows):
+    names = pd.Series(["account {}".format(i) for i in range(rows)])
+    return pd.DataFrame({"Id": names.index.astype(str), "Name": names})
+
+
+def test_bars_are_the_most_cases_in_ascending_order():
+    table = accounts_table(100)
+    counts = np.random.RandomState(0).permutation(100)
+    bar = cases.cases_by_account(table, counts)["data"][0]
+    expected = (
+        pd.Series(counts, index=table["Name"]).sort_values().iloc[-cases.ACCOUNT_BARS :]
+    )
+    assert list(bar.x) == expected.tolist()
+    assert list(bar.y) == expected.index.tolist()
+
+
+def test_ties_at_the_last_bar_keep_the_counts():
+    table = accounts_table(100)
+    counts = np.random.RandomState(1).randint(0, 10, 100)
+    bar = cases.cases_by_account(table, counts)["data"][0]
+    assert list(bar.x) == sorted(counts)[-cases.ACCOUNT_BARS :]
+    positions = table.set_index("Name").loc[list(bar.y), "Id"].astype(int)
+    assert counts[positions].tolist() == list(bar.x)
+
+
+def test_fewer_accounts_than_bars():
+    table = pd.DataFrame({"Id": ["a", "b", "c"], "Name": ["A", "B", "C"]})
+    bar = cases.cases_by_account(table, np.array([3, 0, 1]))["data"][0]
+    assert list(bar.y) == ["C", "A"]
+    assert list(bar.x) == [1, 3]
+
+
+def test_one_counts_entry_per_cases_version(accounts):
+    store = cases.frame_store
+    store.register("cases", lambda: case_rows(["001A", "001B"]))
+    store.load("cases")
+    token = store.token("cases")
+    for refresh in range(1, 25):
+        store.refresh("accounts")
+        version = store.version("accounts")
+        assert version == accounts + refresh
+        _, counts = store.derive_latest(token, cases.account_case_counts, version)
+        assert counts.tolist() == [1, 1, 0, 0, 0]
+    entries = [key for key in store.derived if key[0] == "cases"]
+    assert len(entries) == 1
+    # the encoding is kept for the current accounts version only
+    assert len([key for key in store.derived if key[0] == "accounts"]) == 1
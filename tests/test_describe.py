@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+from simple_salesforce.exceptions import SalesforceMalformedRequest
+
+from sfManager import sf_Manager
+from sfSchema import schema_hash
+
+FIELDS = [
+    {"name": "Id", "type": "id"},
+    {"name": "Amount", "type": "currency"},
+    {"name": "Stage__c", "type": "picklist"},
+]
+
+
+class Object:
+    def __init__(self, descriptions):
+        self.descriptions = descriptions
+
+    def describe(self):
+        return self.descriptions.pop(0)
+
+
+# a manager whose client answers describe() with the given fields in turn
+def manager(*fields):
+    sf_manager = sf_Manager()
+    sf_manager.generation = sf_manager.local.generation = 1
+    sf_manager.local.client = type("Client", (), {})()
+    descriptions = [{"fields": list(f)} for f in fields]
+    sf_manager.local.client.Opportunity = Object(descriptions)
+    return sf_manager
+
+
+def rejected(code):
+    return SalesforceMalformedRequest(
+        "url", 400, "query", [{"errorCode": code, "message": "rejected"}]
+    )
+
+
+def test_schema_hash_ignores_field_order():
+    assert schema_hash({"fields": FIELDS}) == schema_hash({"fields": FIELDS[::-1]})
+    changed = FIELDS[:1] + [{"name": "Amount", "type": "double"}]
+    assert schema_hash({"fields": FIELDS}) != schema_hash({"fields": changed})
+
+
+def test_describe_is_cached():
+    sf_manager = manager(FIELDS)
+    assert sf_manager.describe("Opportunity") is sf_manager.describe("Opportunity")
+
+
+def test_same_schema_keeps_the_resident_frame():
+    sf_manager = manager(FIELDS, FIELDS[::-1])
+    sf_manager.describe("Opportunity")
+    sf_manager.frames["Opportunity"] = pd.DataFrame()
+    sf_manager.watermarks["Opportunity"] = "2020-01-01T00:00:00Z"
+    sf_manager.describe("Opportunity", refresh=True)
+    assert "Opportunity" in sf_manager.frames
+    assert "Opportunity" in sf_manager.watermarks
+
+
+def test_changed_schema_drops_the_resident_frame():
+    sf_manager = manager(FIELDS, FIELDS[:2])
+    sf_manager.describe("Opportunity")
+    sf_manager.frames["Opportunity"] = pd.DataFrame()
+    sf_manager.watermarks["Opportunity"] = "2020-01-01T00:00:00Z"
+    sf_manager.describe("Opportunity", refresh=True)
+    assert "Opportunity" not in sf_manager.frames
+    assert "Opportunity" not in sf_manager.watermarks
+
+
+def test_invalid_field_refreshes_the_describe_and_retries():
+    sf_manager = manager(FIELDS, FIELDS[:2])
+    queried = []
+
+    def extract(sobject, fields, types):
+        queried.append(fields)
+        if len(queried) == 1:
+            raise rejected("INVALID_FIELD")
+        return pd.DataFrame(columns=fields)
+
+    sf_manager.extract = extract
+    df = sf_manager.load("Opportunity")
+    assert queried == [["Id", "Amount", "Stage__c"], ["Id", "Amount"]]
+    assert list(df.columns) == ["Id", "Amount"]
+
+
+def test_other_rejections_are_raised():
+    sf_manager = manager(FIELDS, FIELDS)
+    queried = []
+
+    def extract(sobject, fields, types):
+        queried.append(fields)
+        raise rejected("MALFORMED_QUERY")
+
+    sf_manager.extract = extract
+    with pytest.raises(SalesforceMalformedRequest):
+        sf_manager.load("Opportunity")
+    assert len(queried) == 1
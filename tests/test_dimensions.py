@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+import dimensions
+import metrics
+from scheduler import RefreshScheduler
+from sfTrace import ApiBudget
+from store import FrameStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FrameStore()
+    loads = []
+
+    def accounts():
+        loads.append(len(loads))
+        names = ["Acme", "Globex"][: len(loads)]
+        return pd.DataFrame(
+            {"Id": ["a{}".format(i) for i in range(len(names))], "Name": names}
+        )
+
+    store.register("accounts", accounts)
+    store.loads = loads
+    monkeypatch.setattr(dimensions, "frame_store", store)
+    monkeypatch.setattr(dimensions, "dataset", lambda name: store.get({"key": name}))
+    return store
+
+
+def test_options_are_derived_once_per_version(store):
+    cache = dimensions.DimensionCache()
+    options = cache.options("accounts")
+    assert options == [{"label": "Acme", "value": "a0"}]
+    assert cache.options("accounts") is options
+    assert store.loads == [0]
+    assert cache.bytes["accounts"] > 0
+    assert metrics.dimension_bytes.series[("accounts",)] == cache.bytes["accounts"]
+
+
+def test_scheduler_refresh_publishes_a_new_version(store):
+    cache = dimensions.DimensionCache()
+    cache.token("accounts")
+    before = cache.bytes["accounts"]
+    scheduler = RefreshScheduler(store, {"accounts": 3600})
+    assert scheduler.refresh("accounts")
+    assert cache.token("accounts")["version"] == 2
+    assert [o["label"] for o in cache.options("accounts")] == ["Acme", "Globex"]
+    assert cache.bytes["accounts"] > before
+
+
+def test_refresh_is_skipped_past_the_api_budget(store, monkeypatch):
+    cache = dimensions.DimensionCache()
+    cache.token("accounts")
+    budget = ApiBudget()
+    budget.update("api-usage=95/100")
+    monkeypatch.setattr("scheduler.budget", budget)
+    scheduler = RefreshScheduler(store, {"accounts": 3600})
+    scheduler.reserve = 0.1
+    assert not scheduler.refresh("accounts")
+    assert store.loads == [0]
+    assert cache.token("accounts")["version"] == 1
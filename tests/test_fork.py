@@ -0,0 +1,31 @@
+import os
+import threading
+
+import pytest
+
+from sfManager import sf_Manager
+from store import FrameStore, ParseCache
+
+
+# runs check in a forked child while the parent holds lock, returns whether
+# the child could take the lock of its own copy
+def child_acquires(instance, check):
+    with instance.lock:
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if check() else 1)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status) == 0
+
+
+@pytest.mark.parametrize("cls", [FrameStore, ParseCache, sf_Manager])
+def test_forked_child_gets_fresh_locks(cls):
+    instance = cls()
+    assert child_acquires(instance, lambda: instance.lock.acquire(blocking=False))
+
+
+def test_importing_the_app_starts_no_scheduler():
+    import index
+
+    assert index.scheduler is None
+    assert "refresh-scheduler" not in [t.name for t in threading.enumerate()]
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from panels.leads import filter_order, table_order
+
+
+def leads():
+    # categories in the order they were appended, not sorted
+    status = pd.Categorical(
+        [
+            "Open - Not Contacted",
+            "Closed - Converted",
+            None,
+            "Working - Contacted",
+            "Closed - Converted",
+        ],
+        categories=[
+            "Working - Contacted",
+            "Open - Not Contacted",
+            "Closed - Converted",
+        ],
+    )
+    return pd.DataFrame(
+        {"Status": status, "Company": ["b", "d", "a", None, "c"]},
+        index=[4, 4, 7, 1, 0],
+    )
+
+
+def test_categorical_column_sorts_by_value():
+    df = leads()
+    _, order = table_order(df, "Status", True)
+    assert df["Status"].take(order).tolist()[:4] == [
+        "Closed - Converted",
+        "Closed - Converted",
+        "Open - Not Contacted",
+        "Working - Contacted",
+    ]
+    assert np.isnan(df["Status"].take(order).iloc[-1])
+    _, order = table_order(df, "Status", False)
+    assert df["Status"].take(order).tolist()[:4] == [
+        "Working - Contacted",
+        "Open - Not Contacted",
+        "Closed - Converted",
+        "Closed - Converted",
+    ]
+
+
+def test_order_is_stable_positions_with_missing_last():
+    df = leads()
+    _, order = table_order(df, "Status", True)
+    assert order.tolist() == [1, 4, 0, 3, 2]
+    _, order = table_order(df, "Company", True)
+    assert order.tolist() == [2, 0, 4, 1, 3]
+
+
+def test_filter_keeps_the_sort_order():
+    df = leads()
+    _, order = table_order(df, "Company", True)
+    assert filter_order(df, order, "all").tolist() == order.tolist()
+    _, order = table_order(df, "Status", False)
+    assert filter_order(df, order, "open").tolist() == [3, 0]
@@ -0,0 +1,89 @@
+from simple_salesforce.exceptions import SalesforceExpiredSession
+
+from sfManager import sf_Manager
+
+FIELDS = ["Id", "StageName", "Amount"]
+TYPES = {"Id": "id", "StageName": "picklist", "Amount": "currency"}
+
+
+def record(number, stage):
+    return {"attributes": {}, "Id": str(number), "StageName": stage, "Amount": number}
+
+
+# a client serving the pages in turn, the first query_more call can fail with
+# an expired session once
+class Client:
+    def __init__(self, pages, expire=False):
+        self.pages = pages
+        self.expire = expire
+        self.calls = []
+
+    def page(self, number):
+        done = number == len(self.pages) - 1
+        return {
+            "records": self.pages[number],
+            "done": done,
+            "nextRecordsUrl": None if done else "/query/01g-{}".format(number + 1),
+        }
+
+    def query(self, query_text, include_deleted=False):
+        self.calls.append(("query", query_text, include_deleted))
+        return self.page(0)
+
+    def query_more(self, url, identifier_is_url=False, include_deleted=False):
+        self.calls.append(("query_more", url, include_deleted))
+        if self.expire:
+            self.expire = False
+            raise SalesforceExpiredSession(url, 401, "query", [])
+        return self.page(int(url.rsplit("-", 1)[1]))
+
+
+def manager(client):
+    sf_manager = sf_Manager()
+    sf_manager.generation = sf_manager.local.generation = 1
+    sf_manager.local.client = client
+    sf_manager.logins = 0
+
+    def login():
+        sf_manager.logins += 1
+
+    sf_manager.login = login
+    return sf_manager
+
+
+def test_every_page_is_followed():
+    client = Client(
+        [[record(1, "Won")], [record(2, "Lost"), record(3, "Won")], [record(4, "New")]]
+    )
+    sf_manager = manager(client)
+    batches = list(sf_manager.iter_batches("SELECT Id FROM Opportunity", True))
+    assert [len(batch) for batch in batches] == [1, 2, 1]
+    assert client.calls == [
+        ("query", "SELECT Id FROM Opportunity", True),
+        ("query_more", "/query/01g-1", True),
+        ("query_more", "/query/01g-2", True),
+    ]
+
+
+def test_pages_are_typed_and_concatenated():
+    client = Client([[record(1, "Won"), record(2, "Lost")], [], [record(3, "New")]])
+    df = manager(client).query_df("SELECT Id FROM Opportunity", FIELDS, TYPES)
+    assert df["Id"].tolist() == ["1", "2", "3"]
+    assert df["Amount"].tolist() == [1.0, 2.0, 3.0]
+    assert df["StageName"].dtype.name == "category"
+    assert list(df["StageName"].cat.categories) == ["Lost", "New", "Won"]
+
+
+def test_empty_result_keeps_the_columns():
+    df = manager(Client([[]])).query_df("SELECT Id FROM Opportunity", FIELDS, TYPES)
+    assert df.empty
+    assert list(df.columns) == FIELDS
+
+
+def test_expired_session_while_paging_logs_in_and_resumes():
+    client = Client([[record(1, "Won")], [record(2, "Lost")]], expire=True)
+    sf_manager = manager(client)
+    df = sf_manager.query_df("SELECT Id FROM Opportunity", FIELDS, TYPES)
+    assert sf_manager.logins == 1
+    assert df["Id"].tolist() == ["1", "2"]
+    assert [call[1] for call in client.calls[1:]] == ["/query/01g-1"] * 2
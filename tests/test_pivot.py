@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from panels.opportunities import probability_matrix
+from pivot import AGGREGATES, pivot
+
+
+def opportunities(rows=300, seed=0):
+    random = np.random.RandomState(seed)
+    df = pd.DataFrame(
+        {
+            "Type": random.choice(["New", "Renewal", "Upsell", None], rows),
+            "StageName": random.choice(
+                ["Prospecting", "Qualification", "Closed Won", "Closed Lost"], rows
+            ),
+            "Probability": random.randint(0, 101, rows).astype(float),
+            "Amount": random.randint(1, 1000, rows).astype(float),
+        }
+    )
+    df.loc[::11, "Probability"] = np.nan
+    df.loc[::13, "Amount"] = np.nan
+    # categories in another order than the values appear in, and one unused
+    df["Type"] = pd.Categorical(df["Type"], ["Upsell", "Renewal", "New", "Other"])
+    df["StageName"] = df["StageName"].astype("category")
+    return df
+
+
+def aligned(matrix, expected):
+    return matrix.reindex(index=expected.index, columns=expected.columns)
+
+
+@pytest.mark.parametrize("aggfunc", ["mean", "sum", "count"])
+def test_aggregates_match_pivot_table(aggfunc):
+    df = opportunities()
+    matrix = pivot(df, "Type", "StageName", "Probability", aggfunc)
+    expected = df.astype({"Type": object, "StageName": object}).pivot_table(
+        index="Type", columns="StageName", values="Probability", aggfunc=aggfunc
+    )
+    if aggfunc != "mean":
+        expected = expected.fillna(0)
+    assert sorted(matrix.index) == sorted(expected.index)
+    assert sorted(matrix.columns) == sorted(expected.columns)
+    np.testing.assert_allclose(aligned(matrix, expected).values, expected.values)
+
+
+def test_sum_and_count_fill_empty_pairs_with_zero():
+    df = pd.DataFrame(
+        {"Type": ["New", "Renewal"], "StageName": ["Won", "Lost"], "Amount": [5.0, 7]}
+    )
+    assert pivot(df, "Type", "StageName", "Amount", "sum").loc["New", "Lost"] == 0
+    assert pivot(df, "Type", "StageName", "Amount", "count").loc["New", "Lost"] == 0
+    assert np.isnan(pivot(df, "Type", "StageName", "Amount", "mean").loc["New", "Lost"])
+
+
+def test_weighted_mean_skips_rows_without_a_value_or_weight():
+    df = pd.DataFrame(
+        {
+            "Type": ["New"] * 4 + ["Renewal"] * 2,
+            "StageName": ["Won"] * 6,
+            "Probability": [10.0, 50, 90, np.nan, 20, 40],
+            "Amount": [1.0, 3, np.nan, 100, 0, 0],
+        }
+    )
+    matrix = pivot(df, "Type", "StageName", "Probability", "weighted", "Amount")
+    # (10 * 1 + 50 * 3) / (1 + 3), the NaN weight and NaN value rows left out
+    assert matrix.loc["New", "Won"] == 40
+    # weights summing to zero have no mean
+    assert np.isnan(matrix.loc["Renewal", "Won"])
+
+
+def test_weighted_mean_matches_a_direct_computation():
+    df = opportunities(seed=1)
+    matrix = pivot(df, "Type", "StageName", "Probability", "weighted", "Amount")
+    for (kind, stage), rows in df.groupby(["Type", "StageName"], observed=True):
+        rows = rows.dropna(subset=["Probability", "Amount"])
+        expected = np.average(rows["Probability"], weights=rows["Amount"])
+        assert matrix.loc[kind, stage] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("aggfunc", AGGREGATES)
+def test_empty_frame_gives_an_empty_matrix(aggfunc):
+    df = opportunities().iloc[:0]
+    matrix = pivot(df, "Type", "StageName", "Probability", aggfunc, "Amount")
+    assert matrix.empty
+
+
+def test_unknown_aggregate_is_refused():
+    with pytest.raises(ValueError):
+        pivot(opportunities(), "Type", "StageName", "Probability", "median")
+
+
+# the per cell loop the heatmap used before probability_matrix
+def cell_by_cell(df):
+    df = df[pd.notnull(df["Type"])]
+    y = list(df["Type"].unique())
+    x = list(df["StageName"].unique())
+    z = [
+        [
+            df[(df["StageName"] == stage) & (df["Type"] == kind)]["Probability"].mean()
+            for stage in x
+        ]
+        for kind in y
+    ]
+    return x, y, z
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_probability_matrix_matches_the_cell_loop(seed):
+    df = opportunities(seed=seed)
+    # a pair without any row
+    df = df[~((df["Type"] == "New") & (df["StageName"] == "Closed Won"))]
+    x, y, z = cell_by_cell(df)
+    matrix = probability_matrix(df)
+    assert list(matrix.columns) == x
+    assert list(matrix.index) == y
+    np.testing.assert_array_equal(matrix.values, np.array(z, dtype=float))
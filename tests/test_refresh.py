@@ -0,0 +1,39 @@
+import pytest
+from dash.exceptions import PreventUpdate
+
+import index
+from panels import cases, leads, opportunities
+from store import frame_store
+
+
+# the function registered by app.callback, under the metrics and dash wrappers
+def unwrapped(callback):
+    return callback.__wrapped__.__wrapped__
+
+
+@pytest.mark.parametrize(
+    "callback, states",
+    [
+        (opportunities.add_opportunity_callback, 7),
+        (leads.add_lead_callback, 4),
+        (cases.add_case_callback, 9),
+    ],
+)
+def test_add_callbacks_do_nothing_before_a_click(callback, states):
+    with pytest.raises(PreventUpdate):
+        unwrapped(callback)(0, *[None] * states)
+
+
+def test_stores_start_with_the_current_tokens(monkeypatch):
+    monkeypatch.setitem(frame_store.frames, "leads", (3, None))
+    stores = {}
+
+    def collect(component):
+        if type(component).__name__ == "Store":
+            stores[component.id] = getattr(component, "data", None)
+        for child in getattr(component, "children", None) or []:
+            if not isinstance(child, str):
+                collect(child)
+
+    collect(index.app.layout())
+    assert stores["leads_df"] == {"key": "leads", "version": 3}
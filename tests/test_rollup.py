@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rollup import PERIODS, Rollup
+
+
+def frame(rows=500, seed=0):
+    random = np.random.RandomState(seed)
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(
+        random.randint(0, 400, rows), unit="d"
+    )
+    df = pd.DataFrame(
+        {
+            "CreatedDate": dates.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+            "Priority": random.choice(["High", "Medium", "Low"], rows),
+            "Type": random.choice(["Problem", "Question", "Feature"], rows),
+        }
+    )
+    df.loc[::37, "CreatedDate"] = None
+    # categories in another order than the values appear in
+    df["Priority"] = pd.Categorical(df["Priority"], ["Low", "Medium", "High", "None"])
+    df["Type"] = df["Type"].astype("category")
+    return df
+
+
+# the counts grouped directly on object columns, what the rollup replaces
+def reference(df, period, by=None, value=None, split=None, lag=0):
+    rows = df.astype(object)
+    if value is not None:
+        rows = rows[rows[by] == value]
+    rows = rows.assign(date=pd.to_datetime(rows["CreatedDate"]))
+    keys = [pd.Grouper(key="date", freq=period)] + ([split] if split else [])
+    counts = rows.groupby(keys).size()
+    if split is not None:
+        counts = counts.unstack(split, fill_value=0)
+    if not counts.empty:
+        buckets = pd.date_range(counts.index.min(), counts.index.max(), freq=period)
+        counts = counts.reindex(buckets, fill_value=0)
+    if lag:
+        counts.index = counts.index - pd.to_timedelta(lag, unit="d")
+    return counts
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_counts_match_a_direct_groupby(period):
+    df = frame()
+    rollup = Rollup(df, "CreatedDate", by="Priority")
+    for value in [None, "High", "Medium", "Low"]:
+        expected = reference(df, period, "Priority", value)
+        counts = rollup.get(period, value)
+        assert counts.tolist() == expected.tolist()
+        assert counts.index.equals(expected.index)
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_split_counts_match_with_the_week_lag(period):
+    df = frame(seed=1)
+    rollup = Rollup(df, "CreatedDate", by="Priority", split="Type", week_lag=7)
+    assert rollup.splits == list(pd.unique(df["Type"].dropna()))
+    lag = 7 if period == "W-MON" else 0
+    for value in [None, "High", "Low"]:
+        expected = reference(df, period, "Priority", value, "Type", lag)
+        counts = rollup.get(period, value)[sorted(rollup.splits)]
+        assert counts.values.tolist() == expected.values.tolist()
+        assert counts.index.equals(expected.index)
+
+
+def test_value_without_rows_gets_empty_counts():
+    df = frame()
+    assert Rollup(df, "CreatedDate", by="Priority").get("M", "None").empty
+    split = Rollup(df, "CreatedDate", by="Priority", split="Type")
+    assert split.get("M", "None").empty
@@ -0,0 +1,42 @@
+import warnings
+
+import pandas as pd
+
+from sfSchema import apply_types, concat_frames, records_to_df
+
+TYPES = {"Amount": "currency", "StageName": "picklist", "IsWon": "boolean"}
+
+
+def chunk(stages, amounts):
+    df = pd.DataFrame({"StageName": stages, "Amount": amounts, "IsWon": True})
+    return apply_types(df, TYPES)
+
+
+def test_records_are_typed():
+    records = [
+        {"attributes": {}, "Amount": "10.5", "StageName": "Won", "IsWon": None},
+        {"attributes": {}, "Amount": None, "StageName": None, "IsWon": True},
+    ]
+    df = records_to_df(records, ["Amount", "StageName", "IsWon"], TYPES)
+    assert df["Amount"].dtype == "float64"
+    assert df["StageName"].dtype.name == "category"
+    assert df["IsWon"].tolist() == [False, True]
+
+
+def test_concat_sorts_the_union_of_categories():
+    df = concat_frames([chunk(["z", "b"], [1, 2]), chunk(["c", "a"], [3, 4])])
+    assert list(df["StageName"].cat.categories) == ["a", "b", "c", "z"]
+    assert df["StageName"].tolist() == ["z", "b", "c", "a"]
+    assert df["Amount"].tolist() == [1, 2, 3, 4]
+    assert df.index.equals(pd.RangeIndex(4))
+
+
+def test_concat_leaves_sliced_chunks_alone():
+    resident = chunk(["z", "b", "y"], [1, 2, 3])
+    delta = chunk(["a"], [4])
+    kept = resident[resident["Amount"] > 1]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        df = concat_frames([kept, delta])
+    assert df["StageName"].tolist() == ["b", "y", "a"]
+    assert list(kept["StageName"].cat.categories) == ["b", "y", "z"]
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import snapshot
+
+
+def frame():
+    return pd.DataFrame(
+        {
+            "Amount": [1.0, np.nan, 3.0],
+            "Name": ["x", None, "z"],
+            "StageName": pd.Categorical(["Won", None, "Lost"]),
+            "CreatedDate": pd.to_datetime(["2020-01-01", None, "2021-01-01"]),
+            "IsWon": [True, False, True],
+        }
+    )
+
+
+def write(snap, key, df, version):
+    with snap.lock(key):
+        snap.write(key, df, version)
+
+
+def test_round_trip(tmp_path):
+    snap = snapshot.Snapshot(str(tmp_path / "snapshot"))
+    df = frame()
+    write(snap, "opportunities", df, 1)
+    version, read = snap.read("opportunities")
+    assert version == 1
+    pd.testing.assert_frame_equal(read[df.columns], df)
+
+
+def test_round_trip_keeps_a_sliced_index(tmp_path):
+    snap = snapshot.Snapshot(str(tmp_path / "snapshot"))
+    df = frame().iloc[[2, 0]]
+    write(snap, "opportunities", df, 1)
+    pd.testing.assert_frame_equal(snap.read("opportunities")[1][df.columns], df)
+
+
+def test_nothing_is_pickled(tmp_path):
+    snap = snapshot.Snapshot(str(tmp_path / "snapshot"))
+    write(snap, "opportunities", frame(), 1)
+    directory = tmp_path / "snapshot" / "opportunities" / "v1"
+    assert not [name for name in os.listdir(directory) if name.endswith(".pkl")]
+
+
+def test_root_is_private(tmp_path):
+    root = tmp_path / "snapshot"
+    snapshot.Snapshot(str(root))
+    assert os.stat(root).st_mode & 0o777 == 0o700
+
+
+def test_refuses_a_root_open_to_others(tmp_path):
+    root = tmp_path / "snapshot"
+    root.mkdir(mode=0o777)
+    os.chmod(root, 0o777)
+    with pytest.raises(PermissionError):
+        snapshot.Snapshot(str(root))
+
+
+def test_disabled_unless_configured(monkeypatch):
+    monkeypatch.delenv("SNAPSHOT_DIR", raising=False)
+    assert snapshot.from_env() is None
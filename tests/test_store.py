@@ -0,0 +1,107 @@
+import pandas as pd
+
+import metrics
+from store import FrameStore, ParseCache, parse_lookups
+
+
+# a store whose "opportunities" loader returns a new frame on every call
+def store_with_loader():
+    store = FrameStore()
+    store.loads = 0
+
+    def loader():
+        store.loads += 1
+        return pd.DataFrame({"a": [store.loads]})
+
+    store.register("opportunities", loader)
+    return store
+
+
+def test_frame_is_loaded_once_on_first_use():
+    store = store_with_loader()
+    assert store.get({"key": "opportunities"})["a"].tolist() == [1]
+    assert store.get({"key": "opportunities", "version": 1})["a"].tolist() == [1]
+    assert store.loads == 1
+    assert store.token("opportunities") == {"key": "opportunities", "version": 1}
+
+
+def test_token_of_another_process_loads_once():
+    store = store_with_loader()
+    store.get({"key": "opportunities"})
+    # a version given out by another worker, or before a restart
+    token = {"key": "opportunities", "version": 5}
+    for _ in range(8):
+        version, df = store.entry(token)
+    assert store.loads == 2
+    assert version == 5
+    assert df["a"].tolist() == [2]
+    assert store.put("opportunities", df)["version"] == 6
+
+
+def test_derived_once_per_version():
+    store = store_with_loader()
+    calls = []
+
+    def total(df, column):
+        calls.append(column)
+        return int(df[column].sum())
+
+    token = store.token("opportunities")
+    assert store.derive(token, total, "a") == 1
+    assert store.derive(token, total, "a") == 1
+    assert calls == ["a"]
+
+    token = store.put("opportunities", pd.DataFrame({"a": [3, 4]}))
+    assert store.derive(token, total, "a") == 7
+    assert store.derive(token, total, "a") == 7
+    assert calls == ["a", "a"]
+    # the result of the replaced version is dropped
+    assert len(store.derived) == 1
+
+
+def parse_counter(parsed):
+    def parse(content):
+        parsed.append(content)
+        return pd.DataFrame({"a": [1, 2, 3]})
+
+    return parse
+
+
+def test_payload_is_parsed_once():
+    parsed = []
+    cache = ParseCache()
+    first = cache.get(b"payload", parse_counter(parsed))
+    second = cache.get(b"payload", parse_counter(parsed))
+    assert parsed == [b"payload"]
+    assert first.equals(second)
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_callers_cannot_change_the_cached_frame():
+    cache = ParseCache()
+    parse = parse_counter([])
+    cache.get(b"payload", parse)["a"] = 0
+    df = cache.get(b"payload", parse)
+    df.loc[0, "a"] = 10
+    assert cache.get(b"payload", parse)["a"].tolist() == [1, 2, 3]
+
+
+def test_oldest_payload_is_evicted():
+    parsed = []
+    cache = ParseCache(maxsize=2)
+    for content in [b"a", b"b", b"a", b"c", b"b"]:
+        cache.get(content, parse_counter(parsed))
+    assert parsed == [b"a", b"b", b"c", b"b"]
+
+
+def test_lookups_are_exported():
+    hits = parse_lookups.series.get(("hit",), 0)
+    misses = parse_lookups.series.get(("miss",), 0)
+    cache = ParseCache()
+    cache.get(b"exported", parse_counter([]))
+    cache.get(b"exported", parse_counter([]))
+    assert parse_lookups.series[("hit",)] == hits + 1
+    assert parse_lookups.series[("miss",)] == misses + 1
+    lines = [line for metric in metrics.registry for line in metric.render()]
+    assert any(line.startswith("parse_cache_lookups_total{") for line in lines)
+    assert "parse_cache_entries{} 1" in lines
@@ -0,0 +1,134 @@
+import pandas as pd
+
+from sfManager import sf_Manager, sync_basis
+
+FIELDS = ["Id", "Name", "SystemModstamp", "IsDeleted"]
+
+
+def records(rows):
+    df = pd.DataFrame(rows, columns=FIELDS)
+    df["SystemModstamp"] = pd.to_datetime(df["SystemModstamp"])
+    return df
+
+
+# a manager whose queries return the given frames in turn, without any
+# Salesforce connection
+def manager(*results):
+    results = list(results)
+    queries = []
+    sf_manager = sf_Manager()
+    sf_manager.extract = lambda *args, **kwargs: results.pop(0)
+
+    def query_df(query_text, *args, **kwargs):
+        queries.append(query_text)
+        return results.pop(0)
+
+    sf_manager.query_df = query_df
+    return sf_manager, queries
+
+
+def sync(sf_manager):
+    return sf_manager.sync("Opportunity", ["Id", "Name"])
+
+
+def test_appended_rows_are_recorded_with_the_bases():
+    first = records(
+        [
+            ["a", "A", "2020-01-01 10:00:00.250", False],
+            ["b", "B", "2020-01-01 10:00:01.500", False],
+        ]
+    )
+    # b comes back unchanged, its second is the watermark
+    delta = records(
+        [
+            ["b", "B", "2020-01-01 10:00:01.500", False],
+            ["c", "C", "2020-01-01 10:00:05.000", False],
+        ]
+    )
+    sf_manager, _ = manager(first, delta)
+    resident = sync(sf_manager)
+    merged = sync(sf_manager)
+
+    start, end, rows = sf_manager.appended("Opportunity", merged)
+    assert start == sync_basis(resident)
+    assert end == sync_basis(merged)
+    assert rows["Id"].tolist() == ["c"]
+    assert merged["Id"].tolist() == ["a", "b", "c"]
+
+
+def test_unchanged_rows_alone_keep_the_resident_frame():
+    first = records([["a", "A", "2020-01-01 10:00:00.250", False]])
+    sf_manager, _ = manager(first, first.copy())
+    resident = sync(sf_manager)
+    assert sync(sf_manager) is resident
+
+
+def test_an_update_is_not_an_append():
+    first = records([["a", "A", "2020-01-01 10:00:00", False]])
+    delta = records([["a", "A2", "2020-01-01 10:00:09", False]])
+    sf_manager, _ = manager(first, delta)
+    sync(sf_manager)
+    merged = sync(sf_manager)
+    assert sf_manager.appended("Opportunity", merged) is None
+
+
+def test_first_sync_is_a_full_pull_that_sets_the_watermark():
+    first = records(
+        [
+            ["a", "A", "2020-01-01 10:00:00.250", False],
+            ["b", "B", "2020-01-01 10:00:01.500", False],
+        ]
+    )
+    sf_manager, queries = manager(first)
+    assert sync(sf_manager)["Id"].tolist() == ["a", "b"]
+    assert queries == []
+    assert sf_manager.watermarks["Opportunity"] == "2020-01-01T10:00:01Z"
+
+
+def test_delta_is_merged_with_updates_and_deletes():
+    first = records(
+        [
+            ["a", "A", "2020-01-01 10:00:00", False],
+            ["b", "B", "2020-01-01 10:00:01", False],
+            ["c", "C", "2020-01-01 10:00:02", False],
+        ]
+    )
+    delta = records(
+        [
+            ["a", "A2", "2020-01-02 09:00:00", False],
+            ["c", "C", "2020-01-02 09:30:00", True],
+            ["d", "D", "2020-01-02 10:00:00", False],
+        ]
+    )
+    sf_manager, queries = manager(first, delta)
+    resident = sync(sf_manager)
+    merged = sync(sf_manager)
+
+    assert queries == [
+        "SELECT Id, Name, SystemModstamp, IsDeleted FROM Opportunity"
+        " WHERE SystemModstamp > 2020-01-01T10:00:02Z"
+    ]
+    assert merged["Id"].tolist() == ["b", "a", "d"]
+    assert merged["Name"].tolist() == ["B", "A2", "D"]
+    assert merged.index.equals(pd.RangeIndex(3))
+    assert sf_manager.watermarks["Opportunity"] == "2020-01-02T10:00:00Z"
+    # the resident frame handed out before is left as it was
+    assert resident["Name"].tolist() == ["A", "B", "C"]
+
+
+def test_new_fields_start_over_with_a_full_pull():
+    first = records([["a", "A", "2020-01-01 10:00:00", False]])
+    sf_manager, queries = manager(first, first.copy())
+    sync(sf_manager)
+    sf_manager.sync("Opportunity", ["Id", "Name", "Amount"])
+    assert queries == []
+
+
+def test_seed_takes_over_a_newer_frame_only():
+    sf_manager, _ = manager()
+    newer = records([["a", "A", "2020-01-02 10:00:00", False]])
+    older = records([["a", "A", "2020-01-01 10:00:00", False]])
+    sf_manager.seed("Opportunity", newer)
+    sf_manager.seed("Opportunity", older)
+    assert sf_manager.frames["Opportunity"] is newer
+    assert sf_manager.watermarks["Opportunity"] == "2020-01-02T10:00:00Z"
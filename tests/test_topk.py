@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from topk import TopK
+
+COLUMNS = ["Name", "Amount", "StageName"]
+
+
+def opportunities(n, seed=0):
+    rng = np.random.default_rng(seed)
+    amounts = rng.integers(0, 50, n).astype(float)  # plenty of ties
+    amounts[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame(
+        {
+            "Name": ["opportunity {}".format(i) for i in range(n)],
+            "Amount": amounts,
+            "StageName": pd.Categorical(rng.choice(["Won", "Lost"], n)),
+        }
+    )
+
+
+def test_matches_a_stable_sort():
+    df = opportunities(1000)
+    for largest in (True, False):
+        top = TopK.of(df, 5, "Amount", COLUMNS, largest=largest).frame()
+        expected = df.dropna(subset=["Amount"]).sort_values(
+            "Amount", ascending=not largest, kind="mergesort"
+        )
+        expected = expected[COLUMNS].iloc[:5].reset_index(drop=True)
+        pd.testing.assert_frame_equal(top, expected)
+
+
+def test_pushing_rows_matches_a_full_selection():
+    df = opportunities(1000)
+    for largest in (True, False):
+        top = TopK.of(df.iloc[:600], 5, "Amount", COLUMNS, largest=largest)
+        for start in range(600, 1000, 7):
+            top.push(df.iloc[start : start + 7])
+        full = TopK.of(df, 5, "Amount", COLUMNS, largest=largest)
+        pd.testing.assert_frame_equal(top.frame(), full.frame())
+
+
+def test_where_selects_rows():
+    df = opportunities(1000)
+    where = df["StageName"] == "Lost"
+    top = TopK.of(df, 5, "Amount", COLUMNS, where=where).frame()
+    assert (top["StageName"] == "Lost").all()
+
+
+def test_pushed_categories_are_kept():
+    top = TopK.of(opportunities(100), 5, "Amount", COLUMNS)
+    top.push(
+        pd.DataFrame({"Name": ["new"], "Amount": [1000.0], "StageName": ["Stalled"]})
+    )
+    df = top.frame()
+    assert df["StageName"].iloc[0] == "Stalled"
+    assert df["StageName"].dtype.name == "category"
+
+
+def test_copy_leaves_the_original_alone():
+    top = TopK.of(opportunities(100), 5, "Amount", COLUMNS)
+    before = top.frame()
+    copy = top.copy()
+    copy.push(pd.DataFrame({"Name": ["new"], "Amount": [1000.0], "StageName": ["Won"]}))
+    pd.testing.assert_frame_equal(top.frame(), before)
@@ -0,0 +1,74 @@
+import heapq
+import math
+
+import pandas as pd
+
+
+# the k rows of a frame with the largest (or smallest) value of column, best
+# first, as sort_values(column).iloc[:k] would give them minus the rows
+# without a value. The rows are kept in a heap of k entries with the weakest
+# at the root, so rows appended to the frame later are pushed in O(log k)
+# each instead of sorting the whole frame again
+class TopK:
+    def __init__(self, k, column, columns, dtypes, largest=True):
+        self.k = k
+        self.column = column
+        self.columns = columns  # the columns kept of every row
+        self.dtypes = dtypes
+        self.largest = largest
+        self.heap = []  # [(rank, row)], rank = (+/-value, -position)
+        self.position = 0  # rows pushed so far, the earlier row wins a tie
+        self.basis = None  # set by callers, what the rows were selected from
+
+    # selects the top rows of df (of df[where] when a mask is given) with
+    # nlargest/nsmallest, a partial sort of the column
+    @classmethod
+    def of(cls, df, k, column, columns, largest=True, where=None):
+        top = cls(k, column, columns, df[columns].dtypes, largest)
+        selected = df if where is None else df[where]
+        # positions rather than labels, the index of a merged frame may repeat
+        values = pd.Series(selected[column].to_numpy())
+        if largest:
+            positions = values.nlargest(k, keep="first").index
+        else:
+            positions = values.nsmallest(k, keep="first").index
+        top.push(selected.iloc[positions])
+        top.position = len(df.index)
+        return top
+
+    def copy(self):
+        top = TopK(self.k, self.column, self.columns, self.dtypes, self.largest)
+        top.heap = list(self.heap)
+        top.position = self.position
+        top.basis = self.basis
+        return top
+
+    # adds the rows of df, taken as coming after every row already pushed
+    def push(self, df):
+        values = df[self.column].tolist()
+        rows = df[self.columns].itertuples(index=False, name=None)
+        for value, row in zip(values, rows):
+            self.position += 1
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            rank = (value if self.largest else -value, -self.position)
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, (rank, row))
+            elif rank > self.heap[0][0]:
+                heapq.heapreplace(self.heap, (rank, row))
+
+    # the rows as a new frame, best first, with the dtypes of the frame the
+    # heap was built from. Categories pushed since then are added to the
+    # categorical dtypes rather than turned into NaN
+    def frame(self):
+        rows = [row for _, row in sorted(self.heap, reverse=True)]
+        df = pd.DataFrame(rows, columns=self.columns)
+        for name, dtype in self.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                values = df[name].dropna()
+                new = values[~values.isin(dtype.categories)].unique().tolist()
+                if new:
+                    categories = list(dtype.categories) + new
+                    dtype = pd.CategoricalDtype(categories, ordered=dtype.ordered)
+            df[name] = df[name].astype(dtype)
+        return df